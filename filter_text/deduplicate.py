@@ -17,16 +17,12 @@ def deduplicate_file(file_path):
         with open(file_path, 'r', encoding='utf-8') as file:
             lines = file.readlines()
         
-        # Strip trailing whitespace and create a set to remove duplicates
-        unique_lines = set()
-        for line in lines:
-            stripped_line = line.rstrip()
-            if stripped_line:  # Skip empty lines
-                unique_lines.add(stripped_line)
+        # Strip trailing whitespace and remove duplicates, keeping the first occurrence in file order
+        unique_lines = list(dict.fromkeys(line.rstrip() for line in lines if line.rstrip()))
         
         # Write the deduplicated content back to the file
         with open(file_path, 'w', encoding='utf-8') as file:
-            file.write('\n'.join(unique_lines))
+            file.write('\n'.join(unique_lines) + '\n')
         
         print(f"Successfully processed '{file_path}':")
         print(f"  - Removed trailing whitespace")
@@ -0,0 +1,174 @@
+import re
+import time
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Callable, Sequence, NamedTuple
+
+
+class CachedAnswer(NamedTuple):
+    """An answer served from the cache together with the context it was generated from."""
+    answer: str
+    context_chunks: List[str]
+    similarity: float
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a question so trivially different phrasings share one exact-match key.
+
+    Lowercases, folds diacritics (so "ș", "ş" and "s" match), drops punctuation and collapses whitespace.
+
+    Args:
+        query: The user's question
+
+    Returns:
+        The normalized question
+    """
+    decomposed = unicodedata.normalize("NFKD", query.lower())
+    folded = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w\s]", " ", folded).split())
+
+
+class AnswerCache:
+    """
+    Response cache in front of retrieval and answer generation.
+
+    A lookup first tries the normalized query text, then, only on a miss, embeds the query and
+    returns the most similar cached question if its cosine similarity reaches the threshold.
+    Entries expire after a TTL, the least recently used entries are evicted beyond max_entries,
+    and the whole cache is dropped when the index version changes. All methods are thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 24 * 3600, similarity_threshold: float = 0.95):
+        """
+        Args:
+            max_entries: Maximum number of cached answers (default: 1000)
+            ttl_seconds: Time after which an answer expires (default: 24 hours)
+            similarity_threshold: Minimum cosine similarity between query embeddings for a semantic hit (default: 0.95)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.index_version: Optional[str] = None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def set_index_version(self, version: str) -> None:
+        """
+        Record the version of the index answers are generated from, clearing the cache if it changed.
+
+        Args:
+            version: An identifier of the index contents, e.g. the index_version reported by ingest
+        """
+        with self._lock:
+            if version != self.index_version:
+                self._entries.clear()
+                self.index_version = version
+
+    def lookup(self, query: str, embed: Optional[Callable[[str], Sequence[float]]] = None) -> Optional[CachedAnswer]:
+        """
+        Find a cached answer for a query.
+
+        Args:
+            query: The user's question
+            embed: Optional function returning the query embedding, called only when there is no exact match.
+                Without it, only exact (normalized) matches are returned
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        key = normalize_query(query)
+
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return CachedAnswer(entry["answer"], entry["context_chunks"], 1.0)
+            if embed is None or not self._entries:
+                self.misses += 1
+                return None
+
+        query_embedding = self._unit(embed(query))
+
+        with self._lock:
+            keys = [k for k, entry in self._entries.items() if entry["embedding"] is not None]
+            if keys:
+                matrix = np.vstack([self._entries[k]["embedding"] for k in keys])
+                similarities = matrix @ query_embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    entry = self._entries[keys[best]]
+                    self._entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return CachedAnswer(entry["answer"], entry["context_chunks"], float(similarities[best]))
+            self.misses += 1
+            return None
+
+    def store(self,
+              query: str,
+              answer: str,
+              context_chunks: List[str],
+              embedding: Optional[Sequence[float]] = None) -> None:
+        """
+        Cache the answer generated for a query.
+
+        Args:
+            query: The user's question
+            answer: The generated answer
+            context_chunks: The chunks the answer was generated from
+            embedding: Optional query embedding, required for the entry to serve semantic matches
+        """
+        entry = {
+            "answer": answer,
+            "context_chunks": list(context_chunks),
+            "embedding": self._unit(embedding) if embedding is not None else None,
+            "created_at": time.monotonic(),
+        }
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return hit/miss counters.
+
+        Returns:
+            A dictionary with exact_hits, semantic_hits, misses, hit_rate and entries
+        """
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+
+    def _expire(self) -> None:
+        # Entries are kept in recency order, not insertion order, so scan them all
+        deadline = time.monotonic() - self.ttl_seconds
+        for key in [k for k, entry in self._entries.items() if entry["created_at"] < deadline]:
+            del self._entries[key]
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
@@ -0,0 +1,112 @@
+import time
+import threading
+import metrics
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# A startup step receives the loader, so it can read what earlier steps published
+Step = Tuple[str, Callable[["BackgroundLoader"], Any]]
+
+
+class BackgroundLoader:
+    """
+    Runs the slow startup steps of an app (clients, tokenizer, index) on a background thread.
+
+    Each step publishes its result under a name as soon as it finishes, so callers wait only on
+    the resources they need: get("clients") returns while the index is still loading. A later
+    step may publish under an existing name to replace an earlier result, e.g. an index brought
+    up to date after the saved one was served. The time every step finished, counted from the
+    process start, is kept for the cold-start report.
+    """
+
+    def __init__(self, steps: Sequence[Step], started_at: Optional[float] = None):
+        """
+        Args:
+            steps: (name, function) pairs run in order; a function returning None publishes nothing
+            started_at: time.perf_counter() value timings are measured from (default: when the loader is created)
+        """
+        self.steps = list(steps)
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self._values: Dict[str, Any] = {}
+        self._errors: Dict[str, BaseException] = {}
+        self._events = {name: threading.Event() for name, _ in self.steps}
+        self._timings: List[Tuple[str, float]] = []
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "BackgroundLoader":
+        """
+        Start running the steps, once.
+
+        Returns:
+            The loader itself
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="startup-loader", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        last_step = {name: position for position, (name, _) in enumerate(self.steps)}
+        for position, (name, function) in enumerate(self.steps):
+            label = f"{name} refresh" if name in self._values else name
+            try:
+                with metrics.span(f"startup.{name}"):
+                    value = function(self)
+                if value is not None:
+                    self._values[name] = value
+                    self._errors.pop(name, None)
+                else:
+                    label = f"{label} (skipped)"
+            except Exception as e:
+                print(f"Error during startup step {label}: {e!r}")
+                self._errors[name] = e
+            self._timings.append((label, time.perf_counter() - self.started_at))
+            # Waiters wake up on the first result, or once the last step of the name ran even if it
+            # failed, so nobody waits forever on a resource that cannot be loaded
+            if name in self._values or position == last_step[name]:
+                self._events[name].set()
+        self._done.set()
+        print("Startup: " + ", ".join(f"{label} {seconds:.2f}s" for label, seconds in self._timings))
+
+    def get(self, name: str, timeout: Optional[float] = None) -> Any:
+        """
+        Wait for a step's result.
+
+        Args:
+            name: The step name
+            timeout: Seconds to wait at most (default: wait until the step finishes)
+
+        Returns:
+            The value the step published
+
+        Raises:
+            TimeoutError: If the step did not finish in time
+            RuntimeError: If the step failed and nothing was published under its name
+        """
+        if not self._events[name].wait(timeout):
+            raise TimeoutError(f"Startup step {name} did not finish within {timeout} seconds")
+        if name not in self._values:
+            raise RuntimeError(f"Startup step {name} failed") from self._errors.get(name)
+        return self._values[name]
+
+    def peek(self, name: str) -> Any:
+        """Return a step's latest result without waiting, or None if there is none yet."""
+        return self._values.get(name)
+
+    def ready(self, name: str) -> bool:
+        """Return whether a step has published a result."""
+        return name in self._values
+
+    def error(self, name: str) -> Optional[BaseException]:
+        """Return the exception a step failed with, if any."""
+        return self._errors.get(name)
+
+    @property
+    def finished(self) -> bool:
+        """Whether every step has run."""
+        return self._done.is_set()
+
+    @property
+    def timings(self) -> List[Tuple[str, float]]:
+        """(step, seconds since started_at) pairs of the steps finished so far, in order."""
+        return list(self._timings)
@@ -0,0 +1,164 @@
+import json
+import time
+import asyncio
+import argparse
+from openai import AsyncOpenAI
+from typing import List, Dict, Any, TextIO
+from ingestion import ingest
+from embedding import get_embeddings_concurrent
+from embedding_cache import EmbeddingCache
+from lexical_index import BM25Index
+from openai_clients import get_client, get_async_client, run_async
+from query_handler import batch_query_rag, generate_answer_async
+from main import (PDF_PATTERN, JSON_PATH, FILTER_PATH, INDEX_STORE_DIR, EMBEDDING_CACHE_PATH, EMBEDDING_MODEL,
+                  CHUNK_MAX_TOKENS, INDEX_METRIC, INDEX_TYPE, INDEX_QUANTIZATION, INDEX_SHARD_SIZE, RETRIEVAL_K,
+                  MAX_CONTEXT_TOKENS, RERANK_CANDIDATES, get_embedding_clients, get_reranker)
+
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """
+    Read questions from a JSONL file.
+
+    Each line is an object with a "question" (or "query") field and an optional "id"; lines
+    without an id are numbered from 1. Blank lines are skipped.
+
+    Args:
+        path: Path to the JSONL file
+
+    Returns:
+        A list of {"id", "question"} dictionaries in file order
+    """
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = record.get("question", record.get("query"))
+            if not question:
+                print(f"Skipping line {line_number}: no question field")
+                continue
+            questions.append({"id": record.get("id", line_number), "question": question})
+    return questions
+
+
+async def answer_all(questions: List[Dict[str, Any]],
+                     contexts: List[List[str]],
+                     client: AsyncOpenAI,
+                     output: TextIO,
+                     shared_timings: Dict[str, float],
+                     max_concurrency: int = 16,
+                     max_context_tokens: int = MAX_CONTEXT_TOKENS,
+                     include_context: bool = False) -> int:
+    """
+    Generate every answer with bounded concurrency and write each result as soon as it is ready.
+
+    Args:
+        questions: The {"id", "question"} records
+        contexts: The retrieved chunks for each question, in the same order
+        client: An AsyncOpenAI client instance
+        output: The open JSONL file results are appended to
+        shared_timings: Per-question share of the batched stages (embed_ms, search_ms), added to every record
+        max_concurrency: Maximum number of answers generated at once (default: 16)
+        max_context_tokens: Token budget for each answer's context (default: MAX_CONTEXT_TOKENS)
+        include_context: Whether to write the retrieved chunks with each answer (default: False)
+
+    Returns:
+        The number of questions that failed
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def answer(record: Dict[str, Any], context_chunks: List[str]) -> Dict[str, Any]:
+        async with semaphore:
+            usage: Dict[str, int] = {}
+            start = time.perf_counter()
+            result = {"id": record["id"], "question": record["question"]}
+            try:
+                result["answer"] = await generate_answer_async(
+                    record["question"], context_chunks, client=client,
+                    max_context_tokens=max_context_tokens, usage=usage)
+            except Exception as e:
+                result["error"] = repr(e)
+            result["usage"] = usage
+            result["timings"] = {**shared_timings, "generate_ms": (time.perf_counter() - start) * 1000}
+            if include_context:
+                result["context_chunks"] = context_chunks
+            return result
+
+    failures = 0
+    tasks = [asyncio.create_task(answer(record, context)) for record, context in zip(questions, contexts)]
+    for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+        result = await task
+        failures += "error" in result
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+        if done % 100 == 0:
+            print(f"{done}/{len(tasks)} answered")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions with batched retrieval")
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"question\"} object per line")
+    parser.add_argument("output", help="JSONL file the answers are written to, one line per question")
+    parser.add_argument("--k", type=int, default=RETRIEVAL_K)
+    parser.add_argument("--concurrency", type=int, default=16, help="Answers generated at once")
+    parser.add_argument("--max-context-tokens", type=int, default=MAX_CONTEXT_TOKENS)
+    parser.add_argument("--dense-only", action="store_true", help="Skip BM25 fusion")
+    parser.add_argument("--no-rerank", action="store_true", help="Keep the fused ranking instead of reranking")
+    parser.add_argument("--retrieve-only", action="store_true", help="Write the retrieved chunks without generating")
+    parser.add_argument("--include-context", action="store_true", help="Write the retrieved chunks with each answer")
+    args = parser.parse_args()
+
+    client = get_client()
+    async_client = get_async_client()
+    embedding_client, _ = get_embedding_clients(client, async_client)
+    embedding_cache = EmbeddingCache(db_path=EMBEDDING_CACHE_PATH)
+    stage_seconds = {}
+
+    start = time.perf_counter()
+    index, chunks, _ = ingest(embedding_client, pdf_pattern=PDF_PATTERN, json_path=JSON_PATH, filter_path=FILTER_PATH,
+                              store_dir=INDEX_STORE_DIR, model=EMBEDDING_MODEL, max_tokens=CHUNK_MAX_TOKENS,
+                              metric=INDEX_METRIC, index_type=INDEX_TYPE, quantization=INDEX_QUANTIZATION,
+                              shard_size=INDEX_SHARD_SIZE, cache=embedding_cache)
+    bm25 = None if args.dense_only else BM25Index(chunks)
+    reranker = None if args.no_rerank else get_reranker(bm25)
+    stage_seconds["load"] = time.perf_counter() - start
+
+    questions = load_questions(args.input)
+    texts = [record["question"] for record in questions]
+    print(f"Loaded {len(questions)} questions, {len(chunks)} chunks in index")
+
+    # Embed every question in token-budgeted batches
+    start = time.perf_counter()
+    query_embeddings = asyncio.run(get_embeddings_concurrent(
+        texts, client=embedding_client, model=EMBEDDING_MODEL, show_progress=True, cache=embedding_cache))
+    stage_seconds["embed"] = time.perf_counter() - start
+
+    # One matrix search for all questions
+    start = time.perf_counter()
+    contexts = batch_query_rag(texts, query_embeddings, index, chunks, k=args.k, bm25=bm25,
+                               candidates=RERANK_CANDIDATES if reranker is not None else 20, reranker=reranker)
+    stage_seconds["search"] = time.perf_counter() - start
+
+    count = max(1, len(questions))
+    shared_timings = {"embed_ms": stage_seconds["embed"] * 1000 / count,
+                      "search_ms": stage_seconds["search"] * 1000 / count}
+
+    start = time.perf_counter()
+    failures = 0
+    with open(args.output, "w", encoding="utf-8") as output:
+        if args.retrieve_only:
+            for record, context in zip(questions, contexts):
+                output.write(json.dumps({**record, "context_chunks": context, "timings": shared_timings},
+                                        ensure_ascii=False) + "\n")
+        else:
+            failures = run_async(answer_all(questions, contexts, async_client, output, shared_timings,
+                                            max_concurrency=args.concurrency,
+                                            max_context_tokens=args.max_context_tokens,
+                                            include_context=args.include_context))
+    stage_seconds["generate"] = time.perf_counter() - start
+
+    print("Stage timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stage_seconds.items()))
+    print(f"Wrote {len(questions)} results to {args.output} ({failures} failed)")
+    print(f"Embedding cache: {embedding_cache.stats()}")
@@ -0,0 +1,104 @@
+import time
+import argparse
+import tiktoken
+from typing import List, Optional
+from text_chunking import chunk_text
+from data_extraction import extract_text_from_pdf
+from ingestion import load_json_pages
+
+
+def chunk_text_legacy(text: str, max_tokens: int = 1000, delimiters: Optional[List[str]] = None) -> List[str]:
+    """
+    The original per-character chunker, kept verbatim as the benchmark baseline.
+    """
+    if not text:
+        return []
+
+    if delimiters is None:
+        delimiters = ['.', '!', '?', '\n']
+
+    encoding = tiktoken.encoding_for_model("gpt-4o")
+
+    chunks = []
+    current_chunk = ""
+    current_chunk_tokens = 0
+
+    sentences = []
+    current_sentence = ""
+
+    for char in text:
+        current_sentence += char
+        if char in delimiters:
+            sentences.append(current_sentence)
+            current_sentence = ""
+
+    if current_sentence:
+        sentences.append(current_sentence)
+
+    for sentence in sentences:
+        sentence_tokens = len(encoding.encode(sentence))
+
+        if current_chunk_tokens + sentence_tokens <= max_tokens:
+            current_chunk += sentence
+            current_chunk_tokens += sentence_tokens
+        else:
+            if current_chunk:
+                chunks.append(current_chunk)
+            current_chunk = sentence
+            current_chunk_tokens = sentence_tokens
+
+    if current_chunk:
+        chunks.append(current_chunk)
+
+    return chunks
+
+
+def load_corpus(pdf_pattern: str, json_path: str, filter_path: str) -> str:
+    """
+    Build one combined text from the PDFs and the filtered JSON pages, as ingestion sees them.
+    """
+    pdf_text = extract_text_from_pdf(pdf_pattern)
+    filtered_json_data = load_json_pages(json_path, filter_path)
+
+    json_text = "\n\n".join(filtered_json_data.values())
+    return pdf_text + "\n\n" + json_text
+
+
+def time_call(fn, *args, repeat: int = 3, **kwargs):
+    """
+    Run fn repeat times and return (best wall time in seconds, last result).
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the legacy and current chunk_text implementations")
+    parser.add_argument("--pdf-pattern", default="data/*.pdf")
+    parser.add_argument("--json-path", default="json_data/eon_data.json")
+    parser.add_argument("--filter-path", default="filter_text/text_1.txt")
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.pdf_pattern, args.json_path, args.filter_path)
+    print(f"Corpus: {len(corpus):,} characters")
+
+    # Warm up the tokenizer so neither run pays for loading it
+    tiktoken.encoding_for_model("gpt-4o").encode("warm-up")
+
+    legacy_time, legacy_chunks = time_call(chunk_text_legacy, corpus, max_tokens=args.max_tokens, repeat=args.repeat)
+    new_time, new_chunks = time_call(chunk_text, corpus, max_tokens=args.max_tokens, repeat=args.repeat)
+
+    print(f"Legacy chunk_text: {legacy_time:.3f}s ({len(legacy_chunks)} chunks)")
+    print(f"Current chunk_text: {new_time:.3f}s ({len(new_chunks)} chunks)")
+    print(f"Speed-up: {legacy_time / new_time:.1f}x")
+
+    if legacy_chunks != new_chunks:
+        raise SystemExit("Chunk boundaries differ between the legacy and current implementations")
+    print("Chunk boundaries are identical")
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import argparse
+import faiss
+import numpy as np
+from typing import List, Dict, Any, Optional
+from vector_index import build_index, set_search_params
+
+
+def load_vectors(index_path: str) -> np.ndarray:
+    """
+    Recover the stored vectors of a saved flat index (optionally wrapped in an ID map).
+    """
+    index = faiss.read_index(index_path)
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return inner.reconstruct_n(0, inner.ntotal)
+
+
+def recall_at_k(approximate: np.ndarray, exact: np.ndarray) -> float:
+    """
+    Fraction of the exact top-k neighbours that the approximate search also returned.
+    """
+    k = exact.shape[1]
+    hits = sum(len(set(a[a >= 0]) & set(e)) for a, e in zip(approximate, exact))
+    return hits / (k * len(exact))
+
+
+def measure(index: Any, queries: np.ndarray, k: int, repeat: int) -> Dict[str, Any]:
+    """
+    Search one query at a time, as query_rag does, and return the neighbours and per-query latencies.
+    """
+    latencies = []
+    neighbours = None
+    for _ in range(repeat):
+        results = []
+        for query in queries:
+            start = time.perf_counter()
+            _, indices = index.search(query.reshape(1, -1), k)
+            latencies.append(time.perf_counter() - start)
+            results.append(indices[0])
+        neighbours = np.vstack(results)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "neighbours": neighbours,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "qps": float(len(latencies) / (latencies_ms.sum() / 1000)),
+    }
+
+
+def run_report(vectors: np.ndarray,
+               num_queries: int,
+               k: int,
+               metric: str,
+               nprobes: List[int],
+               ef_searches: List[int],
+               index_types: List[str],
+               nlist: Optional[int],
+               pq_m: Optional[int],
+               repeat: int) -> List[Dict[str, Any]]:
+    """
+    Build every requested index type and compare recall@k and latency against the flat index.
+    """
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    queries = np.ascontiguousarray(vectors[order[:num_queries]], dtype="float32")
+    base = vectors[order[num_queries:]]
+    if metric == "cosine":
+        faiss.normalize_L2(queries)
+
+    rows = []
+    start = time.perf_counter()
+    flat = build_index(base, metric=metric, index_type="flat")
+    build_s = time.perf_counter() - start
+    exact = measure(flat, queries, k, repeat)
+    rows.append({"index_type": "flat", "param": None, "build_s": build_s, "recall": 1.0,
+                 **{key: exact[key] for key in ("p50_ms", "p95_ms", "qps")}})
+
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_index(base, metric=metric, index_type=index_type, nlist=nlist, pq_m=pq_m)
+        build_s = time.perf_counter() - start
+
+        if index_type == "hnsw":
+            sweep = [("efSearch", value) for value in ef_searches]
+        else:
+            sweep = [("nprobe", value) for value in nprobes]
+
+        for name, value in sweep:
+            set_search_params(index, **({"ef_search": value} if name == "efSearch" else {"nprobe": value}))
+            result = measure(index, queries, k, repeat)
+            rows.append({
+                "index_type": index_type,
+                "param": f"{name}={value}",
+                "build_s": build_s,
+                "recall": recall_at_k(result["neighbours"], exact["neighbours"]),
+                **{key: result[key] for key in ("p50_ms", "p95_ms", "qps")},
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k vs. latency of approximate FAISS indexes against the flat index")
+    parser.add_argument("--index-path", help="Saved flat index to take vectors from, e.g. index_store/<key>/index.faiss")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Number of random vectors when no index is given")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimension of the synthetic vectors")
+    parser.add_argument("--metric", choices=["l2", "cosine"], default="l2")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=7)
+    parser.add_argument("--types", nargs="+", default=["ivf", "hnsw", "ivfpq", "opq"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--pq-m", type=int)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", help="Also write the report rows to this JSON file")
+    args = parser.parse_args()
+
+    if args.index_path:
+        vectors = load_vectors(args.index_path)
+    else:
+        vectors = np.random.default_rng(1).standard_normal((args.synthetic, args.dim)).astype("float32")
+    print(f"Vectors: {len(vectors):,} x {vectors.shape[1]}, queries: {args.queries}, k={args.k}")
+
+    rows = run_report(vectors, args.queries, args.k, args.metric, args.nprobe, args.ef_search,
+                      args.types, args.nlist, args.pq_m, args.repeat)
+
+    print(f"{'index':<8}{'param':<16}{'build s':>10}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'QPS':>10}")
+    for row in rows:
+        print(f"{row['index_type']:<8}{row['param'] or '-':<16}{row['build_s']:>10.2f}{row['recall']:>10.3f}"
+              f"{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}{row['qps']:>10.0f}")
+
+    if args.json:
+        directory = os.path.dirname(args.json)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
@@ -0,0 +1,252 @@
+import os
+import json
+import glob
+import time
+import asyncio
+import argparse
+import platform
+import faiss
+import numpy as np
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from data_extraction import iter_pdf_pages
+from text_chunking import chunk_text
+from embedding import get_embeddings_concurrent
+from lexical_index import BM25Index
+from vector_index import RescoringIndex, build_index, set_search_params
+from ingestion import load_json_pages
+from query_handler import hybrid_query_rag, generate_answer, generate_answer_stream
+from fake_openai import FakeOpenAI
+
+# Used when no --questions file is given; the sidebar examples plus typical product questions
+SAMPLE_QUESTIONS = [
+    "Cum pot instala panouri solare?",
+    "Care sunt beneficiile E.ON Solar?",
+    "Cum îmi creez un cont E.ON Myline?",
+    "Ce metode de plată sunt disponibile?",
+    "E inseamna E.ON Solar Casa Verde",
+    "Ce pompe de căldură NIBE oferiți?",
+    "Care sunt condițiile campaniei buy back Ariston?",
+    "Cine a câștigat la Green Steps?",
+]
+
+
+def summarize(latencies: List[float], items: Optional[int] = None) -> Dict[str, float]:
+    """
+    Summarize per-operation latencies.
+
+    Args:
+        latencies: Latency of every operation, in seconds
+        items: Number of items processed in total, if different from the number of operations
+
+    Returns:
+        A dictionary with count, mean/p50/p95/p99 in milliseconds and throughput in items per second
+    """
+    latencies_ms = np.asarray(latencies) * 1000
+    total_s = float(latencies_ms.sum()) / 1000
+    count = items if items is not None else len(latencies)
+    return {
+        "count": count,
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "throughput_per_s": count / total_s if total_s > 0 else 0.0,
+    }
+
+
+def timed(function: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[float, Any]:
+    """
+    Call a function and measure its wall-clock time.
+
+    Returns:
+        A tuple of (seconds, result)
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_extraction(pdf_files: List[str], repeat: int) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Time PDF text extraction per page and return the extracted text of each file.
+    """
+    latencies, pages, texts = [], 0, {}
+    for _ in range(repeat):
+        texts = {}
+        seconds, records = timed(lambda: list(iter_pdf_pages(pdf_files)))
+        latencies.append(seconds)
+        pages = len(records)
+        for record in records:
+            texts[record.source] = texts.get(record.source, "") + record.text + "\n"
+    result = summarize(latencies, items=pages * repeat)
+    result["pages"] = pages
+    return result, texts
+
+
+def bench_chunking(documents: List[str], max_tokens: int, repeat: int) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Time chunk_text per document and return the chunks of every document.
+    """
+    latencies, chunks = [], []
+    for _ in range(repeat):
+        chunks = []
+        for document in documents:
+            seconds, document_chunks = timed(chunk_text, document, max_tokens=max_tokens)
+            latencies.append(seconds)
+            chunks.extend(document_chunks)
+    result = summarize(latencies)
+    result["chunks"] = len(chunks)
+    result["characters_per_s"] = sum(map(len, documents)) * repeat / sum(latencies) if sum(latencies) else 0.0
+    return result, chunks
+
+
+def bench_embedding(chunks: List[str], client: FakeOpenAI, repeat: int) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    Time batched embedding of every chunk (no cache) and return the embeddings.
+    """
+    latencies, embeddings = [], []
+    for _ in range(repeat):
+        seconds, embeddings = timed(lambda: asyncio.run(get_embeddings_concurrent(chunks, client=client)))
+        latencies.append(seconds)
+    result = summarize(latencies, items=len(chunks) * repeat)
+    result["requests"] = client.calls["embeddings"]
+    return result, embeddings
+
+
+def bench_index(embeddings: np.ndarray,
+                queries: np.ndarray,
+                index_types: List[str],
+                k: int,
+                repeat: int) -> Dict[str, Any]:
+    """
+    Time building each index type and searching it one query at a time, with its size and recall@k.
+
+    Index types may carry a storage precision, e.g. "flat:int8" or "hnsw:float16". "bytes" is the size of
+    the index held in memory; "rescore_bytes" is the size of the float32 vectors a quantized index
+    reads its candidates from, which stay on disk.
+    """
+    _, exact = build_index(embeddings).search(queries, k)
+    results = {}
+    for spec in index_types:
+        index_type, _, quantization = spec.partition(":")
+        build_s, index = timed(build_index, embeddings, index_type=index_type, quantization=quantization or None)
+        if index_type != "flat":
+            set_search_params(index, nprobe=16, ef_search=64)
+        latencies = []
+        for _ in range(repeat):
+            for query in queries:
+                seconds, _ = timed(index.search, query.reshape(1, -1), k)
+                latencies.append(seconds)
+        _, found = index.search(queries, k)
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(exact, found)])
+        rescoring = isinstance(index, RescoringIndex)
+        results[spec] = {"build_s": build_s,
+                         "bytes": int(faiss.serialize_index(index.index if rescoring else index).nbytes),
+                         "rescore_bytes": int(index.vectors.nbytes) if rescoring else 0,
+                         "recall_at_k": float(recall), "search": summarize(latencies)}
+    return results
+
+
+def bench_queries(questions: List[str],
+                  index: Any,
+                  chunks: List[str],
+                  bm25: BM25Index,
+                  client: FakeOpenAI,
+                  k: int,
+                  max_context_tokens: int) -> Dict[str, Any]:
+    """
+    Time retrieval, full answers and time to first streamed token for every question.
+    """
+    retrieval, answer, first_token, context_tokens = [], [], [], []
+    for question in questions:
+        start = time.perf_counter()
+        relevant_chunks = hybrid_query_rag(question, index, chunks, bm25, k=k, client=client)
+        retrieval.append(time.perf_counter() - start)
+
+        usage = {}
+        generate_answer(question, relevant_chunks, client=client, max_context_tokens=max_context_tokens, usage=usage)
+        answer.append(time.perf_counter() - start)
+        context_tokens.append(usage.get("context_tokens", 0))
+
+        start = time.perf_counter()
+        stream = generate_answer_stream(question, relevant_chunks, client=client, max_context_tokens=max_context_tokens)
+        next(stream, None)
+        first_token.append(time.perf_counter() - start)
+        stream.close()
+
+    return {
+        "retrieval": summarize(retrieval),
+        "end_to_end": summarize(answer),
+        "time_to_first_token": summarize(first_token),
+        "mean_context_tokens": float(np.mean(context_tokens)) if context_tokens else 0.0,
+    }
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run every stage of the pipeline against the fake OpenAI client and collect the measurements.
+    """
+    client = FakeOpenAI(dimension=args.dim,
+                        embedding_latency=args.embedding_latency,
+                        first_token_latency=args.first_token_latency,
+                        token_latency=args.token_latency)
+    report: Dict[str, Any] = {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+    }
+
+    pdf_files = sorted(glob.glob(args.pdf_pattern))
+    report["extraction"], pdf_texts = bench_extraction(pdf_files, args.repeat)
+
+    documents = list(pdf_texts.values())
+    if os.path.exists(args.json_path):
+        documents.extend(load_json_pages(args.json_path, args.filter_path).values())
+    report["chunking"], chunks = bench_chunking(documents, args.max_tokens, args.repeat)
+    if not chunks:
+        raise SystemExit("No text could be extracted from the configured sources")
+
+    report["embedding"], embeddings = bench_embedding(chunks, client, args.repeat)
+
+    questions = SAMPLE_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [json.loads(line)["question"] for line in f if line.strip()]
+    query_vectors = np.array([client.embeddings.create(input=q, model="fake").data[0].embedding for q in questions],
+                             dtype="float32")
+    report["index"] = bench_index(embeddings, query_vectors, args.types, args.k, args.repeat)
+
+    index = build_index(embeddings)
+    report["query"] = bench_queries(questions, index, chunks, BM25Index(chunks), client, args.k, args.max_context_tokens)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark with a fake OpenAI client")
+    parser.add_argument("--pdf-pattern", default="data/*.pdf")
+    parser.add_argument("--json-path", default="json_data/eon_data.json")
+    parser.add_argument("--filter-path", default="filter_text/text_1.txt")
+    parser.add_argument("--questions", help="JSONL file of {\"question\"} objects (default: built-in sample)")
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--max-context-tokens", type=int, default=3000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", nargs="+", default=["flat", "hnsw"],
+                        help="Index types to compare, optionally with a precision, e.g. flat:int8 hnsw:float16")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Simulated seconds per embeddings request")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="Simulated seconds to the first answer token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Simulated seconds per answer token")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Write the report to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+
+    if args.json:
+        directory = os.path.dirname(args.json)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,210 @@
+import os
+import math
+import argparse
+import numpy as np
+from typing import List, Dict, Iterable, Iterator, Callable, Optional, Tuple
+from data_extraction import iter_json_pages
+
+
+def _line_hashes(lines: List[str]) -> np.ndarray:
+    return np.fromiter(map(hash, lines), dtype=np.int64, count=len(lines))
+
+
+def _merge_counts(hashes: np.ndarray, counts: np.ndarray, batch: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    # Add the per-page line hashes of a batch to the running (sorted hashes, page counts)
+    if not batch:
+        return hashes, counts
+    merged, inverse = np.unique(np.concatenate([hashes] + batch), return_inverse=True)
+    weights = np.concatenate([counts, np.ones(len(inverse) - len(counts), dtype=np.int64)])
+    return merged, np.bincount(inverse, weights=weights, minlength=len(merged)).astype(np.int64)
+
+
+def load_filter_lines(filter_path: Optional[str]) -> List[str]:
+    """
+    Read a hand-maintained list of noise lines, one per line.
+
+    Args:
+        filter_path: Path of the list; a missing path or file yields an empty list
+
+    Returns:
+        The stripped, non-empty lines in file order
+    """
+    if filter_path is None or not os.path.exists(filter_path):
+        return []
+    with open(filter_path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class BoilerplateFilter:
+    """
+    Remove navigation, footer and other boilerplate lines from crawled pages.
+
+    fit() counts, in one pass, on how many pages each distinct (stripped) line occurs, using
+    NumPy arrays of line hashes rather than per-line string sets. Lines occurring on at least
+    max(min_pages, min_fraction * pages) pages are boilerplate. The fraction is high (30%) on
+    purpose: site-wide menus and footers are on most pages, while product and brand lines such
+    as "Ariston" or "Preț plafonat" repeat on a few percent of pages and must stay retrievable.
+    Only short lines, up to max_line_length characters, are candidates, like navigation labels;
+    longer repeated lines are shared content. Noise specific to one section of the site belongs
+    in the exact list, whose lines are always removed, as are empty lines.
+    """
+
+    def __init__(self,
+                 min_pages: int = 5,
+                 min_fraction: float = 0.3,
+                 max_line_length: int = 80,
+                 exact_lines: Iterable[str] = (),
+                 batch_pages: int = 1000):
+        """
+        Args:
+            min_pages: Minimum number of pages a line must occur on to count as boilerplate (default: 5)
+            min_fraction: Minimum fraction of pages a line must occur on (default: 0.3)
+            max_line_length: Longest line, in characters, that can be detected as boilerplate (default: 80)
+            exact_lines: Lines removed regardless of frequency, e.g. from load_filter_lines
+            batch_pages: Number of pages whose line hashes are merged into the counts at once (default: 1000)
+        """
+        self.min_pages = min_pages
+        self.min_fraction = min_fraction
+        self.max_line_length = max_line_length
+        self.batch_pages = batch_pages
+        self.exact_hashes = np.unique(_line_hashes([line.strip() for line in exact_lines]))
+        self.drop_hashes = self.exact_hashes
+        self.num_pages = 0
+        self.threshold = 0
+        self._page_counts: Dict[int, int] = {}
+
+    def fit(self, pages: Iterable[str]) -> "BoilerplateFilter":
+        """
+        Learn which lines are boilerplate from a collection of pages.
+
+        Line counts are merged every batch_pages pages, so pages can be streamed and memory
+        grows with the number of distinct lines rather than the size of the crawl.
+
+        Args:
+            pages: The page texts, e.g. a generator
+
+        Returns:
+            The filter itself
+        """
+        hashes, counts = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        self.num_pages = 0
+        batch = []
+        for text in pages:
+            # Each page counts once per distinct line
+            lines = [line.strip() for line in text.split("\n")]
+            batch.append(np.unique(_line_hashes([line for line in lines if len(line) <= self.max_line_length])))
+            self.num_pages += 1
+            if len(batch) == self.batch_pages:
+                hashes, counts = _merge_counts(hashes, counts, batch)
+                batch = []
+        hashes, counts = _merge_counts(hashes, counts, batch)
+
+        self.threshold = max(self.min_pages, math.ceil(self.min_fraction * self.num_pages))
+        frequent = hashes[counts >= self.threshold]
+        self.drop_hashes = np.union1d(self.exact_hashes, frequent)
+        self._page_counts = dict(zip(frequent.tolist(), counts[counts >= self.threshold].tolist()))
+        return self
+
+    def filter(self, text: str) -> str:
+        """
+        Drop boilerplate, exact-listed and empty lines from a page.
+
+        Args:
+            text: The page text
+
+        Returns:
+            The remaining lines joined with newlines
+        """
+        lines = text.split("\n")
+        stripped = [line.strip() for line in lines]
+        keep = ~np.isin(_line_hashes(stripped), self.drop_hashes)
+        return "\n".join(line for line, clean, kept in zip(lines, stripped, keep) if kept and clean)
+
+    def boilerplate_lines(self, pages: Iterable[str]) -> List[Tuple[str, int]]:
+        """
+        List the detected boilerplate lines, most frequent first, e.g. to review them.
+
+        Args:
+            pages: The pages the filter was fitted on, to recover the line texts from their hashes
+
+        Returns:
+            (line, page_count) pairs
+        """
+        found = {}
+        for text in pages:
+            for line in text.split("\n"):
+                line = line.strip()
+                if line and line not in found and hash(line) in self._page_counts:
+                    found[line] = self._page_counts[hash(line)]
+        return sorted(found.items(), key=lambda pair: pair[1], reverse=True)
+
+
+def iter_filtered_pages(read_pages: Callable[[], Iterable[Tuple[str, str]]],
+                        filter_path: Optional[str] = None,
+                        detect_boilerplate: bool = True,
+                        min_pages: int = 5,
+                        min_fraction: float = 0.3,
+                        max_line_length: int = 80) -> Iterator[Tuple[str, str]]:
+    """
+    Stream crawled pages cleaned with the exact noise list and, optionally, automatic boilerplate detection.
+
+    With detection on, the pages are read twice: once to count lines, once to filter them. Only
+    one page is held in memory at a time.
+
+    Args:
+        read_pages: Called to start each pass over the (url, text) pairs, e.g. lambda: iter_json_pages(path)
+        filter_path: Optional path to a file listing noise lines to remove, one per line
+        detect_boilerplate: Whether to also remove lines repeated across many pages (default: True)
+        min_pages: Minimum number of pages a line must occur on to count as boilerplate (default: 5)
+        min_fraction: Minimum fraction of pages a line must occur on (default: 0.3)
+        max_line_length: Longest line, in characters, that can be detected as boilerplate (default: 80)
+
+    Yields:
+        (url, filtered_text) pairs in input order
+    """
+    boilerplate = BoilerplateFilter(min_pages, min_fraction, max_line_length,
+                                    exact_lines=load_filter_lines(filter_path))
+    if detect_boilerplate:
+        boilerplate.fit(text for _, text in read_pages())
+    for url, text in read_pages():
+        yield url, boilerplate.filter(text)
+
+
+def filter_pages(pages: Dict[str, str],
+                 filter_path: Optional[str] = None,
+                 detect_boilerplate: bool = True,
+                 min_pages: int = 5,
+                 min_fraction: float = 0.3,
+                 max_line_length: int = 80) -> Dict[str, str]:
+    """
+    Clean every crawled page with the exact noise list and, optionally, automatic boilerplate detection.
+
+    Args:
+        pages: A dictionary mapping each URL to its text
+        filter_path: Optional path to a file listing noise lines to remove, one per line
+        detect_boilerplate: Whether to also remove lines repeated across many pages (default: True)
+        min_pages: Minimum number of pages a line must occur on to count as boilerplate (default: 5)
+        min_fraction: Minimum fraction of pages a line must occur on (default: 0.3)
+        max_line_length: Longest line, in characters, that can be detected as boilerplate (default: 80)
+
+    Returns:
+        A dictionary mapping each URL to its filtered text
+    """
+    return dict(iter_filtered_pages(pages.items, filter_path, detect_boilerplate,
+                                    min_pages, min_fraction, max_line_length))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the boilerplate lines detected in the crawled pages")
+    parser.add_argument("--json-path", default="json_data/eon_data.json")
+    parser.add_argument("--min-pages", type=int, default=5)
+    parser.add_argument("--min-fraction", type=float, default=0.3)
+    parser.add_argument("--max-line-length", type=int, default=80)
+    args = parser.parse_args()
+
+    pages = lambda: (text for _, text in iter_json_pages(args.json_path))
+    boilerplate = BoilerplateFilter(args.min_pages, args.min_fraction, args.max_line_length).fit(pages())
+    lines = boilerplate.boilerplate_lines(pages())
+    print(f"{len(lines)} boilerplate lines on at least {boilerplate.threshold} of {boilerplate.num_pages} pages:")
+    for line, count in lines:
+        print(f"{count:>6}  {line}")
@@ -0,0 +1,237 @@
+import os
+import json
+import numpy as np
+from collections.abc import Mapping
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple, NamedTuple
+
+# Files of a saved store, all inside one directory
+TEXT_FILE = "text.bin"
+SOURCES_FILE = "sources.json"
+COLUMNS = ("ids", "offsets", "source_index", "page", "start", "end", "tokens", "ref_offsets", "ref_sources")
+
+
+class ChunkMetadata(NamedTuple):
+    """Where a chunk came from: its source file or "url:<url>", page, character span in the source text and size."""
+    source: str
+    page: Optional[int]
+    start: int
+    end: int
+    tokens: int
+
+
+class ChunkStore(Mapping):
+    """
+    Read-only, columnar store of chunk texts and their metadata, keyed by vector ID.
+
+    All texts live in one contiguous UTF-8 buffer addressed by an offsets array, and the
+    metadata is kept in parallel NumPy columns, so a loaded store holds no per-chunk Python
+    objects. Saved stores can be memory-mapped, letting worker processes share the same pages.
+    Behaves like a Mapping from vector ID to chunk text, so it can replace the chunk dictionary
+    anywhere; metadata(chunk_id) returns the chunk's ChunkMetadata and sources(chunk_id) every
+    source containing the chunk when near-duplicates were collapsed into it.
+    """
+
+    def __init__(self,
+                 ids: np.ndarray,
+                 offsets: np.ndarray,
+                 text: np.ndarray,
+                 sources: List[str],
+                 source_index: np.ndarray,
+                 page: np.ndarray,
+                 start: np.ndarray,
+                 end: np.ndarray,
+                 tokens: np.ndarray,
+                 ref_offsets: np.ndarray,
+                 ref_sources: np.ndarray):
+        """
+        Use from_records or load rather than calling this directly.
+
+        Args:
+            ids: Sorted vector IDs (int64)
+            offsets: Byte offsets of each text in the buffer, one more than there are chunks (int64)
+            text: The UTF-8 buffer holding every chunk text (uint8)
+            sources: The distinct source names
+            source_index: Position of each chunk's source in sources (int32)
+            page: Page each chunk starts on, -1 when not paged (int32)
+            start: Start character offset of each chunk in its source text (int64)
+            end: End character offset of each chunk in its source text (int64)
+            tokens: Token count of each chunk (int32)
+            ref_offsets: Offsets of each chunk's references in ref_sources, one more than there are chunks (int64)
+            ref_sources: Positions in sources of every source referencing each chunk (int32)
+        """
+        self.ids = ids
+        self._offsets = offsets
+        self._text = text
+        self._sources = sources
+        self._source_index = source_index
+        self._page = page
+        self._start = start
+        self._end = end
+        self._tokens = tokens
+        self._ref_offsets = ref_offsets
+        self._ref_sources = ref_sources
+
+    @classmethod
+    def from_records(cls,
+                     records: Iterable[Tuple[int, str, ChunkMetadata]],
+                     references: Optional[Dict[int, List[str]]] = None) -> "ChunkStore":
+        """
+        Build an in-memory store.
+
+        Args:
+            records: (chunk_id, text, metadata) tuples in any order
+            references: Optional mapping from chunk ID to every source containing the chunk; chunks
+                without an entry are referenced by their metadata source only
+
+        Returns:
+            A new ChunkStore
+        """
+        references = references or {}
+        records = sorted(records, key=lambda record: record[0])
+        # Texts are appended to one buffer, so no second list of encoded copies is kept
+        text = bytearray()
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        for row, (_, chunk_text, _) in enumerate(records):
+            text += chunk_text.encode("utf-8")
+            offsets[row + 1] = len(text)
+
+        sources: List[str] = []
+        positions = {}
+
+        def position(source: str) -> int:
+            if source not in positions:
+                positions[source] = len(sources)
+                sources.append(source)
+            return positions[source]
+
+        source_index = np.empty(len(records), dtype=np.int32)
+        ref_offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        ref_sources: List[int] = []
+        for row, (chunk_id, _, metadata) in enumerate(records):
+            source_index[row] = position(metadata.source)
+            ref_sources.extend(position(source) for source in references.get(chunk_id, [metadata.source]))
+            ref_offsets[row + 1] = len(ref_sources)
+
+        return cls(
+            ids=np.fromiter((chunk_id for chunk_id, _, _ in records), dtype=np.int64, count=len(records)),
+            offsets=offsets,
+            text=np.frombuffer(text, dtype=np.uint8),
+            sources=sources,
+            source_index=source_index,
+            page=np.array([-1 if m.page is None else m.page for _, _, m in records], dtype=np.int32),
+            start=np.array([m.start for _, _, m in records], dtype=np.int64),
+            end=np.array([m.end for _, _, m in records], dtype=np.int64),
+            tokens=np.array([m.tokens for _, _, m in records], dtype=np.int32),
+            ref_offsets=ref_offsets,
+            ref_sources=np.array(ref_sources, dtype=np.int32),
+        )
+
+    def save(self, directory: str) -> None:
+        """
+        Write the store to a directory: the text buffer, one .npy file per column and the source names.
+
+        Args:
+            directory: The directory to write to; created if missing
+        """
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, TEXT_FILE), "wb") as f:
+            f.write(self._text.tobytes())
+        for name in COLUMNS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(self._column(name)))
+        with open(os.path.join(directory, SOURCES_FILE), "w", encoding="utf-8") as f:
+            json.dump(self._sources, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ChunkStore":
+        """
+        Open a store saved with save.
+
+        Args:
+            directory: The directory the store was saved to
+            mmap: Whether to memory-map the text and columns instead of reading them (default: True)
+
+        Returns:
+            The loaded ChunkStore
+        """
+        mode = "r" if mmap else None
+        columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in COLUMNS}
+
+        text_path = os.path.join(directory, TEXT_FILE)
+        if mmap and os.path.getsize(text_path) > 0:
+            text = np.memmap(text_path, dtype=np.uint8, mode="r")
+        else:
+            text = np.fromfile(text_path, dtype=np.uint8)
+
+        with open(os.path.join(directory, SOURCES_FILE), "r", encoding="utf-8") as f:
+            sources = json.load(f)
+        return cls(text=text, sources=sources, **columns)
+
+    def _column(self, name: str) -> np.ndarray:
+        return self.ids if name == "ids" else getattr(self, f"_{name}")
+
+    def _row(self, chunk_id: int) -> int:
+        row = int(np.searchsorted(self.ids, chunk_id))
+        if row >= len(self.ids) or self.ids[row] != chunk_id:
+            raise KeyError(chunk_id)
+        return row
+
+    def __getitem__(self, chunk_id: int) -> str:
+        row = self._row(chunk_id)
+        return self._text[self._offsets[row]:self._offsets[row + 1]].tobytes().decode("utf-8")
+
+    def __contains__(self, chunk_id: object) -> bool:
+        try:
+            self._row(chunk_id)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(chunk_id) for chunk_id in self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def metadata(self, chunk_id: int) -> ChunkMetadata:
+        """
+        Return where a chunk came from.
+
+        Args:
+            chunk_id: The chunk's vector ID
+
+        Returns:
+            The chunk's ChunkMetadata
+        """
+        row = self._row(chunk_id)
+        page = int(self._page[row])
+        return ChunkMetadata(self._sources[self._source_index[row]], None if page < 0 else page,
+                             int(self._start[row]), int(self._end[row]), int(self._tokens[row]))
+
+    def sources(self, chunk_id: int) -> List[str]:
+        """
+        Return every source containing a chunk, e.g. all PDFs sharing a collapsed regulation paragraph.
+
+        Args:
+            chunk_id: The chunk's vector ID
+
+        Returns:
+            The sources currently containing the chunk
+        """
+        row = self._row(chunk_id)
+        positions = self._ref_sources[self._ref_offsets[row]:self._ref_offsets[row + 1]]
+        return [self._sources[position] for position in positions]
+
+    def records(self) -> Iterator[Tuple[int, str, ChunkMetadata]]:
+        """
+        Iterate over every chunk, e.g. to build an updated store.
+
+        Yields:
+            (chunk_id, text, metadata) tuples in ID order
+        """
+        for chunk_id in self:
+            yield chunk_id, self[chunk_id], self.metadata(chunk_id)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the text buffer and metadata columns in bytes."""
+        return int(self._text.nbytes + sum(self._column(name).nbytes for name in COLUMNS))
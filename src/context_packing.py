@@ -0,0 +1,109 @@
+import math
+from collections import Counter
+from typing import List, Dict, NamedTuple
+from text_chunking import get_encoding, split_sentences
+from lexical_index import tokenize
+
+
+class PackedContext(NamedTuple):
+    """The context chunks selected for a prompt and what packing them cost."""
+    chunks: List[str]
+    tokens: int
+    dropped: int
+    trimmed: int
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def _trim_to_budget(query_terms: Counter, text: str, budget: int, model: str) -> str:
+    # Keep the sentences sharing most terms with the query, in their original order
+    sentences = split_sentences(text)
+    counts = [len(tokens) for tokens in get_encoding(model).encode_batch(sentences)]
+    scores = [_cosine(query_terms, Counter(tokenize(sentence))) for sentence in sentences]
+
+    kept, used = set(), 0
+    for i in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        if scores[i] <= 0:
+            break
+        if used + counts[i] <= budget:
+            kept.add(i)
+            used += counts[i]
+    return "".join(sentences[i] for i in sorted(kept)).strip()
+
+
+def pack_context(query: str,
+                 chunks: List[str],
+                 max_tokens: int = 3000,
+                 diversity: float = 0.3,
+                 redundancy_threshold: float = 0.9,
+                 min_trim_tokens: int = 64,
+                 model: str = "gpt-4o") -> PackedContext:
+    """
+    Select the retrieved chunks that go into the prompt without exceeding a token budget.
+
+    Chunks are taken in maximal marginal relevance order: their retrieval rank is the relevance
+    and their lexical overlap with already selected chunks is the redundancy penalty. Near
+    duplicates are dropped outright. A chunk that no longer fits the remaining budget is cut
+    down to its sentences most relevant to the query, or skipped when less than min_trim_tokens
+    remain. The total never exceeds max_tokens.
+
+    Args:
+        query: The user's question or query
+        chunks: The retrieved chunks, most relevant first
+        max_tokens: Maximum number of context tokens (default: 3000)
+        diversity: Weight of the redundancy penalty, between 0 (rank order) and 1 (default: 0.3)
+        redundancy_threshold: Similarity to a selected chunk above which a chunk is dropped (default: 0.9)
+        min_trim_tokens: Smallest remaining budget worth filling with a trimmed chunk (default: 64)
+        model: The model whose tokenizer counts the tokens (default: gpt-4o)
+
+    Returns:
+        A PackedContext with the selected chunks, their total token count and how many chunks
+        were dropped or trimmed
+    """
+    if not chunks:
+        return PackedContext([], 0, 0, 0)
+
+    encoding = get_encoding(model)
+    token_counts = [len(tokens) for tokens in encoding.encode_batch(chunks)]
+    query_terms = Counter(tokenize(query))
+    terms = [Counter(tokenize(chunk)) for chunk in chunks]
+    relevance = [1.0 - i / len(chunks) for i in range(len(chunks))]
+
+    remaining = list(range(len(chunks)))
+    max_similarity = [0.0] * len(chunks)
+    selected: List[str] = []
+    used = trimmed = 0
+
+    while remaining and max_tokens - used > 0:
+        best = max(remaining,
+                   key=lambda i: (1 - diversity) * relevance[i] - diversity * max_similarity[i])
+        remaining.remove(best)
+        if max_similarity[best] >= redundancy_threshold:
+            continue
+
+        budget = max_tokens - used
+        if token_counts[best] <= budget:
+            text, tokens = chunks[best], token_counts[best]
+        elif budget >= min_trim_tokens:
+            text = _trim_to_budget(query_terms, chunks[best], budget, model)
+            tokens = len(encoding.encode(text))
+            # Joined sentences can encode to more tokens than counted separately
+            if not text or tokens > budget:
+                continue
+            trimmed += 1
+        else:
+            # Too little room to trim this chunk, but a shorter one further down may still fit whole
+            continue
+
+        selected.append(text)
+        used += tokens
+        for i in remaining:
+            max_similarity[i] = max(max_similarity[i], _cosine(terms[i], terms[best]))
+
+    return PackedContext(selected, used, len(chunks) - len(selected), trimmed)
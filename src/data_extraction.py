@@ -1,41 +1,169 @@
+import os
 import json
 import glob
-import PyPDF2
-from typing import List, Dict, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Dict, Union, Optional, Iterator, NamedTuple, Tuple, Any, TextIO
 
 
-def extract_text_from_pdf(pdf_path: Union[str, List[str]]) -> str:
+class TextRecord(NamedTuple):
+    """A piece of extracted text together with where it came from."""
+    source: str
+    page: Optional[int]
+    text: str
+
+
+def _resolve_pdf_files(pdf_path: Union[str, List[str]]) -> List[str]:
+    # Handle glob patterns
+    if isinstance(pdf_path, str) and ('*' in pdf_path or '?' in pdf_path):
+        return glob.glob(pdf_path)
+    elif isinstance(pdf_path, str):
+        return [pdf_path]
+    return list(pdf_path)
+
+
+def _extract_pdf_pages(pdf_file: str) -> List[TextRecord]:
+    """
+    Extract the text of every page of a single PDF. Runs inside worker processes.
+    """
+    # Imported on first use, so processes that only query a saved index never load PyPDF2
+    import PyPDF2
+
+    records = []
+    try:
+        with open(pdf_file, "rb") as file:
+            reader = PyPDF2.PdfReader(file)
+            for page_number, page in enumerate(reader.pages, start=1):
+                page_text = page.extract_text()
+                if page_text:
+                    records.append(TextRecord(pdf_file, page_number, page_text))
+    except Exception as e:
+        print(f"Error processing {pdf_file}: {str(e)}")
+    return records
+
+
+def iter_pdf_pages(pdf_path: Union[str, List[str]], max_workers: Optional[int] = None) -> Iterator[TextRecord]:
+    """
+    Stream the pages of one or multiple PDF files as (source, page, text) records.
+
+    Files are parsed in parallel across a process pool, since PyPDF2 is pure Python and
+    CPU-bound. At most two files per worker are in flight at once; the next file is submitted
+    as each one is yielded, in input order. Memory therefore stays bounded by a few files' worth
+    of text however many files there are, even when the consumer is slower than the workers.
+
+    Args:
+        pdf_path: Path to a PDF file, a glob pattern to match multiple PDF files, or a list of paths
+        max_workers: Maximum number of worker processes (default: number of CPUs). Use 1 to parse in-process
+
+    Yields:
+        A TextRecord for every non-empty page, with 1-based page numbers
+    """
+    pdf_files = _resolve_pdf_files(pdf_path)
+
+    if max_workers == 1 or len(pdf_files) <= 1:
+        for pdf_file in pdf_files:
+            yield from _extract_pdf_pages(pdf_file)
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    files = iter(pdf_files)
+    pending: "deque[Future]" = deque()
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        # Executor.map would submit every file up front and buffer results nobody has consumed yet
+        for pdf_file in files:
+            pending.append(executor.submit(_extract_pdf_pages, pdf_file))
+            if len(pending) == 2 * max_workers:
+                break
+        while pending:
+            records = pending.popleft().result()
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append(executor.submit(_extract_pdf_pages, next_file))
+            yield from records
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def extract_text_from_pdf(pdf_path: Union[str, List[str]], max_workers: Optional[int] = None) -> str:
     """
     Extract text content from one or multiple PDF files.
 
     Args:
         pdf_path: Path to a PDF file or a glob pattern to match multiple PDF files
+        max_workers: Maximum number of worker processes used for parsing (default: number of CPUs)
 
     Returns:
         A string containing the extracted text from all PDFs
     """
-    all_text = ""
+    return "".join(record.text + "\n\n" for record in iter_pdf_pages(pdf_path, max_workers=max_workers))
 
-    # Handle glob patterns
-    if isinstance(pdf_path, str) and ('*' in pdf_path or '?' in pdf_path):
-        pdf_files = glob.glob(pdf_path)
-    elif isinstance(pdf_path, str):
-        pdf_files = [pdf_path]
-    else:
-        pdf_files = pdf_path
 
-    for pdf_file in pdf_files:
-        try:
-            with open(pdf_file, "rb") as file:
-                reader = PyPDF2.PdfReader(file)
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        all_text += page_text + "\n\n"
-        except Exception as e:
-            print(f"Error processing {pdf_file}: {str(e)}")
+def _iter_json_array(file: TextIO, chunk_size: int) -> Iterator[Any]:
+    # Decode the elements of a top-level JSON array one at a time from a growing text buffer
+    decoder = json.JSONDecoder()
+    buffer, position, started, eof = "", 0, False, False
+    while True:
+        while position < len(buffer) and (buffer[position].isspace() or (started and buffer[position] == ",")):
+            position += 1
+        if position < len(buffer) and not started:
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array or one JSON object per line")
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # Only a separator after the element proves a number or literal is not cut off by the read
+                if eof or (end < len(buffer) and (buffer[end].isspace() or buffer[end] in ",]")):
+                    position = end
+                    yield item
+                    continue
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Malformed JSON array element: {e}") from e
+        if eof:
+            raise ValueError("Unexpected end of JSON array")
+        # Element incomplete or buffer exhausted: read more, doubling for oversized elements
+        more = file.read(max(chunk_size, len(buffer) - position))
+        eof = not more
+        buffer = buffer[position:] + more
+        position = 0
+
+
+def iter_json_pages(json_path: str, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, str]]:
+    """
+    Stream the crawled pages of a JSON or JSONL file as (url, text) pairs.
+
+    Both a top-level array of {"url", "text"} objects and line-delimited JSON (one object per
+    line) are accepted; the format is detected from the first character. Elements are decoded
+    one at a time, so memory use is bounded by the largest page rather than the file size.
+
+    Args:
+        json_path: Path to the JSON or JSONL file
+        chunk_size: Number of characters read at a time from an array file (default: 65536)
 
-    return all_text
+    Yields:
+        A (url, text) pair for every object, in file order; objects without a URL are named item_<i>
+    """
+    try:
+        with open(json_path, 'r', encoding='utf-8') as file:
+            first = file.read(1)
+            while first.isspace():
+                first = file.read(1)
+            file.seek(0)
+            if first == "[":
+                items = _iter_json_array(file, chunk_size)
+            else:
+                items = (json.loads(line) for line in file if line.strip())
+            for i, item in enumerate(items):
+                if isinstance(item, dict):
+                    yield item.get('url', f'item_{i}'), item.get('text', '')
+    except Exception as e:
+        print(f"Error processing JSON file: {str(e)}")
 
 
 def extract_from_json(json_path: str, include_urls: bool = True) -> Dict[str, str]:
@@ -43,26 +171,17 @@ def extract_from_json(json_path: str, include_urls: bool = True) -> Dict[str, st
     Extract text from a JSON file containing URLs and text.
 
     Args:
-        json_path: Path to the JSON file
+        json_path: Path to the JSON or JSONL file
         include_urls: Whether to include the URLs at the top of each text content (default: True)
 
     Returns:
         A dictionary mapping URLs to their corresponding text content
     """
     result = {}
-    try:
-        with open(json_path, 'r') as file:
-            data = json.load(file)
-            for i, item in enumerate(data):
-                if isinstance(item, dict):
-                    url = item.get('url', f'item_{i}')
-                    text = item.get('text', '')
-                    # Format the content with or without URL based on the parameter
-                    if include_urls:
-                        result[url] = f"{url}\n\n{text}\n\n\n\n"
-                    else:
-                        result[url] = f"{text}\n\n\n\n"
-    except Exception as e:
-        print(f"Error processing JSON file: {str(e)}")
-
+    for url, text in iter_json_pages(json_path):
+        # Format the content with or without URL based on the parameter
+        if include_urls:
+            result[url] = f"{url}\n\n{text}\n\n\n\n"
+        else:
+            result[url] = f"{text}\n\n\n\n"
     return result
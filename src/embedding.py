@@ -1,79 +1,459 @@
-from openai import OpenAI
-from typing import List, Optional, Union
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from typing import List, Optional, Union, Tuple, Any
+import time
+import base64
+import random
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import functools
+import contextvars
+import numpy as np
+import metrics
+from collections import deque
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, Future
 from tqdm.auto import tqdm
+from embedding_cache import EmbeddingCache
 
+# Errors worth retrying: rate limits and transient network/server failures
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
 
-def get_embedding(text: str, client: Optional[OpenAI] = None, model: str = "text-embedding-3-small") -> List[float]:
+# Hard limit on the number of inputs accepted by a single embeddings request
+MAX_INPUTS_PER_REQUEST = 2048
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Return the process-wide executor used for embedding requests, creating it on first use."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers < max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embeddings")
+            _executor_workers = max_workers
+        return _executor
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: str) -> "tiktoken.Encoding":
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "text-embedding-3-small") -> int:
+    """
+    Count the tokens the embedding model will see for a text.
+
+    Args:
+        text: The text to count tokens for
+        model: The embedding model whose tokenizer should be used (default: text-embedding-3-small)
+
+    Returns:
+        The number of tokens in the text
+    """
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
+
+
+def pack_batches(token_counts: List[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Group inputs into request batches that respect a token budget and an input count limit.
+
+    Inputs are packed greedily in their original order. An input larger than the token
+    budget is placed in a batch of its own.
+
+    Args:
+        token_counts: The token count of every input
+        max_batch_tokens: Maximum total tokens per batch
+        max_batch_size: Maximum number of inputs per batch
+
+    Returns:
+        A list of batches, each a list of positions into token_counts
+    """
+    batches = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for position, tokens in enumerate(token_counts):
+        if current and (current_tokens + tokens > max_batch_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(position)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingBackend:
+    """
+    Base class of embedding backends that run without the OpenAI API, e.g. a local CPU model.
+
+    A backend stands in for the OpenAI client wherever embeddings are requested: it exposes
+    embeddings.create with the same request and response shape, so get_embedding,
+    get_embeddings_concurrent, ingestion and the query paths accept it as their client, and
+    async_client() returns the counterpart for the async paths. Its name replaces the model
+    argument in cache keys and index artifacts, so vectors of different backends never mix.
+
+    Requests from concurrent callers are queued and embedded together by one worker thread:
+    the worker waits up to max_wait_ms for a batch to fill to max_batch_size texts, then runs
+    the model once. Subclasses set name and implement _embed_batch.
+    """
+
+    name = "backend"
+
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        """
+        Args:
+            max_batch_size: Maximum number of texts embedded in one model call (default: 32)
+            max_wait_ms: How long the worker waits for concurrent requests to join a batch (default: 2.0)
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.embeddings = SimpleNamespace(create=self._create)
+        self._queue: "deque[Tuple[List[str], Future]]" = deque()
+        self._queued_texts = 0
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed at most max_batch_size texts in one model call.
+
+        Returns:
+            A (len(texts), dimension) float32 array of L2-normalized embeddings
+        """
+        raise NotImplementedError
+
+    def _count_tokens(self, texts: List[str]) -> int:
+        return sum(len(text.split()) for text in texts)
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Queue texts for the next batch.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            A Future resolving to their (len(texts), dimension) float32 embeddings
+        """
+        future: Future = Future()
+        with self._condition:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"embeddings-{self.name}", daemon=True)
+                self._worker.start()
+            self._queue.append((list(texts), future))
+            self._queued_texts += len(texts)
+            self._condition.notify()
+        return future
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts, batched with any concurrent requests.
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            A (len(texts), dimension) float32 array of embeddings
+        """
+        return self.submit(texts).result()
+
+    def with_options(self, **kwargs: Any) -> "EmbeddingBackend":
+        """Accept OpenAI per-request options such as timeout; local calls ignore them."""
+        return self
+
+    def async_client(self) -> "AsyncEmbeddingBackend":
+        """
+        Return the awaitable counterpart of this backend, for the async query paths.
+        """
+        return AsyncEmbeddingBackend(self)
+
+    def _create(self, input: Union[str, List[str]], model: str, **kwargs: Any) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else input
+        return self._response(texts, self.embed(texts))
+
+    def _response(self, texts: List[str], vectors: np.ndarray) -> SimpleNamespace:
+        tokens = self._count_tokens(texts)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=vector) for i, vector in enumerate(vectors)],
+                               usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+    def _next_batch(self) -> List[Tuple[List[str], Future]]:
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            # Give concurrent callers a moment to join a batch that is not full yet
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while self._queued_texts < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch, size = [], 0
+            while self._queue and (not batch or size + len(self._queue[0][0]) <= self.max_batch_size):
+                texts, future = self._queue.popleft()
+                batch.append((texts, future))
+                size += len(texts)
+            self._queued_texts -= size
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                # A single large request (e.g. ingestion) is split into model-sized pieces
+                vectors = np.vstack([self._embed_batch(texts[start:start + self.max_batch_size])
+                                     for start in range(0, len(texts), self.max_batch_size)])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+
+class AsyncEmbeddingBackend:
+    """Awaitable view of an EmbeddingBackend, standing in for AsyncOpenAI; shares its batches."""
+
+    def __init__(self, backend: EmbeddingBackend):
+        self.backend = backend
+        self.name = backend.name
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    def with_options(self, **kwargs: Any) -> "AsyncEmbeddingBackend":
+        return self
+
+    async def _create(self, input: Union[str, List[str]], model: str, **kwargs: Any) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else input
+        return self.backend._response(texts, await asyncio.wrap_future(self.backend.submit(texts)))
+
+
+def embedding_model_name(client: Any, model: str) -> str:
+    """
+    Return the name embeddings from a client are cached and indexed under.
+
+    Args:
+        client: An OpenAI client, an EmbeddingBackend or its async_client()
+        model: The OpenAI embedding model requested
+
+    Returns:
+        The backend's name for an embedding backend, otherwise model
+    """
+    return client.name if isinstance(client, (EmbeddingBackend, AsyncEmbeddingBackend)) else model
+
+
+def _decode_embedding(embedding: Union[str, List[float], np.ndarray]) -> np.ndarray:
+    # base64 responses carry the raw little-endian float32 buffer; decode it without boxing floats
+    if isinstance(embedding, str):
+        return np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def _stack(vectors: List[np.ndarray]) -> np.ndarray:
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.vstack(vectors).astype(np.float32, copy=False)
+
+
+def _create_embeddings(client: OpenAI, inputs: Union[str, List[str]], model: str, max_retries: int) -> np.ndarray:
+    """
+    Call the embeddings endpoint, retrying with exponential backoff and jitter on transient errors.
+
+    Vectors are requested base64-encoded and decoded straight into one float32 array.
+
+    Returns:
+        A (len(inputs), dimension) float32 array of embeddings in the same order as the inputs
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.embeddings.create(input=inputs, model=model, encoding_format="base64")
+            metrics.increment("tokens", response.usage.total_tokens, kind="embedding")
+            return np.vstack([_decode_embedding(item.embedding)
+                              for item in sorted(response.data, key=lambda item: item.index)])
+        except RETRYABLE_ERRORS:
+            if attempt == max_retries:
+                raise
+            metrics.increment("api_retries", endpoint="embeddings")
+            time.sleep(min(60.0, 2 ** attempt) * (0.5 + random.random()))
+
+
+def get_embedding(text: str,
+                  client: Optional[OpenAI] = None,
+                  model: str = "text-embedding-3-small",
+                  cache: Optional[EmbeddingCache] = None,
+                  max_retries: int = 6) -> np.ndarray:
     """
     Generate an embedding vector for the provided text using OpenAI's embedding model.
 
     Args:
         text: The text to generate an embedding for
-        client: An optional OpenAI client instance. If not provided, assumes the client is initialized elsewhere
-        model: The embedding model to use (default: text-embedding-3-small)
+        client: An OpenAI client instance or an EmbeddingBackend
+        model: The embedding model to use; ignored for an EmbeddingBackend (default: text-embedding-3-small)
+        cache: An optional EmbeddingCache consulted before calling the API
+        max_retries: Number of retries on rate limits and transient errors (default: 6)
 
     Returns:
-        A list of floats representing the embedding vector
+        The embedding vector as a float32 array
     """
     if client is None:
         raise ValueError("OpenAI client must be provided")
+    model = embedding_model_name(client, model)
 
-    response = client.embeddings.create(
-        input=text,
-        model=model
-    )
+    if cache is not None:
+        cached = cache.get(text, model)
+        metrics.increment("cache_requests", cache="embedding", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
 
-    return response.data[0].embedding
+    embedding = _create_embeddings(client, text, model, max_retries)[0]
+    if cache is not None:
+        cache.put(text, model, embedding)
+    return embedding
+
+
+async def get_embedding_async(text: str,
+                              client: Optional[AsyncOpenAI] = None,
+                              model: str = "text-embedding-3-small",
+                              cache: Optional[EmbeddingCache] = None,
+                              max_retries: int = 6) -> np.ndarray:
+    """
+    Generate an embedding vector for the provided text without blocking the event loop.
+
+    Args:
+        text: The text to generate an embedding for
+        client: An AsyncOpenAI client instance or an EmbeddingBackend's async_client()
+        model: The embedding model to use; ignored for an embedding backend (default: text-embedding-3-small)
+        cache: An optional EmbeddingCache consulted before calling the API
+        max_retries: Number of retries on rate limits and transient errors (default: 6)
+
+    Returns:
+        The embedding vector as a float32 array
+    """
+    if client is None:
+        raise ValueError("OpenAI client must be provided")
+    model = embedding_model_name(client, model)
+
+    if cache is not None:
+        cached = cache.get(text, model)
+        metrics.increment("cache_requests", cache="embedding", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.embeddings.create(input=text, model=model, encoding_format="base64")
+            metrics.increment("tokens", response.usage.total_tokens, kind="embedding")
+            break
+        except RETRYABLE_ERRORS:
+            if attempt == max_retries:
+                raise
+            metrics.increment("api_retries", endpoint="embeddings")
+            await asyncio.sleep(min(60.0, 2 ** attempt) * (0.5 + random.random()))
+
+    embedding = _decode_embedding(response.data[0].embedding)
+    if cache is not None:
+        cache.put(text, model, embedding)
+    return embedding
 
 
 async def get_embeddings_concurrent(
-    texts: List[str], 
-    client: Optional[OpenAI] = None, 
-    model: str = "text-embedding-3-small", 
-    batch_size: int = 50,
-    show_progress: bool = False
-) -> List[List[float]]:
+    texts: List[str],
+    client: Optional[OpenAI] = None,
+    model: str = "text-embedding-3-small",
+    batch_size: int = 512,
+    show_progress: bool = False,
+    cache: Optional[EmbeddingCache] = None,
+    max_batch_tokens: int = 100_000,
+    max_concurrency: int = 8,
+    max_retries: int = 6
+) -> np.ndarray:
     """
-    Generate embedding vectors for multiple texts concurrently using OpenAI's embedding model.
+    Generate embedding vectors for multiple texts using batched, concurrent requests to OpenAI's embedding model.
+
+    Texts are packed into requests under both an input count and a token budget. At most
+    max_concurrency requests are in flight at once, all running on a shared thread pool.
+    Responses are decoded from base64 and the vectors returned as one contiguous array, so no
+    per-element Python floats are created.
 
     Args:
         texts: List of texts to generate embeddings for
-        client: An optional OpenAI client instance. If not provided, assumes the client is initialized elsewhere
-        model: The embedding model to use (default: text-embedding-3-small)
-        batch_size: Maximum number of concurrent API calls (default: 50)
+        client: An OpenAI client instance or an EmbeddingBackend
+        model: The embedding model to use; ignored for an EmbeddingBackend (default: text-embedding-3-small)
+        batch_size: Maximum number of texts sent in a single request (default: 512, capped at 2048)
         show_progress: Whether to display a progress bar (default: False)
+        cache: An optional EmbeddingCache; only texts missing from it are sent to the API
+        max_batch_tokens: Maximum total tokens sent in a single request (default: 100000)
+        max_concurrency: Maximum number of requests in flight at once (default: 8)
+        max_retries: Number of retries per request on rate limits and transient errors (default: 6)
 
     Returns:
-        A list of embedding vectors, where each vector is a list of floats
+        A (len(texts), dimension) float32 array of embeddings in the same order as texts
     """
     if client is None:
         raise ValueError("OpenAI client must be provided")
-    
-    # Create a wrapper function for concurrent execution
-    def get_single_embedding(text):
-        response = client.embeddings.create(
-            input=text,
-            model=model
-        )
-        return response.data[0].embedding
-    
-    # Process in batches to limit concurrency
-    embeddings = []
-    
-    # Setup progress bar if requested
-    iterator = range(0, len(texts), batch_size)
-    if show_progress:
-        iterator = tqdm(iterator, desc="Generating embeddings", total=len(range(0, len(texts), batch_size)))
-    
-    for i in iterator:
-        batch_texts = texts[i:i+batch_size]
-        
-        # Use ThreadPoolExecutor for concurrent API calls
-        with ThreadPoolExecutor(max_workers=batch_size) as executor:
-            batch_embeddings = list(executor.map(get_single_embedding, batch_texts))
-            
-        embeddings.extend(batch_embeddings)
-    
-    return embeddings
+    model = embedding_model_name(client, model)
+
+    # Serve what we can from the cache and only embed unique, missing texts
+    results: List[Optional[np.ndarray]] = [None] * len(texts)
+    if cache is not None:
+        results = cache.get_many(texts, model)
+        hits = sum(embedding is not None for embedding in results)
+        metrics.increment("cache_requests", hits, cache="embedding", result="hit")
+        metrics.increment("cache_requests", len(texts) - hits, cache="embedding", result="miss")
+    missing_positions = {}
+    for i, (text, embedding) in enumerate(zip(texts, results)):
+        if embedding is None:
+            missing_positions.setdefault(text, []).append(i)
+    missing_texts = list(missing_positions)
+
+    if not missing_texts:
+        return _stack(results)
+
+    batches = pack_batches(
+        [count_tokens(text, model) for text in missing_texts],
+        max_batch_tokens=max_batch_tokens,
+        max_batch_size=min(batch_size, MAX_INPUTS_PER_REQUEST)
+    )
+
+    loop = asyncio.get_running_loop()
+    executor = _get_executor(max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    progress = tqdm(total=len(missing_texts), desc="Generating embeddings") if show_progress else None
+
+    async def embed_batch(batch: List[int]) -> None:
+        batch_texts = [missing_texts[i] for i in batch]
+        async with semaphore:
+            # Copy the context so the request's counters reach the caller's trace
+            batch_embeddings = await loop.run_in_executor(
+                executor, contextvars.copy_context().run, _create_embeddings, client, batch_texts, model, max_retries)
+
+        if cache is not None:
+            cache.put_many(batch_texts, model, batch_embeddings)
+        for text, embedding in zip(batch_texts, batch_embeddings):
+            for position in missing_positions[text]:
+                results[position] = embedding
+        if progress is not None:
+            progress.update(len(batch))
+
+    try:
+        with metrics.span("embeddings", texts=len(missing_texts), requests=len(batches)):
+            await asyncio.gather(*(embed_batch(batch) for batch in batches))
+    finally:
+        if progress is not None:
+            progress.close()
+
+    return _stack(results)
+
@@ -0,0 +1,252 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional, Dict, Sequence
+
+# Disk hits whose last_used update is buffered before being written in one transaction
+LAST_USED_FLUSH_HITS = 1000
+
+
+def embedding_cache_key(text: str, model: str) -> str:
+    """
+    Compute the content address of an embedding.
+
+    Args:
+        text: The text that was embedded
+        model: The embedding model that produced the vector
+
+    Returns:
+        A hex digest identifying the (model, text) pair
+    """
+    hasher = hashlib.sha256()
+    hasher.update(model.encode("utf-8"))
+    hasher.update(b"\x00")
+    hasher.update(text.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier, content-addressed cache of embedding vectors.
+
+    The first tier is a bounded in-memory LRU. The optional second tier is a SQLite
+    database on local disk storing vectors as float32 blobs, so embeddings survive
+    restarts and re-ingestion only pays for chunks whose text actually changed.
+    Disk hits only refresh the LRU order of the disk tier, so their last_used updates are
+    buffered and written on the next put, on close, or every LAST_USED_FLUSH_HITS hits.
+    All methods are thread-safe.
+    """
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 max_memory_items: int = 10000,
+                 max_disk_items: Optional[int] = None):
+        """
+        Args:
+            db_path: Path of the SQLite file for the persistent tier. If None, only the memory tier is used
+            max_memory_items: Maximum number of vectors kept in the in-memory LRU (default: 10000)
+            max_disk_items: Optional maximum number of vectors kept on disk; least recently used rows are evicted
+        """
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._clock = 0
+        # key -> clock of disk hits whose last_used is not written yet
+        self._touched: Dict[str, int] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path is not None:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+            row = self._conn.execute("SELECT MAX(last_used) FROM embeddings").fetchone()
+            self._clock = row[0] or 0
+            self._conn.commit()
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """
+        Look up the embedding of a single text.
+
+        Args:
+            text: The text to look up
+            model: The embedding model name
+
+        Returns:
+            The cached embedding vector as a read-only float32 array, or None on a miss
+        """
+        return self.get_many([text], model)[0]
+
+    def put(self, text: str, model: str, vector: Sequence[float]) -> None:
+        """
+        Store the embedding of a single text.
+
+        Args:
+            text: The embedded text
+            model: The embedding model name
+            vector: The embedding vector
+        """
+        self.put_many([text], model, [vector])
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[np.ndarray]]:
+        """
+        Look up the embeddings of several texts at once.
+
+        Args:
+            texts: The texts to look up
+            model: The embedding model name
+
+        Returns:
+            A list aligned with texts containing the cached vector (a read-only float32 array) or None for each miss
+        """
+        keys = [embedding_cache_key(text, model) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+
+        with self._lock:
+            disk_lookup: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup and self._conn is not None:
+                found = self._read_disk(list(disk_lookup))
+                for key, vector in found.items():
+                    self._remember(key, vector)
+                    for i in disk_lookup.pop(key):
+                        results[i] = vector
+                        self.disk_hits += 1
+
+            self.misses += sum(len(positions) for positions in disk_lookup.values())
+
+        return results
+
+    def put_many(self, texts: List[str], model: str, vectors: Sequence[Sequence[float]]) -> None:
+        """
+        Store the embeddings of several texts at once.
+
+        Args:
+            texts: The embedded texts
+            model: The embedding model name
+            vectors: The embedding vectors, aligned with texts
+        """
+        if len(texts) != len(vectors):
+            raise ValueError("texts and vectors must have the same length")
+
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            # Keep a private, read-only copy; lookups hand out the cached array itself
+            vector = np.array(vector, dtype=np.float32)
+            vector.flags.writeable = False
+            entries[embedding_cache_key(text, model)] = vector
+
+        with self._lock:
+            for key, vector in entries.items():
+                self._remember(key, vector)
+
+            if self._conn is not None and entries:
+                # Written first so eviction sees recent hits and the new rows' clock wins
+                self._flush_last_used()
+                self._clock += 1
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, vector.tobytes(), self._clock) for key, vector in entries.items()]
+                )
+                self._evict_disk()
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return hit/miss counters for both tiers.
+
+        Returns:
+            A dictionary with memory_hits, disk_hits, misses, hit_rate and memory_items
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+    def clear_memory(self) -> None:
+        """Drop the in-memory tier, keeping the persistent tier intact."""
+        with self._lock:
+            self._memory.clear()
+
+    def close(self) -> None:
+        """Write pending last_used updates and close the persistent tier."""
+        with self._lock:
+            if self._conn is not None:
+                self._flush_last_used()
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        # Stay well below SQLite's limit on the number of bound parameters
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+
+        if found:
+            self._clock += 1
+            self._touched.update(dict.fromkeys(found, self._clock))
+            if len(self._touched) >= LAST_USED_FLUSH_HITS:
+                self._flush_last_used()
+                self._conn.commit()
+        return found
+
+    def _flush_last_used(self) -> None:
+        # The caller commits, so a put writes its hits and rows in one transaction
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(clock, key) for key, clock in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict_disk(self) -> None:
+        if self.max_disk_items is None:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_disk_items
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
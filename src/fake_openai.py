@@ -0,0 +1,164 @@
+import re
+import base64
+import time
+import asyncio
+import hashlib
+import threading
+import numpy as np
+from collections import Counter
+from types import SimpleNamespace
+from typing import List, Dict, Any, Union, Iterator, AsyncIterator
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def fake_embedding(text: str, dimension: int = 1536) -> List[float]:
+    """
+    Deterministic stand-in for an embedding: a unit-length hashed bag of words.
+
+    Texts sharing words get similar vectors, so retrieval over fake embeddings still behaves
+    like a (lexical) search, and the same text always gets the same vector in every process.
+
+    Args:
+        text: The text to embed
+        dimension: Length of the vector (default: 1536, as text-embedding-3-small)
+
+    Returns:
+        The embedding vector
+    """
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in _WORD_PATTERN.findall(text.lower()) or [""]:
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dimension
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm > 0 else vector).tolist()
+
+
+def _fake_answer(messages: List[Dict[str, str]], answer_tokens: int) -> List[str]:
+    question = messages[-1]["content"].rsplit("Întrebare:", 1)[-1].split()
+    words = (["Răspuns", "de", "test:"] + question) * (answer_tokens // 3 + 1)
+    return [word + " " for word in words[:answer_tokens]]
+
+
+def _usage(messages: List[Dict[str, str]], completion_tokens: int) -> SimpleNamespace:
+    # Roughly one token per word is close enough for relative comparisons
+    prompt_tokens = sum(len(message["content"].split()) for message in messages)
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           total_tokens=prompt_tokens + completion_tokens)
+
+
+class FakeOpenAI:
+    """
+    Offline stand-in for the OpenAI client covering the calls this project makes.
+
+    embeddings.create returns fake_embedding vectors and chat.completions.create returns a
+    deterministic answer (streamed word by word when stream=True), each after a configurable
+    simulated latency. Request counts are kept in self.calls.
+    """
+
+    def __init__(self,
+                 dimension: int = 1536,
+                 embedding_latency: float = 0.05,
+                 embedding_latency_per_input: float = 0.0005,
+                 first_token_latency: float = 0.3,
+                 token_latency: float = 0.01,
+                 answer_tokens: int = 100):
+        """
+        Args:
+            dimension: Length of the fake embeddings (default: 1536)
+            embedding_latency: Seconds per embeddings request (default: 0.05)
+            embedding_latency_per_input: Additional seconds per input text in a request (default: 0.0005)
+            first_token_latency: Seconds before the first answer token (default: 0.3)
+            token_latency: Seconds between answer tokens (default: 0.01)
+            answer_tokens: Number of words in every answer (default: 100)
+        """
+        self.dimension = dimension
+        self.embedding_latency = embedding_latency
+        self.embedding_latency_per_input = embedding_latency_per_input
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+
+    def with_options(self, **kwargs: Any) -> "FakeOpenAI":
+        """Accept per-request options such as timeout; the fake ignores them."""
+        return self
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] += 1
+
+    def _embedding_response(self, inputs: Union[str, List[str]], encoding_format: str = "float") -> SimpleNamespace:
+        texts = [inputs] if isinstance(inputs, str) else inputs
+        vectors = [fake_embedding(text, self.dimension) for text in texts]
+        if encoding_format == "base64":
+            # Like the API: the little-endian float32 buffer, base64-encoded
+            vectors = [base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii") for vector in vectors]
+        data = [SimpleNamespace(index=i, embedding=vector) for i, vector in enumerate(vectors)]
+        tokens = sum(len(text.split()) for text in texts)
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+    def _embedding_delay(self, inputs: Union[str, List[str]]) -> float:
+        count = 1 if isinstance(inputs, str) else len(inputs)
+        return self.embedding_latency + self.embedding_latency_per_input * count
+
+    def _completion_response(self, messages: List[Dict[str, str]]) -> SimpleNamespace:
+        words = _fake_answer(messages, self.answer_tokens)
+        message = SimpleNamespace(role="assistant", content="".join(words).strip())
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message)],
+                               usage=_usage(messages, len(words)))
+
+    def _stream_events(self, messages: List[Dict[str, str]], include_usage: bool) -> Iterator[SimpleNamespace]:
+        words = _fake_answer(messages, self.answer_tokens)
+        for word in words:
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=word))], usage=None)
+        if include_usage:
+            yield SimpleNamespace(choices=[], usage=_usage(messages, len(words)))
+
+    def _create_embeddings(self, input: Union[str, List[str]], model: str, encoding_format: str = "float",
+                           **kwargs: Any) -> SimpleNamespace:
+        self._count("embeddings")
+        time.sleep(self._embedding_delay(input))
+        return self._embedding_response(input, encoding_format)
+
+    def _create_completion(self, model: str, messages: List[Dict[str, str]], stream: bool = False,
+                           stream_options: Dict[str, Any] = None, **kwargs: Any) -> Any:
+        self._count("chat")
+        if not stream:
+            time.sleep(self.first_token_latency + self.token_latency * self.answer_tokens)
+            return self._completion_response(messages)
+
+        def events() -> Iterator[SimpleNamespace]:
+            time.sleep(self.first_token_latency)
+            for event in self._stream_events(messages, bool(stream_options and stream_options.get("include_usage"))):
+                yield event
+                time.sleep(self.token_latency)
+        return events()
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    """Async counterpart of FakeOpenAI, standing in for AsyncOpenAI."""
+
+    async def _create_embeddings(self, input: Union[str, List[str]], model: str, encoding_format: str = "float",
+                                 **kwargs: Any) -> SimpleNamespace:
+        self._count("embeddings")
+        await asyncio.sleep(self._embedding_delay(input))
+        return self._embedding_response(input, encoding_format)
+
+    async def _create_completion(self, model: str, messages: List[Dict[str, str]], stream: bool = False,
+                                 stream_options: Dict[str, Any] = None, **kwargs: Any) -> Any:
+        self._count("chat")
+        if not stream:
+            await asyncio.sleep(self.first_token_latency + self.token_latency * self.answer_tokens)
+            return self._completion_response(messages)
+
+        async def events() -> AsyncIterator[SimpleNamespace]:
+            await asyncio.sleep(self.first_token_latency)
+            for event in self._stream_events(messages, bool(stream_options and stream_options.get("include_usage"))):
+                yield event
+                await asyncio.sleep(self.token_latency)
+        return events()
@@ -0,0 +1,436 @@
+import os
+import json
+import glob
+import asyncio
+import hashlib
+import itertools
+import tempfile
+import numpy as np
+from openai import OpenAI
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator, Literal, TextIO
+from embedding import get_embeddings_concurrent, embedding_model_name
+from embedding_cache import EmbeddingCache
+from text_chunking import ChunkRecord, chunk_spans, chunk_records, get_encoding
+from chunk_store import ChunkStore, ChunkMetadata
+from data_extraction import iter_pdf_pages, iter_json_pages
+from boilerplate import iter_filtered_pages
+from near_duplicates import NearDuplicateIndex
+from sharded_index import build_sharded_index
+from vector_index import (IndexType, Quantization, IVF_INDEX_TYPES, build_index, add_to_index, remove_from_index,
+                          reconstruct_vectors, compute_artifact_key, save_index_artifact, load_index_artifact,
+                          load_artifact_manifest, artifact_path)
+
+# New chunks are deduplicated, embedded and indexed this many at a time, bounding the texts held at once
+INGEST_BATCH_SIZE = 4096
+
+
+def file_digest(path: str) -> str:
+    """
+    Compute the SHA-256 digest of a file's contents.
+
+    Args:
+        path: Path of the file to hash
+
+    Returns:
+        The hex digest of the file
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def text_digest(text: str) -> str:
+    """
+    Compute the SHA-256 digest of a text.
+
+    Args:
+        text: The text to hash
+
+    Returns:
+        The hex digest of the UTF-8 encoded text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def iter_json_pages_filtered(json_path: str,
+                             filter_path: Optional[str] = None,
+                             detect_boilerplate: bool = True) -> Iterator[Tuple[str, str]]:
+    """
+    Stream the crawled JSON or JSONL pages with noise lines stripped, one page at a time.
+
+    Args:
+        json_path: Path to the JSON or JSONL file with the crawled pages
+        filter_path: Optional path to a file listing noise lines to remove, one per line
+        detect_boilerplate: Whether to also remove lines repeated across many pages (default: True)
+
+    Yields:
+        (url, filtered_text) pairs in file order
+    """
+    return iter_filtered_pages(lambda: iter_json_pages(json_path), filter_path, detect_boilerplate=detect_boilerplate)
+
+
+def load_json_pages(json_path: str, filter_path: Optional[str] = None, detect_boilerplate: bool = True) -> Dict[str, str]:
+    """
+    Load the crawled JSON pages and strip noise lines from them.
+
+    Args:
+        json_path: Path to the JSON or JSONL file with the crawled pages
+        filter_path: Optional path to a file listing noise lines to remove, one per line
+        detect_boilerplate: Whether to also remove lines repeated across many pages (default: True)
+
+    Returns:
+        A dictionary mapping each URL to its filtered text
+    """
+    return dict(iter_json_pages_filtered(json_path, filter_path, detect_boilerplate))
+
+
+def _build_vector_index(batches: Iterable[Tuple[np.ndarray, List[int]]],
+                        metric: Literal["l2", "cosine"],
+                        index_type: IndexType,
+                        quantization: Quantization,
+                        shard_size: Optional[int],
+                        work_dir: str) -> Any:
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        return None
+    batches = itertools.chain([first], batches)
+    if shard_size is None:
+        embeddings, ids = [], []
+        for batch_embeddings, batch_ids in batches:
+            embeddings.append(batch_embeddings)
+            ids.extend(batch_ids)
+        embeddings = embeddings[0] if len(embeddings) == 1 else np.concatenate(embeddings)
+        return build_index(embeddings, metric=metric, ids=ids, index_type=index_type, quantization=quantization)
+
+    # Each finished shard is indexed in a worker process while later batches are still being embedded
+    return build_sharded_index(batches, work_dir, shard_size=shard_size, metric=metric, index_type=index_type,
+                               quantization=quantization)
+
+
+def _spill_page_chunks(spill: TextIO, source: str, text: str, max_tokens: int) -> None:
+    # One line per page: its source, text and chunk spans, so the chunk texts are sliced back on reading
+    spill.write(json.dumps([source, text, chunk_spans(text, max_tokens=max_tokens)], ensure_ascii=False) + "\n")
+
+
+def _iter_spilled_chunks(spill: TextIO, latest: Dict[str, int]) -> Iterator[ChunkRecord]:
+    spill.seek(0)
+    for line_number, line in enumerate(spill):
+        source, text, spans = json.loads(line)
+        # A URL crawled twice keeps only its last page
+        if latest.get(source) == line_number:
+            for start, end in spans:
+                yield ChunkRecord(source, None, start, end, text[start:end])
+
+
+def ingestion_artifact_key(model: str,
+                           max_tokens: int = 1000,
+                           metric: Literal["l2", "cosine"] = "l2",
+                           index_type: IndexType = "flat",
+                           quantization: Quantization = None,
+                           dedup_threshold: Optional[float] = 0.8,
+                           shard_size: Optional[int] = None) -> str:
+    """
+    Compute the key of the index artifact that ingest maintains for a set of build parameters.
+
+    Args:
+        model: The embedding model name, or the name of the EmbeddingBackend
+        max_tokens: The target maximum number of tokens per chunk (default: 1000)
+        metric: Distance metric of the index (default: l2)
+        index_type: FAISS index type (default: flat)
+        quantization: Optional "float16" or "int8" vector storage (default: None)
+        dedup_threshold: Near-duplicate threshold used during ingestion (default: 0.8)
+        shard_size: Vectors per shard of a sharded index, or None for a single index (default: None)
+
+    Returns:
+        The artifact key under the index store directory
+    """
+    params = {"max_tokens": max_tokens, "model": model, "metric": metric, "index_type": index_type,
+              "ingestion": "incremental", "chunk_store": 2, "dedup_threshold": dedup_threshold}
+    if quantization is not None:
+        # Only quantized builds get a new key, so existing float32 artifacts stay valid
+        params["quantization"] = quantization
+        # Quantized artifacts used to keep a float32 copy inside the index (RFlat); rebuild them
+        params["rescoring"] = "vectors"
+    if shard_size is not None:
+        params["shard_size"] = shard_size
+    if index_type in IVF_INDEX_TYPES:
+        # IVF artifacts used to be wrapped in IndexIDMap2, which mislabels vectors once any are removed
+        params["ids"] = "ivf"
+    return compute_artifact_key([], params)
+
+
+def load_ingested_index(client: Any,
+                        store_dir: str = "index_store",
+                        model: str = "text-embedding-3-small",
+                        max_tokens: int = 1000,
+                        metric: Literal["l2", "cosine"] = "l2",
+                        index_type: IndexType = "flat",
+                        quantization: Quantization = None,
+                        dedup_threshold: Optional[float] = 0.8,
+                        shard_size: Optional[int] = None) -> Optional[Tuple[Any, ChunkStore, str]]:
+    """
+    Memory-map the index last saved by ingest, without reading or hashing any source.
+
+    Serving processes use this to share one read-only copy of an index kept up to date by a
+    separate ingest run. The parameters must match the ones given to ingest.
+
+    Args:
+        client: The OpenAI client or EmbeddingBackend that embeds the questions
+        store_dir: Root directory holding index artifacts (default: index_store)
+        model: The embedding model; an EmbeddingBackend client uses its own (default: text-embedding-3-small)
+        max_tokens: The target maximum number of tokens per chunk (default: 1000)
+        metric: Distance metric of the index (default: l2)
+        index_type: FAISS index type (default: flat)
+        quantization: Optional "float16" or "int8" vector storage (default: None)
+        dedup_threshold: Near-duplicate threshold used during ingestion (default: 0.8)
+        shard_size: Vectors per shard of a sharded index, or None for a single index (default: None)
+
+    Returns:
+        A tuple of (index, chunks, index_version), with the same index_version ingest reported for
+        this index, or None if no matching index has been saved
+    """
+    model = embedding_model_name(client, model)
+    key = ingestion_artifact_key(model, max_tokens, metric, index_type, quantization, dedup_threshold, shard_size)
+    manifest = load_artifact_manifest(store_dir, key)
+    if manifest is None:
+        return None
+    artifact = load_index_artifact(store_dir, key, mmap=True, embedding_model=model, read_only=True)
+    if artifact is None:
+        return None
+    files = manifest["metadata"]["files"]
+    return artifact[0], artifact[1], text_digest(key + json.dumps(files, sort_keys=True))
+
+
+def ingest(client: OpenAI,
+           pdf_pattern: str = "data/*.pdf",
+           json_path: str = "json_data/eon_data.json",
+           filter_path: Optional[str] = "filter_text/text_1.txt",
+           store_dir: str = "index_store",
+           model: str = "text-embedding-3-small",
+           max_tokens: int = 1000,
+           metric: Literal["l2", "cosine"] = "l2",
+           index_type: IndexType = "flat",
+           quantization: Quantization = None,
+           cache: Optional[EmbeddingCache] = None,
+           show_progress: bool = False,
+           detect_boilerplate: bool = True,
+           dedup_threshold: Optional[float] = 0.8,
+           shard_size: Optional[int] = None) -> Tuple[Any, ChunkStore, Dict[str, Any]]:
+    """
+    Bring the persisted vector index up to date with the PDFs and crawled JSON pages.
+
+    An ingestion manifest stored with the index records a content hash per PDF file and per
+    JSON URL, plus the IDs of the chunks derived from each. Only new or modified sources are
+    extracted, chunked and embedded; chunks of deleted or modified sources are removed from
+    the ID-mapped index in place. When no source file changed, the saved index is
+    memory-mapped and returned without touching any source. Near-duplicate chunks (MinHash/LSH)
+    are embedded once and shared by every source that contains them.
+
+    Args:
+        client: An OpenAI client or EmbeddingBackend used to embed new chunks
+        pdf_pattern: Glob pattern matching the PDF files (default: data/*.pdf)
+        json_path: Path to the JSON or JSONL file with the crawled pages, read as a stream (default: json_data/eon_data.json)
+        filter_path: Optional path to the list of noise lines stripped from the JSON pages
+        store_dir: Root directory holding index artifacts (default: index_store)
+        model: The embedding model to use; an EmbeddingBackend client uses its own (default: text-embedding-3-small)
+        max_tokens: The target maximum number of tokens per chunk (default: 1000)
+        metric: Distance metric of the index, either "l2" or "cosine" (default: l2)
+        index_type: FAISS index type, "flat" (default) or one of the approximate types "ivf", "hnsw",
+            "ivfpq" and "opq". IVF-based indexes are trained on the first build only
+        quantization: Optional "float16" or "int8" storage of the vectors in "flat", "ivf" and "hnsw"
+            indexes, with the top candidates re-ranked at full precision (default: None)
+        cache: An optional EmbeddingCache consulted before calling the embedding API
+        show_progress: Whether to display an embedding progress bar (default: False)
+        detect_boilerplate: Whether to strip lines repeated across many crawled pages in addition to the
+            filter_path list (default: True)
+        dedup_threshold: Estimated Jaccard similarity of word shingles above which a new chunk is collapsed
+            into an existing or earlier near-duplicate instead of being embedded; None disables (default: 0.8)
+        shard_size: Build a ShardedIndex of shards holding at most this many vectors. Embeddings are streamed to
+            disk one shard at a time and the shards are indexed in parallel processes. None builds a single
+            index (default: None)
+
+    Returns:
+        A tuple of (index, chunks, stats), where chunks is a ChunkStore mapping vector IDs to chunk
+        texts and their source, page, character span and token count, memory-mapped when loaded
+        from disk, and
+        stats counts added, changed, removed and unchanged sources, added/removed chunks and new chunks
+        collapsed into near-duplicates.
+        stats["index_version"] identifies the index contents and changes whenever they do
+    """
+    # The artifact key only covers build parameters; source changes are applied as deltas. A local
+    # embedding backend's name stands in for the model, so its vectors never mix with OpenAI's
+    model = embedding_model_name(client, model)
+    key = ingestion_artifact_key(model, max_tokens, metric, index_type, quantization, dedup_threshold, shard_size)
+
+    pdf_files = sorted(glob.glob(pdf_pattern))
+    tracked_files = pdf_files + [path for path in (json_path, filter_path) if path and os.path.exists(path)]
+    file_hashes = {path: file_digest(path) for path in tracked_files}
+
+    stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0,
+             "chunks_added": 0, "chunks_removed": 0, "chunks_deduplicated": 0,
+             "index_version": text_digest(key + json.dumps(file_hashes, sort_keys=True))}
+
+    manifest = load_artifact_manifest(store_dir, key)
+    state = manifest["metadata"] if manifest is not None else {"files": {}, "sources": {}, "next_id": 0}
+
+    # Fast path: nothing on disk changed since the last run
+    if manifest is not None and state["files"] == file_hashes:
+        artifact = load_index_artifact(store_dir, key, mmap=True, embedding_model=model)
+        if artifact is not None:
+            stats["unchanged"] = len(state["sources"])
+            return artifact[0], artifact[1], stats
+
+    index, records, near_duplicates = None, {}, None
+    if manifest is not None:
+        artifact = load_index_artifact(store_dir, key, mmap=False, embedding_model=model)
+        if artifact is not None:
+            index = artifact[0]
+            records = {chunk_id: (text, metadata) for chunk_id, text, metadata in artifact[1].records()}
+            if dedup_threshold is not None:
+                near_duplicates = NearDuplicateIndex.load(
+                    os.path.join(artifact_path(store_dir, key), "near_duplicates"))
+    if index is None:
+        state = {"files": {}, "sources": {}, "next_id": 0}
+    if dedup_threshold is not None and (near_duplicates is None or len(near_duplicates) != len(records)):
+        # No saved signatures (e.g. an artifact from an older version): sign the indexed chunks once
+        existing_ids = list(records)
+        near_duplicates = NearDuplicateIndex(threshold=dedup_threshold)
+        near_duplicates.add(existing_ids, near_duplicates.sign([records[chunk_id][0] for chunk_id in existing_ids]))
+
+    # Hash every current source: whole files for PDFs, filtered text for each JSON URL. Pages are
+    # streamed; new or modified ones are spilled to a temporary file with their chunk spans, so no
+    # page text stays in memory until its chunks are embedded batch by batch below
+    previous = state["sources"]
+    source_hashes = {path: file_hashes[path] for path in pdf_files}
+    spill = tempfile.TemporaryFile("w+", encoding="utf-8")
+    spilled: Dict[str, int] = {}
+    spilled_pages = 0
+    if os.path.exists(json_path):
+        for url, text in iter_json_pages_filtered(json_path, filter_path, detect_boilerplate=detect_boilerplate):
+            source = f"url:{url}"
+            source_hashes[source] = text_digest(text)
+            spilled.pop(source, None)
+            if source not in previous or previous[source]["hash"] != source_hashes[source]:
+                _spill_page_chunks(spill, source, text, max_tokens)
+                spilled[source] = spilled_pages
+                spilled_pages += 1
+
+    stale = [source for source in previous if source_hashes.get(source) != previous[source]["hash"]]
+    stale_set = set(stale)
+    fresh = [source for source in source_hashes if source not in previous or source in stale_set]
+
+    for source in stale:
+        stats["changed" if source in source_hashes else "removed"] += 1
+    stats["added"] = len(fresh) - stats["changed"]
+    stats["unchanged"] = len(source_hashes) - len(fresh)
+
+    # Drop chunks of deleted or modified sources, unless another source still shares them
+    sources = {source: entry for source, entry in previous.items() if source not in stale_set}
+    shared_ids = {chunk_id for entry in sources.values() for chunk_id in entry["chunk_ids"]}
+    stale_ids = sorted({chunk_id for source in stale for chunk_id in previous[source]["chunk_ids"]} - shared_ids)
+    for chunk_id in stale_ids:
+        records.pop(chunk_id, None)
+    if near_duplicates is not None:
+        near_duplicates.remove(stale_ids)
+    for source, entry in sources.items():
+        for chunk_id in entry["chunk_ids"]:
+            # Shared chunks outliving their first source are attributed to a remaining one
+            if chunk_id in records and records[chunk_id][1].source in stale_set:
+                text, metadata = records[chunk_id]
+                records[chunk_id] = (text, metadata._replace(source=source))
+    if index is not None and stale_ids:
+        try:
+            stats["chunks_removed"] = remove_from_index(index, stale_ids)
+        except RuntimeError:
+            # HNSW graphs cannot drop vectors; rebuild from the vectors the index holds for the
+            # remaining chunks, without embedding them again
+            stats["chunks_removed"] = len(stale_ids)
+            remaining_ids = list(records)
+            batches = ((reconstruct_vectors(index, remaining_ids[start:start + INGEST_BATCH_SIZE]),
+                        remaining_ids[start:start + INGEST_BATCH_SIZE])
+                       for start in range(0, len(remaining_ids), INGEST_BATCH_SIZE))
+            index = _build_vector_index(batches, metric, index_type, quantization, shard_size,
+                                        os.path.join(store_dir, f"{key}.shards"))
+
+    # Extract and chunk only new or modified sources, and process their chunks one batch at a time
+    fresh_set = set(fresh)
+    fresh_pdfs = [path for path in pdf_files if path in fresh_set]
+    new_chunks = itertools.chain(chunk_records(iter_pdf_pages(fresh_pdfs), max_tokens=max_tokens),
+                                 _iter_spilled_chunks(spill, spilled))
+    for source in fresh:
+        sources[source] = {"hash": source_hashes[source], "chunk_ids": []}
+    next_id = state["next_id"]
+
+    def embed_new_chunks() -> Iterator[Tuple[np.ndarray, List[int]]]:
+        # Group each batch's chunks with near-duplicates among themselves, then look each group up
+        # among the chunks already indexed, including earlier batches. Only new chunks are MinHashed
+        nonlocal next_id
+        while True:
+            batch = list(itertools.islice(new_chunks, INGEST_BATCH_SIZE))
+            if not batch:
+                return
+            token_counts = [len(tokens) for tokens in get_encoding("gpt-4o").encode_batch([c.text for c in batch])]
+            groups = list(range(len(batch)))
+            if near_duplicates is not None:
+                signatures = near_duplicates.sign([chunk.text for chunk in batch])
+                groups = near_duplicates.group(signatures)
+
+            assigned: Dict[int, int] = {}
+            new_ids, new_positions, texts = [], [], []
+            for position, (chunk, tokens) in enumerate(zip(batch, token_counts)):
+                representative = groups[position]
+                match = None
+                if representative == position and near_duplicates is not None:
+                    match = near_duplicates.query(signatures[position])
+                if representative != position or match is not None:
+                    # An indexed chunk, or the group's first chunk (always assigned earlier), stands in for this one
+                    chunk_id = assigned[representative] if representative != position else match
+                    stats["chunks_deduplicated"] += 1
+                else:
+                    chunk_id = next_id
+                    next_id += 1
+                    records[chunk_id] = (chunk.text, ChunkMetadata(chunk.source, chunk.page, chunk.start, chunk.end,
+                                                                   tokens))
+                    new_ids.append(chunk_id)
+                    new_positions.append(position)
+                    texts.append(chunk.text)
+                assigned[position] = chunk_id
+                if chunk_id not in sources[chunk.source]["chunk_ids"]:
+                    sources[chunk.source]["chunk_ids"].append(chunk_id)
+
+            if near_duplicates is not None:
+                near_duplicates.add(new_ids, signatures[new_positions])
+            if texts:
+                stats["chunks_added"] += len(texts)
+                yield asyncio.run(get_embeddings_concurrent(
+                    texts=texts,
+                    client=client,
+                    model=model,
+                    show_progress=show_progress,
+                    cache=cache
+                )), new_ids
+
+    if index is None:
+        index = _build_vector_index(embed_new_chunks(), metric, index_type, quantization, shard_size,
+                                    os.path.join(store_dir, f"{key}.shards"))
+    else:
+        for embeddings, new_ids in embed_new_chunks():
+            add_to_index(index, embeddings, new_ids)
+    spill.close()
+
+    if index is None:
+        raise ValueError("No text could be extracted from the configured sources")
+
+    references: Dict[int, List[str]] = {}
+    for source, entry in sources.items():
+        for chunk_id in entry["chunk_ids"]:
+            references.setdefault(chunk_id, []).append(source)
+    chunks = ChunkStore.from_records(((chunk_id, text, metadata) for chunk_id, (text, metadata) in records.items()),
+                                     references=references)
+    state = {"files": file_hashes, "sources": sources, "next_id": next_id}
+    save_index_artifact(index, chunks, store_dir, key, metadata=state, embedding_model=model,
+                        attachments={"near_duplicates": near_duplicates} if near_duplicates is not None else None)
+    return index, chunks, stats
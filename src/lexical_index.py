@@ -0,0 +1,162 @@
+import re
+import unicodedata
+import numpy as np
+from collections import Counter
+from collections.abc import Mapping
+from typing import List, Dict, Union, Tuple, Iterable, Sequence, Hashable
+
+# Frequent Romanian function words that carry no retrieval signal (diacritics already folded)
+ROMANIAN_STOPWORDS = frozenset("""
+a ai al ale am ar are as asa asta ati au avea aveti ca cand care cat ce cea cei cel cele cu
+da daca dar de deci din dintre doar ea ei el ele esti este eu fi fie fost iar il in
+intr intre isi la le li lor lui ma mai mi mult ne ni nici noi nu o ori pe pentru
+poate prin sa sau se si sunt te tu un una unei unor unui va vor vom voi
+""".split())
+
+# Definite-article and plural endings stripped so "panouri", "panourile" and "panourilor" match
+_SUFFIXES = ("urilor", "urile", "ilor", "elor", "ului", "uri", "ile", "ele", "lui", "ul", "le", "ii")
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def fold_diacritics(text: str) -> str:
+    """
+    Remove diacritics so "ș", "ş", "ț", "ţ", "ă", "â" and "î" match their plain letters.
+
+    Args:
+        text: The text to fold
+
+    Returns:
+        The text without combining marks
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _stem(token: str) -> str:
+    if len(token) > 5 and not token.isdigit():
+        for suffix in _SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+                return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split Romanian text into normalized search terms.
+
+    Lowercases, folds diacritics, drops stopwords and one-letter tokens, and strips common
+    article/plural suffixes. Product names, brand names and codes survive as single terms.
+
+    Args:
+        text: The text to tokenize
+
+    Returns:
+        The list of terms, in order
+    """
+    folded = fold_diacritics(text.lower())
+    return [
+        _stem(token) for token in _TOKEN_PATTERN.findall(folded)
+        if (len(token) > 1 or token.isdigit()) and token not in ROMANIAN_STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the same chunks as the vector index.
+
+    Each term maps to the array of chunk positions it occurs in and the precomputed BM25 weight of
+    the term in each of them, so scoring a query is a handful of vectorized NumPy additions.
+    """
+
+    def __init__(self, chunks: Union[List[str], Mapping], k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            chunks: The chunk texts, either a list (IDs are positions) or a mapping from vector ID to chunk
+                (e.g. a ChunkStore)
+            k1: BM25 term frequency saturation (default: 1.5)
+            b: BM25 document length normalization (default: 0.75)
+        """
+        items = chunks.items() if isinstance(chunks, Mapping) else enumerate(chunks)
+        self.ids: List[Hashable] = []
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+
+        for position, (chunk_id, text) in enumerate(items):
+            self.ids.append(chunk_id)
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append((position, frequency))
+
+        self.num_docs = len(self.ids)
+        doc_lengths = np.asarray(lengths, dtype=np.float32)
+        average_length = float(doc_lengths.mean()) if self.num_docs else 0.0
+        length_norm = k1 * (1 - b + b * doc_lengths / average_length) if average_length else np.full(self.num_docs, k1)
+
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, entries in postings.items():
+            positions = np.fromiter((p for p, _ in entries), dtype=np.int64, count=len(entries))
+            frequencies = np.fromiter((f for _, f in entries), dtype=np.float32, count=len(entries))
+            idf = np.log(1 + (self.num_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            weights = idf * frequencies * (k1 + 1) / (frequencies + length_norm[positions])
+            self._postings[term] = (positions, weights.astype(np.float32))
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Hashable, float]]:
+        """
+        Rank chunks by BM25 score for a query.
+
+        Args:
+            query: The user's question or query
+            k: Number of results to return (default: 10)
+
+        Returns:
+            Up to k (chunk_id, score) pairs with a positive score, best first
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                positions, weights = posting
+                scores[positions] += weights
+                matched = True
+
+        if not matched or k <= 0:
+            return []
+
+        k = min(k, self.num_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def document_frequency(self, term: str) -> int:
+        """
+        Count the chunks containing a term.
+
+        Args:
+            term: A normalized term, as produced by tokenize
+
+        Returns:
+            The number of chunks the term occurs in
+        """
+        posting = self._postings.get(term)
+        return len(posting[0]) if posting is not None else 0
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """
+    Merge several rankings of the same items with reciprocal rank fusion.
+
+    Args:
+        rankings: Ranked lists of item IDs, best first (e.g. dense and BM25 results)
+        k: RRF smoothing constant; larger values flatten the contribution of top ranks (default: 60)
+
+    Returns:
+        (item_id, fused_score) pairs sorted by fused score, best first
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
@@ -0,0 +1,93 @@
+import os
+import threading
+import numpy as np
+from typing import List, Dict, Optional
+from embedding import EmbeddingBackend
+
+_backends: Dict[str, "OnnxEmbeddingBackend"] = {}
+_lock = threading.Lock()
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    Sentence encoder exported to ONNX (e.g. a quantized int8 multilingual MiniLM or E5), run on the CPU.
+
+    The model directory holds model.onnx and the Hugging Face tokenizer.json. Token embeddings
+    are mean-pooled over the attention mask and L2-normalized; models that already output one
+    vector per text are used as is. Needs the optional onnxruntime and tokenizers packages.
+    """
+
+    def __init__(self,
+                 model_dir: str,
+                 max_length: int = 256,
+                 prefix: str = "",
+                 num_threads: Optional[int] = None,
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 2.0):
+        """
+        Args:
+            model_dir: Directory containing model.onnx and tokenizer.json
+            max_length: Maximum number of tokens per text; longer texts are truncated (default: 256)
+            prefix: Text prepended to every input, for models trained with one (e.g. "query: ")
+            num_threads: Threads onnxruntime uses per batch (default: number of CPUs)
+            max_batch_size: Maximum number of texts embedded in one model call (default: 32)
+            max_wait_ms: How long concurrent requests are collected into one batch (default: 2.0)
+        """
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The local embedding backend needs onnxruntime and tokenizers: "
+                              "pip install onnxruntime tokenizers") from e
+
+        super().__init__(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.name = f"local:{os.path.basename(os.path.normpath(model_dir))}"
+        self.prefix = prefix
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads or os.cpu_count() or 1
+        self.session = onnxruntime.InferenceSession(os.path.join(model_dir, "model.onnx"), options,
+                                                    providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _count_tokens(self, texts: List[str]) -> int:
+        return sum(len(encoding.ids) for encoding in self.tokenizer.encode_batch([self.prefix + t for t in texts]))
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch([self.prefix + text for text in texts])
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self.session.run(None, {name: value for name, value in inputs.items() if name in self._input_names})[0]
+        if output.ndim == 3:
+            # Mean of the token embeddings, ignoring padding
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        vectors = np.ascontiguousarray(output, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+def get_local_backend(model_dir: str, **kwargs) -> OnnxEmbeddingBackend:
+    """
+    Return the process-wide backend for a model directory, loading the model on first use.
+
+    Args:
+        model_dir: Directory containing model.onnx and tokenizer.json
+        **kwargs: Further OnnxEmbeddingBackend arguments, used when the model is first loaded
+
+    Returns:
+        The shared OnnxEmbeddingBackend, so every session batches into the same model
+    """
+    with _lock:
+        if model_dir not in _backends:
+            _backends[model_dir] = OnnxEmbeddingBackend(model_dir, **kwargs)
+        return _backends[model_dir]
@@ -1,101 +1,151 @@
-import os
-from embedding import get_embeddings_concurrent
-from text_chunking import chunk_text
-from vector_index import build_index
-from query_handler import query_rag, generate_answer
-from data_extraction import extract_text_from_pdf, extract_from_json
+import metrics
+from ingestion import ingest
+from embedding_cache import EmbeddingCache
+from lexical_index import BM25Index
+from reranking import Reranker, LexicalReranker, get_cross_encoder
+from query_handler import hybrid_query_rag_async, rerank_query_rag_async, generate_answer_stream_async
+from openai_clients import get_client, get_async_client, run_async, iterate_async
+from typing import Any, Tuple, Optional
 
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
+PDF_PATTERN = "data/*.pdf"
+JSON_PATH = "json_data/eon_data.json"
+FILTER_PATH = "filter_text/text_1.txt"
+INDEX_STORE_DIR = "index_store"
+EMBEDDING_CACHE_PATH = "index_store/embedding_cache.sqlite"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_BACKEND = "openai"  # "local" embeds with the ONNX model in LOCAL_EMBEDDING_MODEL_DIR
+LOCAL_EMBEDDING_MODEL_DIR = "models/embedding-int8"
+CHUNK_MAX_TOKENS = 1000
+INDEX_METRIC = "l2"
+INDEX_TYPE = "flat"
+INDEX_QUANTIZATION = None
+INDEX_SHARD_SIZE = None  # e.g. 1_000_000 to build the index in shards, in parallel processes
+RETRIEVAL_K = 3  # chunks passed to the answer
+RERANKER = "lexical"  # "cross-encoder" scores with the ONNX model in CROSS_ENCODER_MODEL_DIR; None keeps the fused ranking
+CROSS_ENCODER_MODEL_DIR = "models/reranker-int8"
+RERANK_CANDIDATES = 50
+EMBEDDING_TIMEOUT = 3.0
+MAX_CONTEXT_TOKENS = 3000
+METRICS_ENABLED = False
+
+
+def get_embedding_clients(client: Any, async_client: Any) -> Tuple[Any, Any]:
+    """
+    Return the synchronous and async clients used for embeddings, according to EMBEDDING_BACKEND.
+
+    Args:
+        client: The OpenAI client
+        async_client: The AsyncOpenAI client
+
+    Returns:
+        The OpenAI clients themselves, or the local backend and its async counterpart
+    """
+    if EMBEDDING_BACKEND != "local":
+        return client, async_client
+    from local_embedding import get_local_backend
+    backend = get_local_backend(LOCAL_EMBEDDING_MODEL_DIR)
+    return backend, backend.async_client()
+
+
+def get_reranker(bm25: Optional[BM25Index]) -> Optional[Reranker]:
+    """
+    Return the reranker selected by RERANKER.
+
+    Args:
+        bm25: The BM25Index over the indexed chunks, whose term statistics the lexical reranker uses, if any
+
+    Returns:
+        A LexicalReranker, the shared CrossEncoderReranker, or None when reranking is off
+    """
+    if RERANKER == "cross-encoder":
+        return get_cross_encoder(CROSS_ENCODER_MODEL_DIR)
+    if RERANKER == "lexical":
+        return LexicalReranker(bm25)
+    return None
+
 
 if __name__ == "__main__":
-    from openai import OpenAI
-
-    # Initialize OpenAI client
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-    # 1. Extract text from both PDF and JSON files
-    print("Extracting text from PDF files...")
-    pdf_text = extract_text_from_pdf("data/*.pdf")
-    print(f"Extracted {len(pdf_text)} characters of text from PDFs")
-
-    print("Extracting text from JSON files...")
-    json_data = extract_from_json("json_data/eon_data.json", include_urls=False)
-
-
-    # Filter out noise from the JSON text based on text_1.txt content
-    filtered_json_data = {}
-    
-    # Get the lines from text_1.txt to use as a filter
-    with open("filter_text/text_1.txt", "r", encoding="utf-8") as f:
-        filter_lines = set(line.strip() for line in f if line.strip())
-    
-    # Filter out the noise lines from the JSON data
-    for key, value in json_data.items():
-        lines = value.split("\n")
-        filtered_lines = [line for line in lines if line.strip() and line.strip() not in filter_lines]
-        filtered_json_data[key] = "\n".join(filtered_lines)
-    
-    json_text = "\n\n".join(filtered_json_data.values())
-    print(f"Extracted {len(json_text)} characters of text from JSON (after filtering noise)")
-
-    # Combine text from both sources
-    combined_text = pdf_text + "\n\n" + json_text
-    print(f"Combined text: {len(combined_text)} characters")
-
-    # 2. Chunk the text
-    print("Chunking text into manageable segments...")
-    chunks = chunk_text(combined_text)
-    print(f"Created {len(chunks)} text chunks")
-
-    # 3. Generate embeddings for each chunk
-    print("Generating embeddings for each chunk...")
-    import asyncio
-    
-    # Use the concurrent method from embedding.py
-    async def get_embeddings():
-        return await get_embeddings_concurrent(
-            texts=chunks,
-            client=client,
-            batch_size=200,
-            show_progress=True
-        )
-    
-    # Run the async function to get embeddings
-    embeddings = asyncio.run(get_embeddings())
-    
-    print(f"Generated {len(embeddings)} embeddings")
-
-    # 4. Build the vector index
-    print("Building vector index...")
-    index = build_index(embeddings, metric='l2')
-    print("Vector index built successfully")
+    # Process-wide pooled OpenAI clients, shared with the Streamlit app code path
+    client = get_client()
+    async_client = get_async_client()
+    embedding_client, async_embedding_client = get_embedding_clients(client, async_client)
+    embedding_cache = EmbeddingCache(db_path=EMBEDDING_CACHE_PATH)
+    if METRICS_ENABLED:
+        metrics.enable()
+
+    # 1-4. Extract, chunk and embed new or changed sources and update the vector index
+    print("Updating vector index...")
+    index, chunks, stats = ingest(
+        embedding_client,
+        pdf_pattern=PDF_PATTERN,
+        json_path=JSON_PATH,
+        filter_path=FILTER_PATH,
+        store_dir=INDEX_STORE_DIR,
+        model=EMBEDDING_MODEL,
+        max_tokens=CHUNK_MAX_TOKENS,
+        metric=INDEX_METRIC,
+        index_type=INDEX_TYPE,
+        quantization=INDEX_QUANTIZATION,
+        shard_size=INDEX_SHARD_SIZE,
+        cache=embedding_cache,
+        show_progress=True
+    )
+    print(f"Sources: {stats['added']} added, {stats['changed']} changed, "
+          f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+    print(f"Chunks: {stats['chunks_added']} added, {stats['chunks_removed']} removed, {len(chunks)} in index")
+
+    bm25 = BM25Index(chunks)
+    reranker = get_reranker(bm25)
 
     # 5. Handle a sample query
     query = "E inseamna E.ON Solar Casa Verde"
-    print(f"Processing query: '{query}'")
-    print("Retrieving relevant chunks (limited to 10)...")
-    relevant_chunks = query_rag(query, index, chunks, k=7, client=client)
-    print(f"Found {len(relevant_chunks)} relevant chunks")
-
-    print("\n" + "="*80)
-    print("RELEVANT CHUNKS:".center(80))
-    print("="*80)
-    for i, chunk in enumerate(relevant_chunks):
-        print("\n")
-        print(f"{'#'*50}".center(80))
-        print(f"CHUNK {i+1}:".center(80))
-        print(f"{'#'*50}".center(80))
+    with metrics.trace("query", question=query):
+        print(f"Processing query: '{query}'")
+        print(f"Retrieving relevant chunks (limited to {RETRIEVAL_K})...")
+        if reranker is not None:
+            # Rescore the top RERANK_CANDIDATES of both retrievers and keep only the best few
+            ranked = run_async(rerank_query_rag_async(query, index, chunks, bm25, reranker, k=RETRIEVAL_K,
+                                                      client=async_embedding_client, cache=embedding_cache,
+                                                      candidates=RERANK_CANDIDATES,
+                                                      embedding_timeout=EMBEDDING_TIMEOUT))
+            relevant_chunks = [chunk.text for chunk in ranked]
+            for chunk in ranked:
+                print(f"Chunk {chunk.chunk_id}: {reranker.name} score {chunk.score:.3f}, "
+                      f"distance {chunk.distance}, BM25 {chunk.lexical_score}")
+        else:
+            relevant_chunks = run_async(hybrid_query_rag_async(query, index, chunks, bm25, k=RETRIEVAL_K,
+                                                               client=async_embedding_client, cache=embedding_cache,
+                                                               embedding_timeout=EMBEDDING_TIMEOUT))
+        print(f"Found {len(relevant_chunks)} relevant chunks")
+
+        print("\n" + "="*80)
+        print("RELEVANT CHUNKS:".center(80))
+        print("="*80)
+        for i, chunk in enumerate(relevant_chunks):
+            print("\n")
+            print(f"{'#'*50}".center(80))
+            print(f"CHUNK {i+1}:".center(80))
+            print(f"{'#'*50}".center(80))
+            print("\n")
+            print(chunk)
+        print("="*80 + "\n")
+
+        print("Generating answer...")
+        print("\n" + "*"*80)
+        print("ANSWER:".center(80))
+        print("*"*80)
+        print("\n\t", end="", flush=True)
+        usage = {}
+        for token in iterate_async(generate_answer_stream_async(query, relevant_chunks, client=async_client,
+                                                                max_context_tokens=MAX_CONTEXT_TOKENS, usage=usage)):
+            print(token, end="", flush=True)
         print("\n")
-        print(chunk)
-    print("="*80 + "\n")
-
-    print("Generating answer...")
-    answer = generate_answer(query, relevant_chunks, client=client)
-    print("\n" + "*"*80)
-    print("ANSWER:".center(80))
-    print("*"*80)
-    print(f"\n\t{answer}\n")
-    print("*"*80)
+        print("*"*80)
+        print(f"Tokens: {usage}")
+    print(f"Embedding cache: {embedding_cache.stats()}")
+    if METRICS_ENABLED:
+        print(metrics.render_prometheus())
@@ -0,0 +1,269 @@
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets, from cache hits to slow completions
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("rag.metrics")
+
+_enabled = False
+_lock = threading.Lock()
+_histograms: Dict[str, List[float]] = {}
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_recent_traces: "deque[Dict[str, Any]]" = deque(maxlen=20)
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("rag_trace", default=None)
+
+
+class _NoopSpan:
+    """Shared span returned while instrumentation is disabled."""
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        return False
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed pipeline stage. Use through span(); attributes can be added while it runs."""
+
+    __slots__ = ("name", "attributes", "start", "duration", "trace")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], trace: Optional["Trace"]):
+        self.name = name
+        self.attributes = attributes
+        self.trace = trace
+        self.start = 0.0
+        self.duration = 0.0
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> bool:
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        _observe(self.name, self.duration)
+        if self.trace is not None:
+            self.trace.spans.append({"stage": self.name, "offset_ms": (self.start - self.trace.start) * 1000,
+                                     "duration_ms": self.duration * 1000, **self.attributes})
+        return False
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """The spans and counters recorded while handling one request."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, float] = {}
+        self.record: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace": self.name, "duration_ms": (time.perf_counter() - self.start) * 1000,
+                **self.attributes, "spans": list(self.spans), "counters": dict(self.counters)}
+
+
+def enable(log_traces: bool = True) -> None:
+    """
+    Turn instrumentation on for the whole process.
+
+    Args:
+        log_traces: Whether to write every finished trace as a JSON line to stderr when the
+            "rag.metrics" logger has no handler configured (default: True)
+    """
+    global _enabled
+    if log_traces and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    _enabled = True
+
+
+def disable() -> None:
+    """Turn instrumentation off; span() and increment() become no-ops again."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    """Return whether instrumentation is on."""
+    return _enabled
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """
+    Time a pipeline stage.
+
+    Use as `with metrics.span("query.search", k=k) as s: ...`. The duration feeds the stage's
+    latency histogram and, inside a trace, the request breakdown. When instrumentation is
+    disabled a shared no-op object is returned, so a span costs one function call.
+
+    Args:
+        name: The stage name, e.g. "query.embed"
+        **attributes: Extra fields recorded with the span in the trace, e.g. token counts
+
+    Returns:
+        A context manager whose set(**attributes) method adds fields while the stage runs
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, attributes, _current_trace.get())
+
+
+def increment(name: str, value: float = 1, **labels: str) -> None:
+    """
+    Add to a counter, e.g. tokens used, cache hits or API retries.
+
+    Args:
+        name: The counter name, e.g. "tokens"
+        value: The amount to add (default: 1)
+        **labels: Label values distinguishing series of the same counter, e.g. kind="prompt"
+    """
+    if not _enabled or not value:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    trace = _current_trace.get()
+    if trace is not None:
+        series = name + "".join(f".{v}" for _, v in key[1])
+        trace.counters[series] = trace.counters.get(series, 0) + value
+
+
+def _observe(name: str, seconds: float) -> None:
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            # Bucket counts followed by the running sum and count
+            histogram = _histograms[name] = [0.0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Iterator[Optional[Trace]]:
+    """
+    Group the spans and counters of one request, e.g. a user question.
+
+    The finished trace is kept for last_trace() and written to the "rag.metrics" logger as a
+    single JSON line. Does nothing when instrumentation is disabled.
+
+    Args:
+        name: The request type, e.g. "query"
+        **attributes: Extra fields recorded with the trace
+
+    Yields:
+        The Trace being recorded, or None when disabled. Its record attribute holds the finished
+        breakdown once the block exits
+    """
+    if not _enabled:
+        yield None
+        return
+    current = Trace(name, attributes)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        current.record = current.to_dict()
+        with _lock:
+            _recent_traces.append(current.record)
+        logger.info(json.dumps(current.record, ensure_ascii=False))
+
+
+def last_trace() -> Optional[Dict[str, Any]]:
+    """
+    Return the breakdown of the most recently finished trace.
+
+    Returns:
+        A dictionary with the trace name, total duration, spans and counters, or None
+    """
+    with _lock:
+        return _recent_traces[-1] if _recent_traces else None
+
+
+def render_prometheus() -> str:
+    """
+    Render every histogram and counter in the Prometheus text exposition format.
+
+    Returns:
+        The metrics page
+    """
+    lines = []
+    with _lock:
+        if _histograms:
+            lines.append("# HELP rag_stage_seconds Duration of pipeline stages")
+            lines.append("# TYPE rag_stage_seconds histogram")
+        for stage, histogram in sorted(_histograms.items()):
+            for bound, count in zip(LATENCY_BUCKETS, histogram):
+                lines.append(f'rag_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count:g}')
+            lines.append(f'rag_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram[-1]:g}')
+            lines.append(f'rag_stage_seconds_sum{{stage="{stage}"}} {histogram[-2]:.6f}')
+            lines.append(f'rag_stage_seconds_count{{stage="{stage}"}} {histogram[-1]:g}')
+
+        declared = set()
+        for (name, labels), value in sorted(_counters.items()):
+            metric = f"rag_{name}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f"{metric}{{{label_text}}} {value:g}" if label_text else f"{metric} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_metrics_server(port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve render_prometheus() at http://host:port/metrics from a daemon thread.
+
+    Args:
+        port: The port to listen on (default: 9464)
+        host: The interface to bind (default: 127.0.0.1)
+
+    Returns:
+        The running server; call shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,311 @@
+import os
+import re
+import json
+import zlib
+import numpy as np
+from typing import List, Dict, Tuple, Optional, Sequence
+
+# Mersenne prime 2^31 - 1: keeps (a * x + b) within 64 bits for 31-bit shingle hashes
+_PRIME = (1 << 31) - 1
+
+# Odd 64-bit multiplier folding the rows of an LSH band into one key; collisions only add candidates
+_BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# Files of a saved NearDuplicateIndex, all inside one directory
+PARAMS_FILE = "params.json"
+ARRAYS = ("ids", "signatures", "band_order", "band_keys")
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _shingles(text: str, shingle_size: int) -> np.ndarray:
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) <= shingle_size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    # CRC32 rather than hash(), which is salted per process: signatures must match across runs
+    return np.unique(np.fromiter((zlib.crc32(gram.encode("utf-8")) & _PRIME for gram in grams),
+                                 dtype=np.uint64, count=len(grams)))
+
+
+def minhash_signatures(texts: List[str], num_perm: int = 128, shingle_size: int = 5, seed: int = 0) -> np.ndarray:
+    """
+    Compute MinHash signatures of texts over their word shingles.
+
+    The fraction of equal positions in two signatures estimates the Jaccard similarity of the
+    texts' shingle sets. Shingles are hashed with CRC32, so a text gets the same signature in
+    every process and on every run.
+
+    Args:
+        texts: The texts to sign
+        num_perm: Number of hash permutations, i.e. signature length (default: 128)
+        shingle_size: Number of consecutive words per shingle (default: 5)
+        seed: Seed of the permutation coefficients (default: 0)
+
+    Returns:
+        A (len(texts), num_perm) array of signatures
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for row, text in enumerate(texts):
+        shingles = _shingles(text, shingle_size)
+        signatures[row] = ((shingles[:, None] * a[None, :] + b[None, :]) % _PRIME).min(axis=0)
+    return signatures
+
+
+def _band_keys(signatures: np.ndarray, bands: int) -> np.ndarray:
+    # One uint64 key per (text, band); equal bands always give equal keys
+    rows = signatures.shape[1] // bands
+    grouped = signatures.reshape(len(signatures), bands, rows)
+    keys = np.zeros((len(signatures), bands), dtype=np.uint64)
+    for row in range(rows):
+        keys = keys * _BAND_MULTIPLIER + grouped[:, :, row]
+    return keys
+
+
+def group_signatures(signatures: np.ndarray, threshold: float = 0.8, bands: int = 16) -> List[int]:
+    """
+    Group near-duplicates by their MinHash signatures with locality-sensitive hashing.
+
+    Signatures are split into bands; texts sharing any band become candidate pairs, which are
+    kept only if their estimated Jaccard similarity reaches the threshold. Groups are closed
+    transitively.
+
+    Args:
+        signatures: A (num_texts, num_perm) array from minhash_signatures; num_perm must be divisible by bands
+        threshold: Minimum estimated Jaccard similarity of word shingles (default: 0.8)
+        bands: Number of LSH bands; more bands find lower-similarity candidates (default: 16)
+
+    Returns:
+        For every text, the position of its group's representative (the group's first text);
+        unique texts map to themselves
+    """
+    if signatures.shape[1] % bands:
+        raise ValueError("num_perm must be divisible by bands")
+
+    parent = list(range(len(signatures)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked = set()
+    for band_keys in _band_keys(signatures, bands).T:
+        buckets: Dict[int, List[int]] = {}
+        for i, key in enumerate(band_keys.tolist()):
+            buckets.setdefault(key, []).append(i)
+
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                pair: Tuple[int, int] = (first, other)
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    root_first, root_other = find(first), find(other)
+                    if root_first != root_other:
+                        # The lower position wins, so earlier texts stay representatives of later ones
+                        parent[max(root_first, root_other)] = min(root_first, root_other)
+
+    return [find(i) for i in range(len(signatures))]
+
+
+def find_near_duplicates(texts: List[str],
+                         threshold: float = 0.8,
+                         num_perm: int = 128,
+                         bands: int = 16,
+                         shingle_size: int = 5) -> List[int]:
+    """
+    Group near-duplicate texts with MinHash and locality-sensitive hashing.
+
+    Args:
+        texts: The texts to compare
+        threshold: Minimum estimated Jaccard similarity of word shingles (default: 0.8)
+        num_perm: Signature length; must be divisible by bands (default: 128)
+        bands: Number of LSH bands; more bands find lower-similarity candidates (default: 16)
+        shingle_size: Number of consecutive words per shingle (default: 5)
+
+    Returns:
+        For every text, the position of its group's representative (the group's first text);
+        unique texts map to themselves
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be divisible by bands")
+    return group_signatures(minhash_signatures(texts, num_perm=num_perm, shingle_size=shingle_size),
+                            threshold=threshold, bands=bands)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures and LSH buckets of the chunks already indexed, kept with the index artifact.
+
+    Incremental ingestion MinHashes only the new chunks and looks each one up here, instead of
+    signing the whole corpus again on every run. For every band the bucket keys are stored
+    sorted, with the rows they belong to, so a lookup is a binary search per band and a saved
+    index can be memory-mapped. Removed IDs are skipped by lookups and dropped on save.
+    """
+
+    def __init__(self,
+                 ids: Optional[np.ndarray] = None,
+                 signatures: Optional[np.ndarray] = None,
+                 threshold: float = 0.8,
+                 num_perm: int = 128,
+                 bands: int = 16,
+                 shingle_size: int = 5,
+                 band_order: Optional[np.ndarray] = None,
+                 band_keys: Optional[np.ndarray] = None):
+        """
+        Args:
+            ids: The chunk IDs (int64)
+            signatures: Their (len(ids), num_perm) MinHash signatures (uint64)
+            threshold: Minimum estimated Jaccard similarity of a near-duplicate (default: 0.8)
+            num_perm: Signature length; must be divisible by bands (default: 128)
+            bands: Number of LSH bands (default: 16)
+            shingle_size: Number of consecutive words per shingle (default: 5)
+            band_order: Saved (bands, len(ids)) row order sorting each band's keys; computed when omitted
+            band_keys: Saved (bands, len(ids)) sorted keys of each band; computed when omitted
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.ids = ids if ids is not None else np.zeros(0, dtype=np.int64)
+        self.signatures = signatures if signatures is not None else np.zeros((0, num_perm), dtype=np.uint64)
+        self._removed: set = set()
+        if band_order is None or band_keys is None:
+            self._index_bands()
+        else:
+            self._band_order, self._band_keys = band_order, band_keys
+
+    def __len__(self) -> int:
+        return len(self.ids) - len(self._removed)
+
+    def _index_bands(self) -> None:
+        keys = _band_keys(self.signatures, self.bands).T
+        self._band_order = np.argsort(keys, axis=1, kind="stable")
+        self._band_keys = np.take_along_axis(keys, self._band_order, axis=1)
+
+    def sign(self, texts: List[str]) -> np.ndarray:
+        """
+        Compute MinHash signatures of texts with this index's parameters.
+
+        Args:
+            texts: The texts to sign
+
+        Returns:
+            A (len(texts), num_perm) array of signatures
+        """
+        return minhash_signatures(texts, num_perm=self.num_perm, shingle_size=self.shingle_size)
+
+    def group(self, signatures: np.ndarray) -> List[int]:
+        """
+        Group near-duplicates among new signatures, as group_signatures does.
+
+        Args:
+            signatures: Signatures from sign
+
+        Returns:
+            For every signature, the position of its group's representative
+        """
+        return group_signatures(signatures, threshold=self.threshold, bands=self.bands)
+
+    def query(self, signature: np.ndarray) -> Optional[int]:
+        """
+        Find an indexed chunk that is a near-duplicate of a signature.
+
+        Args:
+            signature: One signature from sign
+
+        Returns:
+            The lowest matching chunk ID, or None if no indexed chunk reaches the threshold
+        """
+        candidates = set()
+        for band, key in enumerate(_band_keys(signature[None, :], self.bands)[0]):
+            keys = self._band_keys[band]
+            low, high = np.searchsorted(keys, key, side="left"), np.searchsorted(keys, key, side="right")
+            candidates.update(self._band_order[band, low:high].tolist())
+
+        best = None
+        for row in candidates:
+            chunk_id = int(self.ids[row])
+            if chunk_id in self._removed or (best is not None and chunk_id >= best):
+                continue
+            if np.mean(self.signatures[row] == signature) >= self.threshold:
+                best = chunk_id
+        return best
+
+    def add(self, ids: Sequence[int], signatures: np.ndarray) -> None:
+        """
+        Index the signatures of newly added chunks.
+
+        Args:
+            ids: The new chunk IDs
+            signatures: Their signatures, one row per ID
+        """
+        if len(ids):
+            self._compact()
+            self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+            self.signatures = np.concatenate([self.signatures, signatures.astype(np.uint64, copy=False)])
+            self._index_bands()
+
+    def remove(self, ids: Sequence[int]) -> None:
+        """
+        Forget chunks removed from the index.
+
+        Args:
+            ids: The removed chunk IDs
+        """
+        self._removed.update(int(chunk_id) for chunk_id in ids)
+
+    def _compact(self) -> None:
+        if self._removed:
+            keep = ~np.isin(self.ids, np.fromiter(self._removed, dtype=np.int64, count=len(self._removed)))
+            self.ids, self.signatures = self.ids[keep], self.signatures[keep]
+            self._removed.clear()
+            self._index_bands()
+
+    def save(self, directory: str) -> None:
+        """
+        Write the signatures and LSH buckets to a directory.
+
+        Args:
+            directory: The directory to write to; created if missing
+        """
+        self._compact()
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"ids": self.ids, "signatures": self.signatures, "band_order": self._band_order,
+                  "band_keys": self._band_keys}
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+        with open(os.path.join(directory, PARAMS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"threshold": self.threshold, "num_perm": self.num_perm, "bands": self.bands,
+                       "shingle_size": self.shingle_size}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Optional["NearDuplicateIndex"]:
+        """
+        Open an index saved with save.
+
+        Args:
+            directory: The directory the index was saved to
+            mmap: Whether to memory-map the arrays instead of reading them (default: True)
+
+        Returns:
+            The NearDuplicateIndex, or None if none was saved there
+        """
+        if not os.path.exists(os.path.join(directory, PARAMS_FILE)):
+            return None
+        with open(os.path.join(directory, PARAMS_FILE), "r", encoding="utf-8") as f:
+            params = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in ARRAYS}
+        return cls(**arrays, **params)
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import contextvars
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from typing import Optional, Awaitable, AsyncIterator, Iterator, TypeVar
+
+T = TypeVar("T")
+
+# Connection pool shared by every request in the process; keep-alive avoids a TLS handshake per call
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+
+_client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def get_client() -> OpenAI:
+    """
+    Return the process-wide synchronous OpenAI client, creating it on first use.
+
+    The API key is read from the OPENAI_API_KEY environment variable.
+
+    Returns:
+        An OpenAI client backed by a pooled, keep-alive HTTP connection pool
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            _client = OpenAI(http_client=DefaultHttpxClient(limits=POOL_LIMITS))
+        return _client
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop that runs all async OpenAI calls.
+
+    The loop runs forever in a daemon thread, so the async client's connections stay bound to a
+    single loop no matter which thread (Streamlit session, CLI, worker) submits work.
+
+    Returns:
+        The running background event loop
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="openai-event-loop", daemon=True).start()
+        return _loop
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Return the process-wide AsyncOpenAI client, creating it on first use.
+
+    The client must only be awaited on the loop returned by get_event_loop, e.g. through run_async.
+
+    Returns:
+        An AsyncOpenAI client backed by a pooled, keep-alive HTTP connection pool
+    """
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = AsyncOpenAI(http_client=DefaultAsyncHttpxClient(limits=POOL_LIMITS))
+        return _async_client
+
+
+async def _in_context(awaitable: Awaitable[T], context: contextvars.Context) -> T:
+    # Tasks on the background loop start from the loop thread's context; restore the caller's
+    # context variables (e.g. the active metrics trace) before running the awaitable
+    for variable, value in context.items():
+        variable.set(value)
+    return await awaitable
+
+
+def run_async(coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Run a coroutine on the shared event loop and block the calling thread until it finishes.
+
+    Args:
+        coroutine: The coroutine to run
+        timeout: Optional number of seconds to wait before giving up
+
+    Returns:
+        The coroutine's result
+    """
+    context = contextvars.copy_context()
+    return asyncio.run_coroutine_threadsafe(_in_context(coroutine, context), get_event_loop()).result(timeout)
+
+
+def iterate_async(iterator: AsyncIterator[T]) -> Iterator[T]:
+    """
+    Consume an async iterator running on the shared event loop from synchronous code.
+
+    Args:
+        iterator: The async iterator, e.g. generate_answer_stream_async(...)
+
+    Yields:
+        The iterator's items as they become available
+    """
+    loop = get_event_loop()
+    context = contextvars.copy_context()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(_in_context(iterator.__anext__(), context), loop).result()
+        except StopAsyncIteration:
+            return
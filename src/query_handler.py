@@ -1,23 +1,33 @@
+import time
+import asyncio
 import numpy as np
-from openai import OpenAI
-from embedding import get_embedding
-from typing import List, Any, Optional
+import metrics
+from openai import OpenAI, AsyncOpenAI
+from embedding import get_embedding, get_embedding_async
+from embedding_cache import EmbeddingCache
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from context_packing import pack_context
+from reranking import Reranker, ScoredChunk
+from typing import List, Any, Optional, Union, Dict, Mapping, Iterator, AsyncIterator, Tuple
 
 
 def query_rag(query: str,
               index: Any,
-              chunks: List[str],
+              chunks: Union[List[str], Mapping[int, str]],
               k: int = 3,
-              client: Optional[OpenAI] = None) -> List[str]:
+              client: Optional[OpenAI] = None,
+              cache: Optional[EmbeddingCache] = None) -> List[str]:
     """
     Retrieve relevant text chunks based on a query using vector similarity search.
 
     Args:
         query: The user's question or query
         index: A FAISS index containing embeddings of text chunks
-        chunks: A list of text chunks corresponding to the embeddings in the index
+        chunks: The text chunks corresponding to the embeddings in the index, either a list aligned
+            with the index positions or a mapping from vector ID to chunk for ID-mapped indexes
         k: Number of relevant chunks to retrieve (default: 3)
         client: An optional OpenAI client instance. If not provided, assumes the client is initialized elsewhere
+        cache: An optional EmbeddingCache so repeated queries skip the embedding API call
 
     Returns:
         A list of text chunks most relevant to the query
@@ -26,33 +36,366 @@ def query_rag(query: str,
     if client is None:
         raise ValueError("OpenAI client must be provided")
 
-    query_embedding = np.array(get_embedding(
-        query, client=client)).astype("float32").reshape(1, -1)
-    _, indices = index.search(query_embedding, k)
-    relevant_chunks = [chunks[i] for i in indices[0]]
+    with metrics.span("query.embed"):
+        query_embedding = _query_vectors(get_embedding(query, client=client, cache=cache), index)
+    with metrics.span("query.search", k=k):
+        _, indices = index.search(query_embedding, k)
+    # FAISS pads missing results with -1 when the index holds fewer than k vectors
+    relevant_chunks = [chunks[int(i)] for i in indices[0] if i >= 0]
     return relevant_chunks
 
 
-def generate_answer(query: str, context_chunks: List[str],
-                    client: Optional[OpenAI] = None,
-                    model: str = "gpt-4o",
-                    temperature: float = 0.7) -> str:
+async def query_rag_async(query: str,
+                          index: Any,
+                          chunks: Union[List[str], Mapping[int, str]],
+                          k: int = 3,
+                          client: Optional[AsyncOpenAI] = None,
+                          cache: Optional[EmbeddingCache] = None) -> List[str]:
     """
-    Generate an answer to the query based on the provided context chunks using OpenAI's API.
+    Async counterpart of query_rag: embeds the query without blocking and runs the search off the event loop.
 
     Args:
         query: The user's question or query
-        context_chunks: A list of text chunks providing context for answering the query
-        client: An optional OpenAI client instance. If not provided, assumes the client is initialized elsewhere
-        model: The model to use for generating the answer (default: gpt-4o)
-        temperature: Controls randomness in the response (default: 0.7)
+        index: A FAISS index containing embeddings of text chunks
+        chunks: The text chunks corresponding to the embeddings in the index, either a list aligned
+            with the index positions or a mapping from vector ID to chunk for ID-mapped indexes
+        k: Number of relevant chunks to retrieve (default: 3)
+        client: An AsyncOpenAI client instance
+        cache: An optional EmbeddingCache so repeated queries skip the embedding API call
 
     Returns:
-        A string containing the generated answer
+        A list of text chunks most relevant to the query
     """
     if client is None:
         raise ValueError("OpenAI client must be provided")
 
+    with metrics.span("query.embed"):
+        query_embedding = _query_vectors(await get_embedding_async(query, client=client, cache=cache), index)
+    with metrics.span("query.search", k=k):
+        _, indices = await asyncio.to_thread(index.search, query_embedding, k)
+    # FAISS pads missing results with -1 when the index holds fewer than k vectors
+    return [chunks[int(i)] for i in indices[0] if i >= 0]
+
+
+def _query_vectors(embeddings: Union[np.ndarray, List[float], List[List[float]]],
+                   index: Any,
+                   count: int = 1) -> np.ndarray:
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(count, -1)
+    if vectors.shape[1] != index.d:
+        # Query and corpus vectors from different embedding backends are not comparable
+        raise ValueError(f"Query embeddings have dimension {vectors.shape[1]} but the index has {index.d}; "
+                         "embed queries with the model or backend that built the index")
+    return vectors
+
+
+def _dense_hits(index: Any, query_embedding: Union[np.ndarray, List[float]], k: int) -> List[Tuple[int, float]]:
+    query_vector = _query_vectors(query_embedding, index)
+    with metrics.span("query.search", k=k):
+        distances, indices = index.search(query_vector, k)
+    # FAISS pads missing results with -1 when the index holds fewer than k vectors
+    return [(int(i), float(distance)) for i, distance in zip(indices[0], distances[0]) if i >= 0]
+
+
+def _lexical_hits(bm25: BM25Index, query: str, k: int) -> List[Tuple[int, float]]:
+    with metrics.span("query.lexical", k=k):
+        return bm25.search(query, k)
+
+
+def _fuse(dense_ids: Optional[List[int]], lexical_ids: List[int], k: int) -> List[int]:
+    if dense_ids is None:
+        return lexical_ids[:k]
+    return [chunk_id for chunk_id, _ in reciprocal_rank_fusion([dense_ids, lexical_ids])[:k]]
+
+
+def _fuse_hits(dense_hits: Optional[List[Tuple[int, float]]], lexical_hits: List[Tuple[int, float]], k: int) -> List[int]:
+    dense_ids = [chunk_id for chunk_id, _ in dense_hits] if dense_hits is not None else None
+    return _fuse(dense_ids, [chunk_id for chunk_id, _ in lexical_hits], k)
+
+
+def _candidates(chunks: Union[List[str], Mapping[int, str]],
+                dense_hits: Optional[List[Tuple[int, float]]],
+                lexical_hits: List[Tuple[int, float]]) -> List[ScoredChunk]:
+    # Every chunk found by either retriever, in fused order, with its distance and BM25 score
+    distances = dict(dense_hits or [])
+    lexical_scores = dict(lexical_hits)
+    rankings = [[chunk_id for chunk_id, _ in lexical_hits]]
+    if dense_hits is not None:
+        rankings.insert(0, [chunk_id for chunk_id, _ in dense_hits])
+    return [ScoredChunk(chunk_id, chunks[chunk_id], fused, distances.get(chunk_id), lexical_scores.get(chunk_id))
+            for chunk_id, fused in reciprocal_rank_fusion(rankings)]
+
+
+def _retrieve_hits(query: str,
+                   index: Any,
+                   bm25: BM25Index,
+                   depth: int,
+                   client: Optional[OpenAI],
+                   cache: Optional[EmbeddingCache],
+                   embedding_timeout: Optional[float],
+                   lexical_only: bool) -> Tuple[Optional[List[Tuple[int, float]]], List[Tuple[int, float]]]:
+    if client is None and not lexical_only:
+        raise ValueError("OpenAI client must be provided")
+
+    lexical_hits = _lexical_hits(bm25, query, depth)
+
+    dense_hits = None
+    if not lexical_only:
+        try:
+            with metrics.span("query.embed"):
+                if embedding_timeout is not None:
+                    # The SDK retries on its own too; disable both, so the fallback starts after one timeout
+                    timed_client = client.with_options(timeout=embedding_timeout, max_retries=0)
+                    query_embedding = get_embedding(query, client=timed_client, cache=cache, max_retries=0)
+                else:
+                    query_embedding = get_embedding(query, client=client, cache=cache)
+            dense_hits = _dense_hits(index, query_embedding, depth)
+        except Exception as e:
+            metrics.increment("lexical_fallbacks")
+            print(f"Vector search unavailable, using lexical results only: {e!r}")
+    return dense_hits, lexical_hits
+
+
+async def _retrieve_hits_async(query: str,
+                               index: Any,
+                               bm25: BM25Index,
+                               depth: int,
+                               client: Optional[AsyncOpenAI],
+                               cache: Optional[EmbeddingCache],
+                               embedding_timeout: Optional[float],
+                               lexical_only: bool) -> Tuple[Optional[List[Tuple[int, float]]], List[Tuple[int, float]]]:
+    if client is None and not lexical_only:
+        raise ValueError("OpenAI client must be provided")
+
+    lexical_task = asyncio.create_task(asyncio.to_thread(_lexical_hits, bm25, query, depth))
+
+    dense_hits = None
+    if not lexical_only:
+        try:
+            with metrics.span("query.embed"):
+                query_embedding = await asyncio.wait_for(
+                    get_embedding_async(query, client=client, cache=cache,
+                                        max_retries=0 if embedding_timeout is not None else 6),
+                    embedding_timeout)
+            dense_hits = await asyncio.to_thread(_dense_hits, index, query_embedding, depth)
+        except Exception as e:
+            metrics.increment("lexical_fallbacks")
+            print(f"Vector search unavailable, using lexical results only: {e!r}")
+
+    return dense_hits, await lexical_task
+
+
+def hybrid_query_rag(query: str,
+                     index: Any,
+                     chunks: Union[List[str], Mapping[int, str]],
+                     bm25: BM25Index,
+                     k: int = 3,
+                     client: Optional[OpenAI] = None,
+                     cache: Optional[EmbeddingCache] = None,
+                     candidates: int = 20,
+                     embedding_timeout: Optional[float] = None,
+                     lexical_only: bool = False,
+                     return_ids: bool = False) -> Union[List[str], List[int]]:
+    """
+    Retrieve relevant text chunks by fusing BM25 and vector search results with reciprocal rank fusion.
+
+    Exact terms such as product, brand and campaign names are matched by the BM25 index, while the
+    FAISS index covers paraphrases. If the query embedding fails or exceeds embedding_timeout, the
+    lexical ranking is returned on its own.
+
+    Args:
+        query: The user's question or query
+        index: A FAISS index containing embeddings of text chunks
+        chunks: The text chunks corresponding to the embeddings in the index, either a list aligned
+            with the index positions or a mapping from vector ID to chunk for ID-mapped indexes
+        bm25: A BM25Index built over the same chunks
+        k: Number of relevant chunks to retrieve (default: 3)
+        client: An OpenAI client instance, required unless lexical_only is set
+        cache: An optional EmbeddingCache so repeated queries skip the embedding API call
+        candidates: Number of results taken from each retriever before fusion (default: 20)
+        embedding_timeout: Optional number of seconds to wait for the query embedding, without retries
+        lexical_only: Skip the embedding call and the vector search entirely (default: False)
+        return_ids: Return the chunk IDs instead of the texts, e.g. to look up ChunkStore metadata (default: False)
+
+    Returns:
+        A list of text chunks (or their IDs) most relevant to the query
+    """
+    dense_hits, lexical_hits = _retrieve_hits(query, index, bm25, max(k, candidates), client, cache,
+                                              embedding_timeout, lexical_only)
+    chunk_ids = _fuse_hits(dense_hits, lexical_hits, k)
+    return chunk_ids if return_ids else [chunks[chunk_id] for chunk_id in chunk_ids]
+
+
+async def hybrid_query_rag_async(query: str,
+                                 index: Any,
+                                 chunks: Union[List[str], Mapping[int, str]],
+                                 bm25: BM25Index,
+                                 k: int = 3,
+                                 client: Optional[AsyncOpenAI] = None,
+                                 cache: Optional[EmbeddingCache] = None,
+                                 candidates: int = 20,
+                                 embedding_timeout: Optional[float] = None,
+                                 lexical_only: bool = False,
+                                 return_ids: bool = False) -> Union[List[str], List[int]]:
+    """
+    Async counterpart of hybrid_query_rag: the BM25 search runs while the query is being embedded.
+
+    Args:
+        query: The user's question or query
+        index: A FAISS index containing embeddings of text chunks
+        chunks: The text chunks corresponding to the embeddings in the index, either a list aligned
+            with the index positions or a mapping from vector ID to chunk for ID-mapped indexes
+        bm25: A BM25Index built over the same chunks
+        k: Number of relevant chunks to retrieve (default: 3)
+        client: An AsyncOpenAI client instance, required unless lexical_only is set
+        cache: An optional EmbeddingCache so repeated queries skip the embedding API call
+        candidates: Number of results taken from each retriever before fusion (default: 20)
+        embedding_timeout: Optional number of seconds to wait for the query embedding, without retries
+        lexical_only: Skip the embedding call and the vector search entirely (default: False)
+        return_ids: Return the chunk IDs instead of the texts, e.g. to look up ChunkStore metadata (default: False)
+
+    Returns:
+        A list of text chunks (or their IDs) most relevant to the query
+    """
+    dense_hits, lexical_hits = await _retrieve_hits_async(query, index, bm25, max(k, candidates), client, cache,
+                                                          embedding_timeout, lexical_only)
+    chunk_ids = _fuse_hits(dense_hits, lexical_hits, k)
+    return chunk_ids if return_ids else [chunks[chunk_id] for chunk_id in chunk_ids]
+
+
+def rerank_query_rag(query: str,
+                     index: Any,
+                     chunks: Union[List[str], Mapping[int, str]],
+                     bm25: BM25Index,
+                     reranker: Reranker,
+                     k: int = 3,
+                     client: Optional[OpenAI] = None,
+                     cache: Optional[EmbeddingCache] = None,
+                     candidates: int = 50,
+                     embedding_timeout: Optional[float] = None,
+                     lexical_only: bool = False) -> List[ScoredChunk]:
+    """
+    Over-fetch candidates from BM25 and vector search, rescore them with a reranker and keep the best k.
+
+    Args:
+        query: The user's question or query
+        index: A FAISS index containing embeddings of text chunks
+        chunks: The text chunks corresponding to the embeddings in the index, either a list aligned
+            with the index positions or a mapping from vector ID to chunk for ID-mapped indexes
+        bm25: A BM25Index built over the same chunks
+        reranker: The Reranker rescoring the candidates, e.g. a LexicalReranker or CrossEncoderReranker
+        k: Number of chunks to keep after reranking (default: 3)
+        client: An OpenAI client instance, required unless lexical_only is set
+        cache: An optional EmbeddingCache so repeated queries skip the embedding API call
+        candidates: Number of results taken from each retriever and rescored (default: 50)
+        embedding_timeout: Optional number of seconds to wait for the query embedding, without retries
+        lexical_only: Skip the embedding call and the vector search entirely (default: False)
+
+    Returns:
+        Up to k ScoredChunks, best first, with the reranker score, the FAISS distance (None if the
+        chunk was only found by BM25) and the BM25 score (None if only found by vector search)
+    """
+    dense_hits, lexical_hits = _retrieve_hits(query, index, bm25, max(k, candidates), client, cache,
+                                              embedding_timeout, lexical_only)
+    return reranker.rerank(query, _candidates(chunks, dense_hits, lexical_hits), top_n=k)
+
+
+async def rerank_query_rag_async(query: str,
+                                 index: Any,
+                                 chunks: Union[List[str], Mapping[int, str]],
+                                 bm25: BM25Index,
+                                 reranker: Reranker,
+                                 k: int = 3,
+                                 client: Optional[AsyncOpenAI] = None,
+                                 cache: Optional[EmbeddingCache] = None,
+                                 candidates: int = 50,
+                                 embedding_timeout: Optional[float] = None,
+                                 lexical_only: bool = False) -> List[ScoredChunk]:
+    """
+    Async counterpart of rerank_query_rag; reranking runs off the event loop.
+
+    Args:
+        query: The user's question or query
+        index: A FAISS index containing embeddings of text chunks
+        chunks: The text chunks corresponding to the embeddings in the index, either a list aligned
+            with the index positions or a mapping from vector ID to chunk for ID-mapped indexes
+        bm25: A BM25Index built over the same chunks
+        reranker: The Reranker rescoring the candidates, e.g. a LexicalReranker or CrossEncoderReranker
+        k: Number of chunks to keep after reranking (default: 3)
+        client: An AsyncOpenAI client instance, required unless lexical_only is set
+        cache: An optional EmbeddingCache so repeated queries skip the embedding API call
+        candidates: Number of results taken from each retriever and rescored (default: 50)
+        embedding_timeout: Optional number of seconds to wait for the query embedding, without retries
+        lexical_only: Skip the embedding call and the vector search entirely (default: False)
+
+    Returns:
+        Up to k ScoredChunks, best first, with the reranker score, FAISS distance and BM25 score
+    """
+    dense_hits, lexical_hits = await _retrieve_hits_async(query, index, bm25, max(k, candidates), client, cache,
+                                                          embedding_timeout, lexical_only)
+    return await asyncio.to_thread(reranker.rerank, query, _candidates(chunks, dense_hits, lexical_hits), k)
+
+
+def batch_query_rag(queries: List[str],
+                    query_embeddings: Union[np.ndarray, List[List[float]]],
+                    index: Any,
+                    chunks: Union[List[str], Mapping[int, str]],
+                    k: int = 3,
+                    bm25: Optional[BM25Index] = None,
+                    candidates: int = 20,
+                    reranker: Optional[Reranker] = None) -> List[List[str]]:
+    """
+    Retrieve relevant text chunks for many queries with a single matrix search of the FAISS index.
+
+    Args:
+        queries: The user questions
+        query_embeddings: The embedding of each question, in the same order, e.g. the array returned by
+            get_embeddings_concurrent
+        index: A FAISS index containing embeddings of text chunks
+        chunks: The text chunks corresponding to the embeddings in the index, either a list aligned
+            with the index positions or a mapping from vector ID to chunk for ID-mapped indexes
+        k: Number of relevant chunks to retrieve per query (default: 3)
+        bm25: An optional BM25Index over the same chunks; when given, results are fused as in hybrid_query_rag
+        candidates: Number of results taken from each retriever before fusion or reranking (default: 20)
+        reranker: An optional Reranker; when given, the candidates of each query are rescored and the best k kept
+
+    Returns:
+        One list of relevant text chunks per query
+    """
+    if not queries:
+        return []
+
+    depth = max(k, candidates) if bm25 is not None or reranker is not None else k
+    query_vectors = _query_vectors(query_embeddings, index, count=len(queries))
+    with metrics.span("query.search", k=depth, queries=len(queries)):
+        distances, indices = index.search(query_vectors, depth)
+
+    results = []
+    for query, row, row_distances in zip(queries, indices, distances):
+        if reranker is not None:
+            dense_hits = [(int(i), float(distance)) for i, distance in zip(row, row_distances) if i >= 0]
+            lexical_hits = bm25.search(query, depth) if bm25 is not None else []
+            ranked = reranker.rerank(query, _candidates(chunks, dense_hits, lexical_hits), top_n=k)
+            results.append([candidate.text for candidate in ranked])
+            continue
+        dense_ids = [int(i) for i in row if i >= 0]
+        if bm25 is not None:
+            lexical_ids = [chunk_id for chunk_id, _ in bm25.search(query, depth)]
+            dense_ids = _fuse(dense_ids, lexical_ids, k)
+        results.append([chunks[chunk_id] for chunk_id in dense_ids[:k]])
+    return results
+
+
+def build_messages(query: str, context_chunks: List[str]) -> List[Dict[str, str]]:
+    """
+    Build the chat messages sent to the model: the system prompt plus the query with its context.
+
+    Args:
+        query: The user's question or query
+        context_chunks: A list of text chunks providing context for answering the query
+
+    Returns:
+        A list of chat messages in the OpenAI format
+    """
     # Read the system prompt from file
     system_prompt = ""
     try:
@@ -61,22 +404,211 @@ def generate_answer(query: str, context_chunks: List[str],
     except Exception as e:
         print(f"Error reading system prompt: {e}")
         system_prompt = "Ești un asistent virtual inteligent creat de E.ON România."
-    
+
     # Join context chunks and create the conversation
     context = "\n\n".join(context_chunks)
-    
+
     # Create messages with system prompt and user query with context
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": f"Context:\n{context}\n\nÎntrebare: {query}"}
     ]
-    
+
+
+def _prepare_messages(query: str,
+                      context_chunks: List[str],
+                      model: str,
+                      max_context_tokens: Optional[int],
+                      usage: Optional[Dict[str, int]]) -> List[Dict[str, str]]:
+    with metrics.span("prompt.build", chunks=len(context_chunks)) as span:
+        if max_context_tokens is not None:
+            packed = pack_context(query, context_chunks, max_tokens=max_context_tokens, model=model)
+            context_chunks = packed.chunks
+            span.set(context_tokens=packed.tokens, chunks_used=len(packed.chunks))
+            metrics.increment("tokens", packed.tokens, kind="context")
+            if usage is not None:
+                usage.update(context_tokens=packed.tokens, chunks_used=len(packed.chunks),
+                             chunks_dropped=packed.dropped, chunks_trimmed=packed.trimmed)
+        return build_messages(query, context_chunks)
+
+
+def _record_usage(usage: Optional[Dict[str, int]], response_usage: Any) -> None:
+    if response_usage is None:
+        return
+    metrics.increment("tokens", response_usage.prompt_tokens, kind="prompt")
+    metrics.increment("tokens", response_usage.completion_tokens, kind="completion")
+    if usage is not None:
+        usage.update(prompt_tokens=response_usage.prompt_tokens,
+                     completion_tokens=response_usage.completion_tokens,
+                     total_tokens=response_usage.total_tokens)
+
+
+def generate_answer(query: str, context_chunks: List[str],
+                    client: Optional[OpenAI] = None,
+                    model: str = "gpt-4o",
+                    temperature: float = 0.7,
+                    max_context_tokens: Optional[int] = 3000,
+                    usage: Optional[Dict[str, int]] = None) -> str:
+    """
+    Generate an answer to the query based on the provided context chunks using OpenAI's API.
+
+    Args:
+        query: The user's question or query
+        context_chunks: A list of text chunks providing context for answering the query
+        client: An optional OpenAI client instance. If not provided, assumes the client is initialized elsewhere
+        model: The model to use for generating the answer (default: gpt-4o)
+        temperature: Controls randomness in the response (default: 0.7)
+        max_context_tokens: Token budget for the context; redundant chunks are dropped and chunks that do
+            not fit are trimmed to their most relevant sentences. None sends every chunk (default: 3000)
+        usage: Optional dictionary filled with the context, prompt and completion token counts of the request
+
+    Returns:
+        A string containing the generated answer
+    """
+    if client is None:
+        raise ValueError("OpenAI client must be provided")
+
+    messages = _prepare_messages(query, context_chunks, model, max_context_tokens, usage)
+
     # Generate the response
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature
-    )
-    
+    with metrics.span("llm.generate", model=model):
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature
+        )
+    _record_usage(usage, response.usage)
+
     answer = response.choices[0].message.content.strip()
     return answer
+
+
+def generate_answer_stream(query: str, context_chunks: List[str],
+                           client: Optional[OpenAI] = None,
+                           model: str = "gpt-4o",
+                           temperature: float = 0.7,
+                           max_context_tokens: Optional[int] = 3000,
+                           usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """
+    Generate an answer like generate_answer, but yield the text incrementally as the model produces it.
+
+    Args:
+        query: The user's question or query
+        context_chunks: A list of text chunks providing context for answering the query
+        client: An optional OpenAI client instance. If not provided, assumes the client is initialized elsewhere
+        model: The model to use for generating the answer (default: gpt-4o)
+        temperature: Controls randomness in the response (default: 0.7)
+        max_context_tokens: Token budget for the context; redundant chunks are dropped and chunks that do
+            not fit are trimmed to their most relevant sentences. None sends every chunk (default: 3000)
+        usage: Optional dictionary filled with the context, prompt and completion token counts of the request
+
+    Yields:
+        Pieces of the answer text in the order they are generated
+    """
+    if client is None:
+        raise ValueError("OpenAI client must be provided")
+
+    messages = _prepare_messages(query, context_chunks, model, max_context_tokens, usage)
+
+    with metrics.span("llm.generate", model=model, stream=True) as span:
+        start = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        first_token = True
+        for event in stream:
+            # The final event carries the token usage and no choices
+            _record_usage(usage, event.usage)
+            if event.choices and event.choices[0].delta.content:
+                if first_token:
+                    span.set(first_token_ms=(time.perf_counter() - start) * 1000)
+                    first_token = False
+                yield event.choices[0].delta.content
+
+
+async def generate_answer_async(query: str, context_chunks: List[str],
+                                client: Optional[AsyncOpenAI] = None,
+                                model: str = "gpt-4o",
+                                temperature: float = 0.7,
+                                max_context_tokens: Optional[int] = 3000,
+                                usage: Optional[Dict[str, int]] = None) -> str:
+    """
+    Async counterpart of generate_answer.
+
+    Args:
+        query: The user's question or query
+        context_chunks: A list of text chunks providing context for answering the query
+        client: An AsyncOpenAI client instance
+        model: The model to use for generating the answer (default: gpt-4o)
+        temperature: Controls randomness in the response (default: 0.7)
+        max_context_tokens: Token budget for the context; redundant chunks are dropped and chunks that do
+            not fit are trimmed to their most relevant sentences. None sends every chunk (default: 3000)
+        usage: Optional dictionary filled with the context, prompt and completion token counts of the request
+
+    Returns:
+        A string containing the generated answer
+    """
+    if client is None:
+        raise ValueError("OpenAI client must be provided")
+
+    messages = _prepare_messages(query, context_chunks, model, max_context_tokens, usage)
+    with metrics.span("llm.generate", model=model):
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature
+        )
+    _record_usage(usage, response.usage)
+    return response.choices[0].message.content.strip()
+
+
+async def generate_answer_stream_async(query: str, context_chunks: List[str],
+                                       client: Optional[AsyncOpenAI] = None,
+                                       model: str = "gpt-4o",
+                                       temperature: float = 0.7,
+                                       max_context_tokens: Optional[int] = 3000,
+                                       usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+    """
+    Async counterpart of generate_answer_stream.
+
+    Args:
+        query: The user's question or query
+        context_chunks: A list of text chunks providing context for answering the query
+        client: An AsyncOpenAI client instance
+        model: The model to use for generating the answer (default: gpt-4o)
+        temperature: Controls randomness in the response (default: 0.7)
+        max_context_tokens: Token budget for the context; redundant chunks are dropped and chunks that do
+            not fit are trimmed to their most relevant sentences. None sends every chunk (default: 3000)
+        usage: Optional dictionary filled with the context, prompt and completion token counts of the request
+
+    Yields:
+        Pieces of the answer text in the order they are generated
+    """
+    if client is None:
+        raise ValueError("OpenAI client must be provided")
+
+    messages = _prepare_messages(query, context_chunks, model, max_context_tokens, usage)
+    with metrics.span("llm.generate", model=model, stream=True) as span:
+        start = time.perf_counter()
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        first_token = True
+        async for event in stream:
+            # The final event carries the token usage and no choices
+            _record_usage(usage, event.usage)
+            if event.choices and event.choices[0].delta.content:
+                if first_token:
+                    span.set(first_token_ms=(time.perf_counter() - start) * 1000)
+                    first_token = False
+                yield event.choices[0].delta.content
@@ -0,0 +1,192 @@
+import os
+import math
+import threading
+import numpy as np
+import metrics
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Sequence, NamedTuple
+from lexical_index import BM25Index, tokenize
+
+_cross_encoders: Dict[str, "CrossEncoderReranker"] = {}
+_lock = threading.Lock()
+
+
+class ScoredChunk(NamedTuple):
+    """A retrieved chunk with the scores it was ranked by."""
+    chunk_id: int
+    text: str
+    score: float
+    distance: Optional[float] = None
+    lexical_score: Optional[float] = None
+
+
+class Reranker:
+    """
+    Rescores retrieved candidates against the question, so only the best few reach the prompt.
+
+    Subclasses implement score(); rerank() orders candidates by it, keeping the retrieval order
+    among equal scores.
+    """
+
+    name = "reranker"
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        """
+        Score candidate texts against a query.
+
+        Args:
+            query: The user's question
+            texts: The candidate chunk texts
+
+        Returns:
+            One float32 relevance score per text, higher is more relevant
+        """
+        raise NotImplementedError
+
+    def rerank(self, query: str, candidates: Sequence[ScoredChunk], top_n: int = 3) -> List[ScoredChunk]:
+        """
+        Keep the top_n candidates by reranker score.
+
+        Args:
+            query: The user's question
+            candidates: The retrieved candidates, in retrieval order
+            top_n: Number of candidates to keep (default: 3)
+
+        Returns:
+            The best candidates, best first, with score set to the reranker score
+        """
+        if not candidates:
+            return []
+        with metrics.span("query.rerank", reranker=self.name, candidates=len(candidates)):
+            scores = self.score(query, [candidate.text for candidate in candidates])
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [candidates[i]._replace(score=float(scores[i])) for i in order]
+
+
+class LexicalReranker(Reranker):
+    """
+    Cheap reranker based on the overlap between question and chunk terms.
+
+    A chunk scores the IDF-weighted share of the question's terms it contains, plus a bonus
+    for question bigrams that appear as adjacent terms in the chunk, so phrases such as product
+    names outrank chunks mentioning their words apart. Needs no model and runs in microseconds
+    per candidate.
+    """
+
+    name = "lexical"
+
+    def __init__(self, bm25: Optional[BM25Index] = None, phrase_weight: float = 0.5):
+        """
+        Args:
+            bm25: Optional BM25Index over the whole corpus, whose document frequencies weight the terms.
+                Without it, the candidates themselves are used
+            phrase_weight: Weight of the matched-bigram share relative to the term coverage (default: 0.5)
+        """
+        self.bm25 = bm25
+        self.phrase_weight = phrase_weight
+
+    def _idf(self, terms: Sequence[str], documents: List[set]) -> Dict[str, float]:
+        if self.bm25 is not None:
+            total = self.bm25.num_docs
+            frequencies = {term: self.bm25.document_frequency(term) for term in terms}
+        else:
+            total = len(documents)
+            frequencies = {term: sum(term in document for document in documents) for term in terms}
+        return {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in frequencies.items()}
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        query_terms = tokenize(query)
+        unique_terms = list(dict.fromkeys(query_terms))
+        scores = np.zeros(len(texts), dtype=np.float32)
+        if not unique_terms:
+            return scores
+
+        tokenized = [tokenize(text) for text in texts]
+        documents = [set(terms) for terms in tokenized]
+        idf = self._idf(unique_terms, documents)
+        total_weight = sum(idf.values()) or 1.0
+        bigrams = set(zip(query_terms, query_terms[1:]))
+
+        for i, (terms, document) in enumerate(zip(tokenized, documents)):
+            coverage = sum(weight for term, weight in idf.items() if term in document) / total_weight
+            phrases = len(bigrams & set(zip(terms, terms[1:]))) / len(bigrams) if bigrams else 0.0
+            scores[i] = coverage + self.phrase_weight * phrases
+        return scores
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Cross-encoder exported to ONNX (e.g. an int8-quantized multilingual MiniLM or bge reranker), run on the CPU.
+
+    Each (question, chunk) pair is read jointly by the model, which is more accurate than comparing
+    separate embeddings. Pairs are scored in batches spread over a few threads; onnxruntime releases
+    the GIL, so the batches run in parallel. The model directory holds model.onnx and tokenizer.json.
+    Needs the optional onnxruntime and tokenizers packages.
+    """
+
+    def __init__(self,
+                 model_dir: str,
+                 max_length: int = 512,
+                 batch_size: int = 16,
+                 parallelism: int = 2):
+        """
+        Args:
+            model_dir: Directory containing model.onnx and tokenizer.json
+            max_length: Maximum number of tokens per pair; chunks are truncated to fit (default: 512)
+            batch_size: Number of pairs scored in one model call (default: 16)
+            parallelism: Number of batches scored at once; the CPUs are split between them (default: 2)
+        """
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The cross-encoder reranker needs onnxruntime and tokenizers: "
+                              "pip install onnxruntime tokenizers") from e
+
+        self.name = f"cross-encoder:{os.path.basename(os.path.normpath(model_dir))}"
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // parallelism)
+        self.session = onnxruntime.InferenceSession(os.path.join(model_dir, "model.onnx"), options,
+                                                    providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self._executor = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="reranker")
+
+    def _score_batch(self, query: str, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        logits = self.session.run(None, {name: value for name, value in inputs.items() if name in self._input_names})[0]
+        # One relevance logit per pair, or (not relevant, relevant) logits for two-class heads
+        logits = np.asarray(logits, dtype=np.float32).reshape(len(texts), -1)
+        return logits[:, -1] - logits[:, 0] if logits.shape[1] == 2 else logits[:, 0]
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        return np.concatenate(list(self._executor.map(lambda batch: self._score_batch(query, batch), batches)))
+
+
+def get_cross_encoder(model_dir: str, **kwargs) -> CrossEncoderReranker:
+    """
+    Return the process-wide cross-encoder for a model directory, loading the model on first use.
+
+    Args:
+        model_dir: Directory containing model.onnx and tokenizer.json
+        **kwargs: Further CrossEncoderReranker arguments, used when the model is first loaded
+
+    Returns:
+        The shared CrossEncoderReranker
+    """
+    with _lock:
+        if model_dir not in _cross_encoders:
+            _cross_encoders[model_dir] = CrossEncoderReranker(model_dir, **kwargs)
+        return _cross_encoders[model_dir]
@@ -0,0 +1,416 @@
+import os
+import json
+import asyncio
+import argparse
+import metrics
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from ingestion import ingest, load_ingested_index
+from embedding import get_embedding_async, embedding_model_name
+from embedding_cache import EmbeddingCache
+from answer_cache import AnswerCache
+from chunk_store import ChunkStore
+from lexical_index import BM25Index
+from openai_clients import POOL_LIMITS, get_client
+from reranking import ScoredChunk
+from query_handler import (hybrid_query_rag_async, rerank_query_rag_async, generate_answer_async,
+                           generate_answer_stream_async)
+from main import (PDF_PATTERN, JSON_PATH, FILTER_PATH, INDEX_STORE_DIR, EMBEDDING_CACHE_PATH, EMBEDDING_MODEL,
+                  CHUNK_MAX_TOKENS, INDEX_METRIC, INDEX_TYPE, INDEX_QUANTIZATION, INDEX_SHARD_SIZE, RETRIEVAL_K,
+                  EMBEDDING_TIMEOUT, MAX_CONTEXT_TOKENS, RERANK_CANDIDATES, get_embedding_clients, get_reranker)
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8000
+SERVICE_WORKERS = 2
+MAX_CONCURRENT_REQUESTS = 32
+MAX_QUEUED_REQUESTS = 64
+MAX_REQUEST_BYTES = 64 * 1024
+MAX_K = 50
+ANSWER_CACHE_SIZE = 1000
+ANSWER_CACHE_TTL = 24 * 3600
+ANSWER_CACHE_THRESHOLD = 0.95
+METRICS_ENABLED = True
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class RequestError(Exception):
+    """A client error reported to the caller with an HTTP status code."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def chunk_payload(chunks: Any, chunk_id: int, scored: Optional[ScoredChunk] = None) -> Dict[str, Any]:
+    """
+    Describe a retrieved chunk for a JSON response.
+
+    Args:
+        chunks: The ChunkStore (or plain mapping) the chunk belongs to
+        chunk_id: The chunk's vector ID
+        scored: The chunk's reranking result, if it was reranked
+
+    Returns:
+        A dictionary with the chunk id and text, plus its source, page and every source sharing it
+        when the chunks come from a ChunkStore, and its score, FAISS distance and BM25 score when reranked
+    """
+    payload = {"id": int(chunk_id), "text": chunks[chunk_id]}
+    if scored is not None:
+        payload.update(score=scored.score, distance=scored.distance, lexical_score=scored.lexical_score)
+    if isinstance(chunks, ChunkStore):
+        metadata = chunks.metadata(chunk_id)
+        payload.update(source=metadata.source, page=metadata.page, sources=chunks.sources(chunk_id))
+    return payload
+
+
+class RetrievalService:
+    """
+    ASGI application answering questions from the persisted index.
+
+    Each worker process memory-maps the index and chunk store last saved by ingest. Index storage
+    is mapped with IO_FLAG_MMAP_IFC (IVF inverted lists with IO_FLAG_MMAP), so N workers share
+    one copy of the vectors and texts in the page cache; with faiss < 1.11 flat and HNSW vectors
+    are read into each worker's memory. The BM25 index and answer cache are built per worker. Requests beyond max_concurrency wait in a bounded queue and are rejected with 503
+    once it is full.
+
+    Routes:
+        GET /health/live: 200 while the process is up
+        GET /health/ready: 200 with the index version once the index is loaded, 503 before
+        POST /retrieve: {"question", "k"?, "lexical_only"?} -> {"chunks", "index_version"}, with reranking scores
+        POST /answer: {"question", "k"?, "stream"?} -> the answer, streamed as JSON lines by default
+        GET /metrics: Prometheus metrics of this worker
+    """
+
+    def __init__(self,
+                 max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                 max_queued: int = MAX_QUEUED_REQUESTS,
+                 use_answer_cache: bool = True):
+        """
+        Args:
+            max_concurrency: Maximum number of requests handled at once by this worker (default: MAX_CONCURRENT_REQUESTS)
+            max_queued: Maximum number of requests waiting for a slot before new ones get 503 (default: MAX_QUEUED_REQUESTS)
+            use_answer_cache: Whether to serve repeated or near-identical questions from a per-worker AnswerCache
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.answer_cache = AnswerCache(max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL,
+                                        similarity_threshold=ANSWER_CACHE_THRESHOLD) if use_answer_cache else None
+
+        self.index = None
+        self.chunks = None
+        self.bm25 = None
+        self.reranker = None
+        self.index_version: Optional[str] = None
+        self.error: Optional[str] = None
+
+        self.client: Optional[AsyncOpenAI] = None
+        self.embedding_client = None
+        self.async_embedding_client = None
+        self.embedding_cache: Optional[EmbeddingCache] = None
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = 0
+        self._startup_task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    async def startup(self,
+                      client: Optional[AsyncOpenAI] = None,
+                      embedding_client: Any = None,
+                      async_embedding_client: Any = None) -> None:
+        """
+        Create this worker's clients and load the index off the event loop.
+
+        Args:
+            client: AsyncOpenAI client used for answers; a pooled one bound to this loop by default
+            embedding_client: Client whose name selects the index, as given to ingest (default: per EMBEDDING_BACKEND)
+            async_embedding_client: Client used to embed questions (default: per EMBEDDING_BACKEND)
+        """
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if METRICS_ENABLED and not metrics.is_enabled():
+            metrics.enable(log_traces=False)
+
+        # Each worker owns its async client, so its connection pool stays bound to this loop
+        self.client = client or AsyncOpenAI(http_client=DefaultAsyncHttpxClient(limits=POOL_LIMITS))
+        if embedding_client is None or async_embedding_client is None:
+            embedding_client, async_embedding_client = get_embedding_clients(get_client(), self.client)
+        self.embedding_client = embedding_client
+        self.async_embedding_client = async_embedding_client
+        self.embedding_cache = EmbeddingCache(db_path=EMBEDDING_CACHE_PATH)
+
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error loading index in worker {os.getpid()}: {self.error}")
+
+    def load(self) -> None:
+        """Memory-map the saved index and chunk store and build the BM25 index and reranker over them."""
+        loaded = load_ingested_index(self.embedding_client, store_dir=INDEX_STORE_DIR, model=EMBEDDING_MODEL,
+                                     max_tokens=CHUNK_MAX_TOKENS, metric=INDEX_METRIC, index_type=INDEX_TYPE,
+                                     quantization=INDEX_QUANTIZATION, shard_size=INDEX_SHARD_SIZE)
+        if loaded is None:
+            raise RuntimeError(f"No index found in {INDEX_STORE_DIR}; run ingestion before starting the workers")
+        index, chunks, index_version = loaded
+        bm25 = BM25Index(chunks)
+        reranker = get_reranker(bm25)
+        if self.answer_cache is not None:
+            self.answer_cache.set_index_version(index_version)
+        self.index_version = index_version
+        self.index, self.chunks, self.bm25, self.reranker = index, chunks, bm25, reranker
+        self.error = None
+
+    async def shutdown(self) -> None:
+        """Close this worker's clients."""
+        if self._startup_task is not None and not self._startup_task.done():
+            self._startup_task.cancel()
+        if self.client is not None:
+            await self.client.close()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+
+    async def __call__(self, scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Load in the background so liveness is answered while the index is mapped
+                self._startup_task = asyncio.create_task(self.startup())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+        method, path = scope["method"], scope["path"]
+        if path == "/health/live":
+            await _send_json(send, 200, {"status": "ok", "pid": os.getpid()})
+        elif path == "/health/ready":
+            await self._send_readiness(send)
+        elif path == "/metrics":
+            await _send(send, 200, metrics.render_prometheus().encode("utf-8"),
+                        "text/plain; version=0.0.4; charset=utf-8")
+        elif path in ("/retrieve", "/answer"):
+            if method != "POST":
+                await _send_json(send, 405, {"error": "Use POST"})
+            else:
+                await self._admit(path, receive, send)
+        else:
+            await _send_json(send, 404, {"error": f"Unknown path {path}"})
+
+    async def _send_readiness(self, send: Send) -> None:
+        if not self.ready:
+            status = "error" if self.error else "loading"
+            await _send_json(send, 503, {"status": status, "error": self.error, "pid": os.getpid()},
+                             headers=[(b"retry-after", b"5")])
+            return
+        await _send_json(send, 200, {"status": "ready", "pid": os.getpid(), "index_version": self.index_version,
+                                     "vectors": int(self.index.ntotal), "in_flight": self._pending})
+
+    async def _admit(self, path: str, receive: Receive, send: Send) -> None:
+        route = path.strip("/")
+        if not self.ready:
+            metrics.increment("service_requests", route=route, result="not_ready")
+            await _send_json(send, 503, {"error": "Index not loaded yet"}, headers=[(b"retry-after", b"5")])
+            return
+        if self._pending >= self.max_concurrency + self.max_queued:
+            metrics.increment("service_requests", route=route, result="rejected")
+            await _send_json(send, 503, {"error": "Too many requests"}, headers=[(b"retry-after", b"1")])
+            return
+
+        self._pending += 1
+        try:
+            try:
+                request = _parse_request(await _read_body(receive))
+            except RequestError as e:
+                metrics.increment("service_requests", route=route, result="invalid")
+                await _send_json(send, e.status, {"error": str(e)})
+                return
+            async with self._semaphore:
+                with metrics.trace(route, pid=os.getpid()):
+                    if route == "retrieve":
+                        await self._retrieve(request, send)
+                    else:
+                        await self._answer(request, send)
+            metrics.increment("service_requests", route=route, result="ok")
+        finally:
+            self._pending -= 1
+
+    async def _search(self, question: str, k: int, lexical_only: bool = False) -> List[Dict[str, Any]]:
+        if self.reranker is not None:
+            ranked = await rerank_query_rag_async(question, self.index, self.chunks, self.bm25, self.reranker, k=k,
+                                                  client=self.async_embedding_client, cache=self.embedding_cache,
+                                                  candidates=RERANK_CANDIDATES, embedding_timeout=EMBEDDING_TIMEOUT,
+                                                  lexical_only=lexical_only)
+            return [chunk_payload(self.chunks, chunk.chunk_id, chunk) for chunk in ranked]
+        chunk_ids = await hybrid_query_rag_async(question, self.index, self.chunks, self.bm25, k=k,
+                                                 client=self.async_embedding_client, cache=self.embedding_cache,
+                                                 embedding_timeout=EMBEDDING_TIMEOUT, lexical_only=lexical_only,
+                                                 return_ids=True)
+        return [chunk_payload(self.chunks, chunk_id) for chunk_id in chunk_ids]
+
+    async def _retrieve(self, request: Dict[str, Any], send: Send) -> None:
+        chunks = await self._search(request["question"], request["k"], request["lexical_only"])
+        await _send_json(send, 200, {"index_version": self.index_version, "chunks": chunks})
+
+    def _embed_blocking(self, question: str) -> Any:
+        # Called by the answer cache from a worker thread; the embedding itself runs on the serving loop
+        return asyncio.run_coroutine_threadsafe(
+            get_embedding_async(question, client=self.async_embedding_client, model=EMBEDDING_MODEL,
+                                cache=self.embedding_cache, max_retries=0), self._loop).result(EMBEDDING_TIMEOUT)
+
+    async def _lookup_answer(self, question: str) -> Any:
+        if self.answer_cache is None:
+            return None
+        try:
+            cached = await asyncio.to_thread(self.answer_cache.lookup, question, self._embed_blocking)
+        except Exception as e:
+            print(f"Error looking up answer cache: {e!r}")
+            return None
+        metrics.increment("cache_requests", cache="answer", result="miss" if cached is None else "hit")
+        return cached
+
+    def _store_answer(self, question: str, answer: str, context_chunks: List[str]) -> None:
+        if self.answer_cache is None:
+            return
+        model = embedding_model_name(self.async_embedding_client, EMBEDDING_MODEL)
+        self.answer_cache.store(question, answer, context_chunks,
+                                embedding=self.embedding_cache.get(question, model))
+
+    async def _answer(self, request: Dict[str, Any], send: Send) -> None:
+        question = request["question"]
+        cached = await self._lookup_answer(question)
+        if cached is not None:
+            chunks = [{"text": chunk} for chunk in cached.context_chunks]
+        else:
+            chunks = await self._search(question, request["k"])
+        context_chunks = [chunk["text"] for chunk in chunks]
+        header = {"index_version": self.index_version, "cached": cached is not None, "chunks": chunks}
+
+        usage: Dict[str, int] = {}
+        if not request["stream"]:
+            if cached is not None:
+                answer = cached.answer
+            else:
+                answer = await generate_answer_async(question, context_chunks, client=self.client,
+                                                     max_context_tokens=MAX_CONTEXT_TOKENS, usage=usage)
+                self._store_answer(question, answer, context_chunks)
+            await _send_json(send, 200, {**header, "answer": answer, "usage": usage})
+            return
+
+        # One JSON object per line: the retrieved chunks, then answer deltas as generated, then the usage
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/x-ndjson; charset=utf-8")]})
+        await _send_line(send, header)
+        if cached is not None:
+            await _send_line(send, {"delta": cached.answer})
+        else:
+            pieces = []
+            try:
+                async for piece in generate_answer_stream_async(question, context_chunks, client=self.client,
+                                                                max_context_tokens=MAX_CONTEXT_TOKENS, usage=usage):
+                    pieces.append(piece)
+                    await _send_line(send, {"delta": piece})
+            except Exception as e:
+                # Headers are already sent; report the failure in the stream itself
+                print(f"Error generating answer: {e!r}")
+                await _send_line(send, {"error": str(e)})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            self._store_answer(question, "".join(pieces), context_chunks)
+        await _send_line(send, {"usage": usage})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def _read_body(receive: Receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise RequestError(400, "Client disconnected")
+        body += message.get("body", b"")
+        if len(body) > MAX_REQUEST_BYTES:
+            raise RequestError(413, "Request body too large")
+        if not message.get("more_body", False):
+            return body
+
+
+def _parse_request(body: bytes) -> Dict[str, Any]:
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise RequestError(400, "Request body must be JSON")
+    if not isinstance(payload, dict):
+        raise RequestError(400, "Request body must be a JSON object")
+
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise RequestError(400, "A non-empty question is required")
+    k = payload.get("k", RETRIEVAL_K)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+        raise RequestError(400, f"k must be an integer between 1 and {MAX_K}")
+    return {"question": question, "k": k, "lexical_only": bool(payload.get("lexical_only", False)),
+            "stream": bool(payload.get("stream", True))}
+
+
+async def _send(send: Send, status: int, body: bytes, content_type: str,
+                headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode("latin-1")),
+                            (b"content-length", str(len(body)).encode("latin-1"))] + (headers or [])})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send: Send, status: int, payload: Dict[str, Any],
+                     headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    await _send(send, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                "application/json", headers)
+
+
+async def _send_line(send: Send, payload: Dict[str, Any]) -> None:
+    await send({"type": "http.response.body", "body": (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"),
+                "more_body": True})
+
+
+# Module-level application for ASGI servers, e.g. `uvicorn retrieval_service:app --workers 4`
+app = RetrievalService()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve retrieval and answers from the shared on-disk index")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Worker processes sharing the index")
+    parser.add_argument("--skip-ingest", action="store_true", help="Serve the saved index without updating it")
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("The retrieval service needs an ASGI server: pip install uvicorn")
+        raise SystemExit(1)
+
+    if not args.skip_ingest:
+        # Bring the index up to date once, before any worker starts; workers only memory-map it
+        embedding_client, _ = get_embedding_clients(get_client(), None)
+        _, chunks, stats = ingest(embedding_client, pdf_pattern=PDF_PATTERN, json_path=JSON_PATH,
+                                  filter_path=FILTER_PATH, store_dir=INDEX_STORE_DIR, model=EMBEDDING_MODEL,
+                                  max_tokens=CHUNK_MAX_TOKENS, metric=INDEX_METRIC, index_type=INDEX_TYPE,
+                                  quantization=INDEX_QUANTIZATION, shard_size=INDEX_SHARD_SIZE,
+                                  cache=EmbeddingCache(db_path=EMBEDDING_CACHE_PATH), show_progress=True)
+        print(f"Index {stats['index_version'][:12]}: {len(chunks)} chunks")
+
+    uvicorn.run("retrieval_service:app", host=args.host, port=args.port, workers=args.workers,
+                app_dir=os.path.dirname(os.path.abspath(__file__)), lifespan="on")
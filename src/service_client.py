@@ -0,0 +1,78 @@
+import json
+import httpx
+from typing import Any, Dict, Iterator, List, Optional
+
+# Same pool sizing as openai_clients, kept here so a thin client never imports the OpenAI SDK
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+
+
+class RetrievalServiceClient:
+    """
+    Synchronous client of the retrieval service (src/retrieval_service.py).
+
+    One instance keeps a pooled keep-alive connection to the service and is safe to share
+    between threads, e.g. every Streamlit session.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        """
+        Args:
+            base_url: Address of the service, e.g. http://127.0.0.1:8000
+            timeout: Seconds to wait for each response or stream event (default: 120)
+        """
+        self.base_url = base_url
+        self._http = httpx.Client(base_url=base_url, timeout=httpx.Timeout(timeout, connect=5.0), limits=POOL_LIMITS)
+
+    def ready(self) -> Optional[Dict[str, Any]]:
+        """
+        Ask the service whether its index is loaded.
+
+        Returns:
+            The readiness report (index_version, vectors, ...) or None if the service is unreachable or still loading
+        """
+        try:
+            response = self._http.get("/health/ready")
+        except httpx.HTTPError as e:
+            print(f"Error reaching retrieval service at {self.base_url}: {str(e)}")
+            return None
+        return response.json() if response.status_code == 200 else None
+
+    def retrieve(self, question: str, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Retrieve the chunks most relevant to a question.
+
+        Args:
+            question: The user's question
+            k: Number of chunks to retrieve (default: 5)
+
+        Returns:
+            A list of {"id", "text", "source", "page", "sources"} dictionaries
+        """
+        response = self._http.post("/retrieve", json={"question": question, "k": k})
+        response.raise_for_status()
+        return response.json()["chunks"]
+
+    def stream_answer(self, question: str, k: int = 5) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a question, streaming the events sent by the service.
+
+        Args:
+            question: The user's question
+            k: Number of chunks to retrieve (default: 5)
+
+        Yields:
+            First {"chunks", "cached", "index_version"}, then {"delta"} pieces of the answer, and finally
+            {"usage"} or, if generation failed, {"error"}
+
+        Raises:
+            httpx.HTTPError: If the service is unreachable or rejects the request (e.g. 503 when overloaded)
+        """
+        with self._http.stream("POST", "/answer", json={"question": question, "k": k, "stream": True}) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def close(self) -> None:
+        """Close the connection pool."""
+        self._http.close()
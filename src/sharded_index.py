@@ -0,0 +1,268 @@
+import os
+import json
+import shutil
+import threading
+import multiprocessing
+import faiss
+import numpy as np
+import metrics
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Any, Dict, Iterable, Literal, Optional, Sequence, Tuple
+from vector_index import IndexType, Quantization, build_index, write_index, read_index
+
+SHARDS_MANIFEST = "shards.json"
+
+_search_executor: Optional[ThreadPoolExecutor] = None
+_search_executor_lock = threading.Lock()
+
+
+def _shard_name(position: int) -> str:
+    return f"shard-{position:05d}.faiss"
+
+
+def _get_search_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor searching shards, shared by every ShardedIndex, creating it on first use."""
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="shard-search")
+        return _search_executor
+
+
+def _init_build_worker(threads: int) -> None:
+    # Split the CPUs between the worker processes instead of letting each OpenMP pool take all of them
+    faiss.omp_set_num_threads(threads)
+
+
+def _build_shard(vectors_path: str,
+                 ids_path: str,
+                 index_path: str,
+                 metric: Literal["l2", "cosine"],
+                 index_type: IndexType,
+                 quantization: Quantization) -> int:
+    # Runs in a worker process: read one embedding shard from disk, index it and write the index next to it
+    embeddings = np.load(vectors_path)
+    ids = np.load(ids_path)
+    index = build_index(embeddings, metric=metric, ids=ids, index_type=index_type, quantization=quantization)
+    write_index(index, index_path)
+    os.remove(vectors_path)
+    os.remove(ids_path)
+    return int(index.ntotal)
+
+
+class ShardedIndex:
+    """
+    Several ID-mapped FAISS indexes searched as one.
+
+    Every shard holds a disjoint set of vector IDs. A search is sent to every shard from a
+    thread pool shared by all sharded indexes (FAISS releases the GIL) and the per-shard top-k
+    lists are merged into one top-k. The class offers the parts of the FAISS index interface this project uses (d,
+    ntotal, metric_type, search, add_with_ids, remove_ids), so it can stand in for a single
+    index everywhere, including query_handler and the index artifact.
+    """
+
+    def __init__(self,
+                 shards: List[Any],
+                 shard_size: int,
+                 metric: Literal["l2", "cosine"] = "l2",
+                 index_type: IndexType = "flat",
+                 quantization: Quantization = None,
+                 max_threads: Optional[int] = None):
+        """
+        Args:
+            shards: The ID-mapped FAISS indexes, all of the same dimension and metric
+            shard_size: Maximum number of vectors per shard; added vectors that do not fit open a new shard
+            metric: Distance metric of the shards, "l2" or "cosine" (default: l2)
+            index_type: FAISS index type new shards are built with (default: flat)
+            quantization: Optional "float16" or "int8" storage of new shards (default: None)
+            max_threads: Threads searching this index's shards at once (default: number of shards, at most the
+                CPU count)
+        """
+        if not shards:
+            raise ValueError("A sharded index needs at least one shard")
+        self.shards = shards
+        self.shard_size = shard_size
+        self.metric = metric
+        self.index_type = index_type
+        self.quantization = quantization
+        self.d = shards[0].d
+        self.metric_type = shards[0].metric_type
+        self.max_threads = max_threads
+
+    @property
+    def ntotal(self) -> int:
+        return sum(int(shard.ntotal) for shard in self.shards)
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search every shard and merge the results.
+
+        Args:
+            queries: A (num_queries, d) float32 array
+            k: Number of results per query
+
+        Returns:
+            (distances, ids) arrays of shape (num_queries, k), best first, padded with -1 IDs like FAISS
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        with metrics.span("query.shards", shards=len(self.shards)):
+            if len(self.shards) == 1:
+                return self.shards[0].search(queries, k)
+            # At most max_threads tasks, each searching every max_threads-th shard
+            groups = min(len(self.shards), self.max_threads or os.cpu_count() or 1)
+            tasks = [self.shards[start::groups] for start in range(groups)]
+            results = [result for group in _get_search_executor().map(
+                lambda shards: [shard.search(queries, k) for shard in shards], tasks) for result in group]
+
+        heap = faiss.ResultHeap(len(queries), k, keep_max=self.metric_type == faiss.METRIC_INNER_PRODUCT)
+        for distances, ids in results:
+            heap.add_result(np.ascontiguousarray(distances, dtype=np.float32), np.ascontiguousarray(ids, dtype=np.int64))
+        heap.finalize()
+        return heap.D, heap.I
+
+    def add_with_ids(self, embeddings: np.ndarray, ids: np.ndarray) -> None:
+        """
+        Add vectors to the last shard while it has room, then to new shards of at most shard_size vectors.
+
+        Args:
+            embeddings: A (num_vectors, d) float32 array, already normalized for cosine shards
+            ids: The int64 IDs of the vectors
+        """
+        start = 0
+        room = self.shard_size - int(self.shards[-1].ntotal)
+        if room > 0:
+            self.shards[-1].add_with_ids(embeddings[:room], ids[:room])
+            start = room
+        for offset in range(start, len(embeddings), self.shard_size):
+            self.shards.append(build_index(embeddings[offset:offset + self.shard_size], metric=self.metric,
+                                           ids=ids[offset:offset + self.shard_size], index_type=self.index_type,
+                                           quantization=self.quantization))
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        """
+        Remove vectors by ID from whichever shards hold them.
+
+        Args:
+            ids: The int64 IDs to remove
+
+        Returns:
+            The number of vectors removed
+        """
+        return sum(int(shard.remove_ids(ids)) for shard in self.shards)
+
+    def save(self, directory: str) -> None:
+        """
+        Write every shard and a small manifest to a directory.
+
+        Args:
+            directory: The directory to create
+        """
+        os.makedirs(directory, exist_ok=True)
+        for position, shard in enumerate(self.shards):
+            write_index(shard, os.path.join(directory, _shard_name(position)))
+        with open(os.path.join(directory, SHARDS_MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"shards": len(self.shards), "shard_size": self.shard_size, "metric": self.metric,
+                       "index_type": self.index_type, "quantization": self.quantization}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, read_only: bool = False) -> "ShardedIndex":
+        """
+        Load a sharded index written by save.
+
+        Args:
+            directory: The directory holding the shards
+            mmap: Whether to memory-map the shards instead of reading them into memory (default: True).
+                Memory-mapped shards cannot be modified
+            read_only: Whether the shards are only searched, letting processes share their mapped vectors
+
+        Returns:
+            The ShardedIndex
+        """
+        with open(os.path.join(directory, SHARDS_MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        shards = [read_index(os.path.join(directory, _shard_name(position)), mmap=mmap, read_only=read_only)
+                  for position in range(manifest["shards"])]
+        return cls(shards, manifest["shard_size"], metric=manifest["metric"], index_type=manifest["index_type"],
+                   quantization=manifest["quantization"])
+
+
+def build_sharded_index(batches: Iterable[Tuple[np.ndarray, Sequence[int]]],
+                        work_dir: str,
+                        shard_size: int = 1_000_000,
+                        metric: Literal["l2", "cosine"] = "l2",
+                        index_type: IndexType = "flat",
+                        quantization: Quantization = None,
+                        max_workers: Optional[int] = None) -> ShardedIndex:
+    """
+    Build a ShardedIndex from a stream of embedding batches without holding all embeddings in memory.
+
+    Incoming vectors are buffered until shard_size of them are collected, then written to work_dir
+    as one .npy shard, and a worker process builds that shard's FAISS index while later batches
+    are still being embedded. Memory stays bounded by one shard of embeddings plus the finished
+    shard indexes.
+
+    Args:
+        batches: (embeddings, ids) pairs, e.g. the results of embedding a corpus slice by slice
+        work_dir: Scratch directory for the embedding shards and the shard indexes; removed afterwards
+        shard_size: Number of vectors per shard (default: 1,000,000)
+        metric: Distance metric, "l2" or "cosine" (default: l2)
+        index_type: FAISS index type of every shard (default: flat)
+        quantization: Optional "float16" or "int8" storage of the vectors (default: None)
+        max_workers: Number of shards built at once (default: half the CPUs, at least 1)
+
+    Returns:
+        The ShardedIndex, read into memory so it can be updated
+    """
+    max_workers = max_workers or max(1, (os.cpu_count() or 1) // 2)
+    os.makedirs(work_dir, exist_ok=True)
+    # Spawned workers start clean, without a copy of the parent's FAISS/OpenMP state or memory
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_build_worker,
+                               initargs=(max(1, (os.cpu_count() or 1) // max_workers),))
+    futures = []
+    buffered: List[np.ndarray] = []
+    buffered_ids: List[np.ndarray] = []
+    count = 0
+
+    def flush() -> None:
+        position = len(futures)
+        vectors_path = os.path.join(work_dir, f"vectors-{position:05d}.npy")
+        ids_path = os.path.join(work_dir, f"ids-{position:05d}.npy")
+        np.save(vectors_path, np.concatenate(buffered).astype(np.float32, copy=False))
+        np.save(ids_path, np.concatenate(buffered_ids).astype(np.int64, copy=False))
+        futures.append(pool.submit(_build_shard, vectors_path, ids_path, os.path.join(work_dir, _shard_name(position)),
+                                   metric, index_type, quantization))
+        buffered.clear()
+        buffered_ids.clear()
+
+    try:
+        with metrics.span("build_sharded_index", shard_size=shard_size, index_type=index_type):
+            for embeddings, ids in batches:
+                embeddings = np.asarray(embeddings, dtype=np.float32)
+                ids = np.asarray(ids, dtype=np.int64)
+                offset = 0
+                while offset < len(embeddings):
+                    take = min(shard_size - count, len(embeddings) - offset)
+                    buffered.append(embeddings[offset:offset + take])
+                    buffered_ids.append(ids[offset:offset + take])
+                    count += take
+                    offset += take
+                    if count == shard_size:
+                        flush()
+                        count = 0
+            if count:
+                flush()
+            if not futures:
+                raise ValueError("Cannot build index with empty embeddings list")
+            for future in futures:
+                future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    shards = [read_index(os.path.join(work_dir, _shard_name(position)), mmap=False) for position in range(len(futures))]
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return ShardedIndex(shards, shard_size, metric=metric, index_type=index_type, quantization=quantization)
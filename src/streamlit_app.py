@@ -1,18 +1,47 @@
+import time
+
+# Momentul în care pornește scriptul, pentru măsurarea pornirii la rece
+_SCRIPT_START = time.perf_counter()
+
 import os
 import glob
-import asyncio
+import httpx
 import streamlit as st
-from openai import OpenAI
+import metrics
 from dotenv import load_dotenv
-from vector_index import build_index
-from text_chunking import chunk_text
-from embedding import get_embeddings_concurrent
-from query_handler import query_rag, generate_answer
-from data_extraction import extract_text_from_pdf, extract_from_json
+from background_loader import BackgroundLoader
+from service_client import RetrievalServiceClient
 
 # Load environment variables
 load_dotenv(override=True)
 
+FILTER_PATH = "filter_text/text_1.txt"
+INDEX_STORE_DIR = "index_store"
+EMBEDDING_CACHE_PATH = "index_store/embedding_cache.sqlite"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_BACKEND = "openai"  # "local" embeds with the ONNX model in LOCAL_EMBEDDING_MODEL_DIR
+LOCAL_EMBEDDING_MODEL_DIR = "models/embedding-int8"
+CHUNK_MAX_TOKENS = 1000
+INDEX_METRIC = "l2"
+INDEX_TYPE = "flat"
+INDEX_QUANTIZATION = None
+INDEX_SHARD_SIZE = None  # e.g. 1_000_000 to build the index in shards, in parallel processes
+RETRIEVAL_K = 3  # chunks passed to the answer
+RERANKER = "lexical"  # "cross-encoder" scores with the ONNX model in CROSS_ENCODER_MODEL_DIR; None keeps the fused ranking
+CROSS_ENCODER_MODEL_DIR = "models/reranker-int8"
+RERANK_CANDIDATES = 50
+EMBEDDING_TIMEOUT = 3.0
+MAX_CONTEXT_TOKENS = 3000
+METRICS_ENABLED = True
+METRICS_PORT = 9464
+ANSWER_CACHE_SIZE = 1000
+ANSWER_CACHE_TTL = 24 * 3600
+ANSWER_CACHE_THRESHOLD = 0.95
+RETRIEVAL_SERVICE_URL = None  # e.g. "http://127.0.0.1:8000" to query src/retrieval_service.py instead of a local index
+PDF_PATTERN = "data/*.pdf"
+JSON_PATH = "json_data/eon_data.json"
+STATUS_REFRESH_SECONDS = 1.0
+
 # Set page configuration
 st.set_page_config(
     page_title="E.ON - Ioana Doi",
@@ -68,73 +97,229 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+@st.cache_resource
+def start_metrics():
+    # Instrumentarea și endpoint-ul Prometheus pornesc o singură dată per proces
+    metrics.enable()
+    try:
+        return metrics.start_metrics_server(METRICS_PORT)
+    except OSError as e:
+        print(f"Error starting metrics server on port {METRICS_PORT}: {e}")
+        return None
+
+
+if METRICS_ENABLED:
+    start_metrics()
+
+
+def load_clients(loader):
+    # Clienții OpenAI, partajați de toate sesiunile. Embeddings: API-ul OpenAI sau modelul local,
+    # comun indexului și întrebărilor
+    from openai_clients import get_client, get_async_client
+    from embedding_cache import EmbeddingCache
+
+    client = get_client()
+    async_client = get_async_client()
+    if EMBEDDING_BACKEND == "local":
+        from local_embedding import get_local_backend
+        embedding_client = get_local_backend(LOCAL_EMBEDDING_MODEL_DIR)
+        async_embedding_client = embedding_client.async_client()
+    else:
+        embedding_client, async_embedding_client = client, async_client
+    return {"client": client, "async_client": async_client, "embedding_client": embedding_client,
+            "async_embedding_client": async_embedding_client,
+            "embedding_cache": EmbeddingCache(db_path=EMBEDDING_CACHE_PATH)}
+
+
+def load_tokenizer(loader):
+    # Encodarea tiktoken cu care se numără tokenii contextului, încărcată înainte de prima întrebare
+    from text_chunking import get_encoding
+    return get_encoding("gpt-4o")
+
+
+def build_index_resources(index, chunks, index_version, stats=None):
+    from lexical_index import BM25Index
+    from reranking import LexicalReranker, get_cross_encoder
+
+    # Indexul lexical BM25 se construiește peste aceleași fragmente ca indexul vectorial
+    bm25 = BM25Index(chunks)
+
+    # Reordonează candidații regăsiți, ca doar cele mai bune fragmente să ajungă în prompt
+    if RERANKER == "cross-encoder":
+        reranker = get_cross_encoder(CROSS_ENCODER_MODEL_DIR)
+    elif RERANKER == "lexical":
+        reranker = LexicalReranker(bm25)
+    else:
+        reranker = None
+    return {"index": index, "chunks": chunks, "bm25": bm25, "reranker": reranker,
+            "index_version": index_version, "stats": stats}
+
+
+def load_saved_index(loader):
+    # Indexul salvat se mapează în memorie fără a citi sursele, ca întrebările să primească răspuns imediat
+    from ingestion import load_ingested_index
+
+    saved = load_ingested_index(
+        loader.get("clients")["embedding_client"],
+        store_dir=INDEX_STORE_DIR,
+        model=EMBEDDING_MODEL,
+        max_tokens=CHUNK_MAX_TOKENS,
+        metric=INDEX_METRIC,
+        index_type=INDEX_TYPE,
+        quantization=INDEX_QUANTIZATION,
+        shard_size=INDEX_SHARD_SIZE
+    )
+    return build_index_resources(*saved) if saved is not None else None
+
+
+def update_index(loader):
+    # Procesează doar sursele noi sau modificate; indexul servit se înlocuiește doar dacă s-a schimbat
+    from ingestion import ingest
+
+    clients = loader.get("clients")
+    index, chunks, stats = ingest(
+        clients["embedding_client"],
+        pdf_pattern=PDF_PATTERN,
+        json_path=JSON_PATH,
+        filter_path=FILTER_PATH,
+        store_dir=INDEX_STORE_DIR,
+        model=EMBEDDING_MODEL,
+        max_tokens=CHUNK_MAX_TOKENS,
+        metric=INDEX_METRIC,
+        index_type=INDEX_TYPE,
+        quantization=INDEX_QUANTIZATION,
+        shard_size=INDEX_SHARD_SIZE,
+        cache=clients["embedding_cache"],
+        show_progress=True
+    )
+    current = loader.peek("index")
+    if current is not None and current["index_version"] == stats["index_version"]:
+        return {**current, "stats": stats}
+    return build_index_resources(index, chunks, stats["index_version"], stats)
 
 
 @st.cache_resource
-def load_index_and_chunks(pdf_pattern="data/*.pdf", json_path="json_data/eon_data.json"):
-    with st.spinner("Se procesează documentele și se construiește indexul de cunoștințe..."):
-        # Extrage text din fișierele PDF
-        pdf_files = glob.glob(pdf_pattern)
-        if not pdf_files:
-            st.warning(
-                f"Nu s-au găsit fișiere PDF care să corespundă modelului: {pdf_pattern}")
-            pdf_text = ""
-        else:
-            pdf_text = extract_text_from_pdf(pdf_pattern)
-            st.success(f"✅ S-au extras {len(pdf_text):,} caractere din PDF-uri")
+def start_loader():
+    # Clienții, tokenizer-ul și indexul se încarcă o singură dată per proces, în fundal, cât timp se
+    # afișează interfața; fiecare întrebare așteaptă doar resursele de care are nevoie
+    return BackgroundLoader([
+        ("clients", load_clients),
+        ("index", load_saved_index),
+        ("tokenizer", load_tokenizer),
+        ("index", update_index),
+    ], started_at=_SCRIPT_START).start()
 
-        # Extrage text din fișierele JSON
-        try:
-            json_data = extract_from_json(json_path, include_urls=False)
 
-            # Filtrează zgomotul din textul JSON pe baza conținutului din text_1.txt
-            filtered_json_data = {}
+@st.cache_resource
+def get_startup_report():
+    # Durata primei afișări a paginii, măsurată o singură dată per proces
+    return {"script_start": _SCRIPT_START, "first_render_s": None}
 
-            # Obține liniile din text_1.txt pentru a le folosi ca filtru
-            with open("filter_text/text_1.txt", "r", encoding="utf-8") as f:
-                filter_lines = set(line.strip() for line in f if line.strip())
 
-            # Filtrează liniile de zgomot din datele JSON
-            for key, value in json_data.items():
-                lines = value.split("\n")
-                filtered_lines = [line for line in lines if line.strip(
-                ) and line.strip() not in filter_lines]
-                filtered_json_data[key] = "\n".join(filtered_lines)
+# Pornește încărcarea în fundal cât mai devreme, înaintea restului interfeței
+loader = start_loader() if RETRIEVAL_SERVICE_URL is None else None
 
-            json_text = "\n\n".join(filtered_json_data.values())
-            st.success(
-                f"✅ S-au extras {len(json_text):,} caractere din JSON (după filtrare)")
-        except Exception as e:
-            st.error(f"Eroare la extragerea datelor JSON: {e}")
-            json_text = ""
+def format_citation(source, page=None, sources=()):
+    # Eticheta sursei unui fragment: pagina web sau fișierul PDF și pagina
+    if source.startswith("url:"):
+        url = source[len("url:"):]
+        label = f"[{url}]({url})"
+    else:
+        label = os.path.basename(source)
+        if page is not None:
+            label = f"{label}, pagina {page}"
+    # Fragmentele aproape identice sunt păstrate o singură dată; numărăm și celelalte surse
+    others = [other for other in sources if other != source]
+    return f"{label} (și în încă {len(others)} surse)" if others else label
 
-        # Combină textul din ambele surse
-        combined_text = pdf_text + "\n\n" + json_text
 
-        # Împarte textul combinat în fragmente
-        chunks = chunk_text(combined_text)
-        st.success(f"✅ S-au creat {len(chunks):,} fragmente de text")
+@st.cache_resource
+def get_answer_cache():
+    # Răspunsuri partajate de toate sesiunile pentru întrebările repetate sau foarte asemănătoare
+    from answer_cache import AnswerCache
+    return AnswerCache(max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL,
+                       similarity_threshold=ANSWER_CACHE_THRESHOLD)
 
-        # Generează embeddings pentru fiecare fragment folosind procesarea concurentă
-        async def get_embeddings():
-            return await get_embeddings_concurrent(
-                texts=chunks,
-                client=client,
-                batch_size=200,
-                show_progress=True
-            )
 
-        # Rulează funcția asincronă pentru a obține embeddings
-        embeddings = asyncio.run(get_embeddings())
-        st.success(f"✅ S-au generat {len(embeddings):,} embeddings")
+@st.cache_resource
+def get_service_client():
+    # O singură conexiune către serviciul de regăsire, partajată de toate sesiunile
+    return RetrievalServiceClient(RETRIEVAL_SERVICE_URL)
 
-        # Construiește indexul vectorial FAISS
-        index = build_index(embeddings, metric='l2')
-        st.success("✅ Indexul vectorial a fost construit cu succes")
 
-        return index, chunks
+def wait_for(loader, name, message):
+    # Așteaptă doar resursa de care are nevoie întrebarea; dacă încărcarea ei a eșuat, oprește cererea
+    try:
+        if loader.ready(name):
+            return loader.get(name)
+        with metrics.span("query.wait_startup", resource=name), st.spinner(message):
+            return loader.get(name)
+    except RuntimeError as e:
+        print(f"Error waiting for {name}: {e!r}")
+        st.error("Asistentul nu a putut porni complet. Încearcă din nou mai târziu.")
+        st.stop()
+
+
+def render_status(loader, polling):
+    # Ce resurse sunt gata; se reîmprospătează singur până se încarcă toate
+    for name, label in (("clients", "Clienți OpenAI"), ("index", "Index de cunoștințe"), ("tokenizer", "Tokenizer")):
+        if loader.ready(name):
+            st.markdown(f"✅ {label}")
+        elif loader.error(name) is not None:
+            st.markdown(f"❌ {label}: încărcarea a eșuat")
+        else:
+            st.markdown(f"⏳ {label}...")
+
+    resources = loader.peek("index")
+    stats = resources["stats"] if resources is not None else None
+    if resources is not None:
+        st.caption(f"{len(resources['chunks']):,} fragmente în index" +
+                   (" · se verifică sursele noi..." if stats is None and not loader.finished else ""))
+    if stats is not None and (stats["added"] or stats["changed"] or stats["removed"]):
+        st.success(f"✅ Surse: {stats['added']} noi, {stats['changed']} modificate, {stats['removed']} șterse")
+        st.success(f"✅ Fragmente: {stats['chunks_added']:,} adăugate, {stats['chunks_removed']:,} eliminate, "
+                   f"{len(resources['chunks']):,} în index")
+    if not glob.glob(PDF_PATTERN):
+        st.warning(f"Nu s-au găsit fișiere PDF care să corespundă modelului: {PDF_PATTERN}")
+
+    if loader.finished:
+        report = get_startup_report()
+        timings = [f"{label} {seconds:.1f}s" for label, seconds in loader.timings]
+        if report["first_render_s"] is not None:
+            timings.insert(0, f"pagină {report['first_render_s']:.1f}s")
+        st.caption("Pornire: " + " · ".join(timings))
+        if polling:
+            # Totul e încărcat: o ultimă reafișare a paginii oprește reîmprospătarea
+            st.rerun()
+
+
+def render_answer(answer, relevant_chunks, citations, scores, usage):
+    # Reserve the answer area above the sources, which are shown as soon as retrieval finishes
+    answer_container = st.container()
+
+    # Show relevant chunks if requested
+    with st.expander("Vizualizează informațiile sursă"):
+        st.markdown("### Context Relevant")
+        for i, (chunk, citation, score) in enumerate(zip(relevant_chunks, citations, scores)):
+            st.markdown(f"**Sursa {i+1}**" + (f" — {citation}" if citation else "") +
+                        (f" · relevanță {score:.2f}" if score is not None else ""))
+            st.markdown(
+                f'<div class="source-container">{chunk}</div>', unsafe_allow_html=True)
+
+    # Stream the answer from GPT into the reserved area as tokens arrive, or show the kept one
+    with answer_container:
+        st.markdown('<div class="answer-container">', unsafe_allow_html=True)
+        st.markdown("### Răspuns")
+        if isinstance(answer, str):
+            st.markdown(answer)
+        else:
+            answer = st.write_stream(answer)
+        if usage:
+            st.caption(
+                f"Context: {usage.get('context_tokens', 0):,} tokeni din {usage.get('chunks_used', 0)} fragmente · "
+                f"prompt: {usage.get('prompt_tokens', 0):,} · răspuns: {usage.get('completion_tokens', 0):,}")
+        st.markdown('</div>', unsafe_allow_html=True)
+    return answer
 
 
 # Sidebar with information
@@ -160,14 +345,26 @@ with st.sidebar:
     st.markdown("- Conținutul site-ului web E.ON")
     st.markdown("- Documentația in format PDF")
 
+    if loader is not None:
+        st.markdown("---")
+        st.markdown("### Stare")
+        st.fragment(render_status, run_every=None if loader.finished else STATUS_REFRESH_SECONDS)(
+            loader, not loader.finished)
+
 # Main content
 st.markdown('<h1 class="main-header">E.ON -- Ioana Doi!</h1>',
             unsafe_allow_html=True)
 st.markdown('<p class="sub-header">Ghidul tău virtual pentru serviciile și produsele E.ON</p>',
             unsafe_allow_html=True)
 
-# Load (or cache) the index and text chunks.
-index, chunks = load_index_and_chunks()
+# The index loads in the background; queries wait for it only when they need it
+if RETRIEVAL_SERVICE_URL is None:
+    service = None
+    answer_cache = get_answer_cache()
+else:
+    service = get_service_client()
+    if service.ready() is None:
+        st.warning(f"Serviciul de regăsire ({RETRIEVAL_SERVICE_URL}) nu este încă pregătit.")
 
 # Create two columns for the query input
 col1, col2 = st.columns([4, 1])
@@ -181,24 +378,130 @@ with col2:
 if user_query and (search_button or 'last_query' not in st.session_state or st.session_state.last_query != user_query):
     st.session_state.last_query = user_query
 
-    with st.spinner("Caut cel mai bun răspuns..."):
-        # Retrieve relevant text chunks based on the query
-        relevant_chunks = query_rag(
-            user_query, index, chunks, k=7, client=client)
+    with metrics.trace("query", cached=False) as trace:
+        usage = {}
+        with st.spinner("Caut cel mai bun răspuns..."):
+            if service is not None:
+                # Serviciul caută fragmentele și trimite răspunsul pe măsură ce este generat
+                try:
+                    with metrics.span("service.retrieve"):
+                        events = service.stream_answer(user_query, k=RETRIEVAL_K)
+                        header = next(events)
+                except (httpx.HTTPError, StopIteration) as e:
+                    print(f"Error querying retrieval service: {e!r}")
+                    st.error("Serviciul de regăsire nu a putut răspunde. Încearcă din nou în câteva momente.")
+                    st.stop()
+                cached = header["cached"]
+                relevant_chunks = [chunk["text"] for chunk in header["chunks"]]
+                citations = [format_citation(chunk["source"], chunk["page"], chunk["sources"])
+                             if "source" in chunk else None for chunk in header["chunks"]]
+                scores = [chunk.get("score") for chunk in header["chunks"]]
 
-        # Generate an answer using GPT
-        answer = generate_answer(user_query, relevant_chunks, client=client)
+                def answer_stream():
+                    for event in events:
+                        if "delta" in event:
+                            yield event["delta"]
+                        elif "usage" in event:
+                            usage.update(event["usage"])
+                        elif "error" in event:
+                            st.error("Generarea răspunsului a eșuat.")
+            else:
+                from openai_clients import run_async, iterate_async
+                from embedding import get_embedding_async
+                from query_handler import hybrid_query_rag_async, rerank_query_rag_async, generate_answer_stream_async
 
-        # Display the answer
-        st.markdown('<div class="answer-container">', unsafe_allow_html=True)
-        st.markdown("### Răspuns")
-        st.markdown(answer)
-        st.markdown('</div>', unsafe_allow_html=True)
+                def embed_question(question):
+                    clients = wait_for(loader, "clients", "Se pregătesc clienții OpenAI...")
+                    return run_async(get_embedding_async(question, client=clients["async_embedding_client"],
+                                                         cache=clients["embedding_cache"]))
+
+                # Serve repeated or near-identical questions from the answer cache, which needs no index
+                resources = loader.peek("index")
+                if resources is not None:
+                    answer_cache.set_index_version(resources["index_version"])
+                with metrics.span("answer_cache.lookup"):
+                    cached_answer = answer_cache.lookup(user_query, embed=embed_question)
+                metrics.increment("cache_requests", cache="answer", result="miss" if cached_answer is None else "hit")
+                cached = cached_answer is not None
+
+                if cached:
+                    relevant_chunks = cached_answer.context_chunks
+                    citations = [None] * len(relevant_chunks)
+                    scores = [None] * len(relevant_chunks)
+
+                    def answer_stream():
+                        yield cached_answer.answer
+                else:
+                    clients = wait_for(loader, "clients", "Se pregătesc clienții OpenAI...")
+                    resources = wait_for(loader, "index", "Se încarcă indexul de cunoștințe...")
+                    answer_cache.set_index_version(resources["index_version"])
+                    chunks = resources["chunks"]
+
+                    # Retrieve relevant text chunks with BM25 + vector search, or BM25 alone if embedding is slow
+                    if resources["reranker"] is not None:
+                        ranked = run_async(rerank_query_rag_async(
+                            user_query, resources["index"], chunks, resources["bm25"], resources["reranker"],
+                            k=RETRIEVAL_K, client=clients["async_embedding_client"], cache=clients["embedding_cache"],
+                            candidates=RERANK_CANDIDATES, embedding_timeout=EMBEDDING_TIMEOUT))
+                        relevant_ids = [chunk.chunk_id for chunk in ranked]
+                        scores = [chunk.score for chunk in ranked]
+                    else:
+                        relevant_ids = run_async(hybrid_query_rag_async(
+                            user_query, resources["index"], chunks, resources["bm25"], k=RETRIEVAL_K,
+                            client=clients["async_embedding_client"], cache=clients["embedding_cache"],
+                            embedding_timeout=EMBEDDING_TIMEOUT, return_ids=True))
+                        scores = [None] * len(relevant_ids)
+                    relevant_chunks = [chunks[chunk_id] for chunk_id in relevant_ids]
+                    citations = [format_citation(chunks.metadata(chunk_id).source, chunks.metadata(chunk_id).page,
+                                                 chunks.sources(chunk_id))
+                                 for chunk_id in relevant_ids]
+
+                    # The context is trimmed by token count, so generation needs the tokenizer
+                    wait_for(loader, "tokenizer", "Se încarcă tokenizer-ul...")
+
+                    def answer_stream():
+                        return iterate_async(generate_answer_stream_async(
+                            user_query, relevant_chunks, client=clients["async_client"],
+                            max_context_tokens=MAX_CONTEXT_TOKENS, usage=usage))
+
+            if cached and trace is not None:
+                trace.attributes["cached"] = True
+
+        answer = render_answer(answer_stream(), relevant_chunks, citations, scores, usage)
+        if service is None and not cached:
+            from embedding import embedding_model_name
+            answer_cache.store(
+                user_query, answer, relevant_chunks,
+                embedding=clients["embedding_cache"].get(
+                    user_query, embedding_model_name(clients["embedding_client"], EMBEDDING_MODEL)))
+
+        # Keep the answer, so reruns that skip the query (e.g. once startup finishes) still show it
+        st.session_state.last_answer = {"question": user_query, "answer": answer, "chunks": relevant_chunks, "citations": citations,
+                                        "scores": scores, "usage": usage}
+
+    if trace is not None:
+        st.session_state.last_trace = trace.record
+elif user_query and st.session_state.get("last_answer", {}).get("question") == user_query:
+    last_answer = st.session_state.last_answer
+    render_answer(last_answer["answer"], last_answer["chunks"], last_answer["citations"], last_answer["scores"],
+                  last_answer["usage"])
+
+# Breakdown of this session's last request: where the time and tokens went
+if METRICS_ENABLED and st.session_state.get("last_trace") is not None:
+    with st.expander("Diagnostic: ultima cerere"):
+        last = st.session_state.last_trace
+        st.markdown(f"**Durată totală:** {last['duration_ms']:,.0f} ms · "
+                    f"**din cache:** {'da' if last.get('cached') else 'nu'}")
+        st.dataframe(
+            [{"etapă": stage["stage"], "start ms": round(stage["offset_ms"], 1),
+              "durată ms": round(stage["duration_ms"], 1),
+              **{key: value for key, value in stage.items() if key not in ("stage", "offset_ms", "duration_ms")}}
+             for stage in last["spans"]],
+            use_container_width=True)
+        st.json(last["counters"])
 
-        # Show relevant chunks if requested
-        with st.expander("Vizualizează informațiile sursă"):
-            st.markdown("### Context Relevant")
-            for i, chunk in enumerate(relevant_chunks):
-                st.markdown(f"**Sursa {i+1}**")
-                st.markdown(
-                    f'<div class="source-container">{chunk}</div>', unsafe_allow_html=True)
+# Cold start: how long the first complete run of the script took in this process
+startup_report = get_startup_report()
+if startup_report["first_render_s"] is None:
+    startup_report["first_render_s"] = time.perf_counter() - startup_report["script_start"]
+    print(f"Startup: first page rendered in {startup_report['first_render_s']:.2f}s")
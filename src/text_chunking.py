@@ -1,5 +1,115 @@
-import tiktoken
-from typing import List, Optional
+import re
+import bisect
+import functools
+import metrics
+from typing import List, Optional, Tuple, Iterable, Iterator, NamedTuple
+
+
+class ChunkRecord(NamedTuple):
+    """A chunk of a source with the page it starts on and its character span in the source text."""
+    source: str
+    page: Optional[int]
+    start: int
+    end: int
+    text: str
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4o") -> "tiktoken.Encoding":
+    """
+    Return the tiktoken encoding for a model, loading it only once per process.
+
+    Args:
+        model: The model whose tokenizer should be used (default: gpt-4o)
+
+    Returns:
+        The cached tiktoken encoding
+    """
+    # Imported on first use, so apps serving a saved index start without loading tiktoken
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+
+@functools.lru_cache(maxsize=32)
+def _sentence_pattern(delimiters: tuple) -> "re.Pattern":
+    # A sentence is a run of non-delimiters ending in a delimiter, or the trailing remainder
+    delimiter_class = "".join(re.escape(d) for d in delimiters)
+    return re.compile(f"[^{delimiter_class}]*[{delimiter_class}]|[^{delimiter_class}]+")
+
+
+def split_sentences(text: str, delimiters: Optional[List[str]] = None) -> List[str]:
+    """
+    Split text into sentences, each ending with (and including) a delimiter character.
+
+    Args:
+        text: The text to split
+        delimiters: Optional list of delimiter characters to split on. If None, defaults to ['.', '!', '?', '\\n']
+
+    Returns:
+        A list of sentences whose concatenation is the original text
+    """
+    if not text:
+        return []
+
+    if delimiters is None:
+        delimiters = ['.', '!', '?', '\n']
+
+    # Only single characters can ever match a delimiter
+    single_chars = tuple(sorted(set(d for d in delimiters if len(d) == 1)))
+    if not single_chars:
+        return [text]
+
+    return _sentence_pattern(single_chars).findall(text)
+
+
+def chunk_spans(text: str, max_tokens: int = 1000, delimiters: Optional[List[str]] = None) -> List[Tuple[int, int]]:
+    """
+    Compute chunk boundaries as character offsets into text.
+
+    Args:
+        text: The text to be chunked
+        max_tokens: The target maximum number of tokens per chunk (default: 1000)
+        delimiters: Optional list of delimiter characters to split on. If None, defaults to ['.', '!', '?', '\n']
+
+    Returns:
+        A list of (start, end) offsets such that text[start:end] is a chunk
+    """
+    if not text:
+        return []
+
+    with metrics.span("chunk_text", characters=len(text)) as span:
+        # Use tiktoken for accurate tokenization
+        encoding = get_encoding("gpt-4o")  # Using OpenAI's encoding
+
+        # Split text into sentences first
+        sentences = split_sentences(text, delimiters)
+
+        # Tokenize every sentence in one batched pass
+        sentence_token_counts = [len(tokens) for tokens in encoding.encode_batch(sentences)]
+
+        # Group sentences into chunks based on token count, tracking character offsets
+        # so each chunk is a single slice of the original text
+        spans = []
+        chunk_start = 0
+        chunk_end = 0
+        current_chunk_tokens = 0
+
+        for sentence, sentence_tokens in zip(sentences, sentence_token_counts):
+            if current_chunk_tokens + sentence_tokens <= max_tokens:
+                current_chunk_tokens += sentence_tokens
+            else:
+                if chunk_end > chunk_start:
+                    spans.append((chunk_start, chunk_end))
+                chunk_start = chunk_end
+                current_chunk_tokens = sentence_tokens
+            chunk_end += len(sentence)
+
+        # Add the last chunk if it's not empty
+        if chunk_end > chunk_start:
+            spans.append((chunk_start, chunk_end))
+        span.set(tokens=sum(sentence_token_counts), chunks=len(spans))
+
+    return spans
 
 
 def chunk_text(text: str, max_tokens: int = 1000, delimiters: Optional[List[str]] = None) -> List[str]:
@@ -14,48 +124,48 @@ def chunk_text(text: str, max_tokens: int = 1000, delimiters: Optional[List[str]
     Returns:
         A list of text chunks, each ending with a natural delimiter and approximately max_tokens in length
     """
-    if not text:
-        return []
+    return [text[start:end] for start, end in chunk_spans(text, max_tokens, delimiters)]
 
-    if delimiters is None:
-        delimiters = ['.', '!', '?', '\n']
 
-    # Use tiktoken for accurate tokenization
-    encoding = tiktoken.encoding_for_model("gpt-4o")  # Using OpenAI's encoding
-
-    chunks = []
-    current_chunk = ""
-    current_chunk_tokens = 0
-
-    # Split text into sentences first
-    sentences = []
-    current_sentence = ""
-
-    for char in text:
-        current_sentence += char
-        if char in delimiters:
-            sentences.append(current_sentence)
-            current_sentence = ""
-
-    # Add the last sentence if it's not empty
-    if current_sentence:
-        sentences.append(current_sentence)
-
-    # Group sentences into chunks based on token count
-    for sentence in sentences:
-        sentence_tokens = len(encoding.encode(sentence))
-
-        if current_chunk_tokens + sentence_tokens <= max_tokens:
-            current_chunk += sentence
-            current_chunk_tokens += sentence_tokens
-        else:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = sentence
-            current_chunk_tokens = sentence_tokens
-
-    # Add the last chunk if it's not empty
-    if current_chunk:
-        chunks.append(current_chunk)
-
-    return chunks
+def chunk_records(records: Iterable[Tuple[str, Optional[int], str]],
+                  max_tokens: int = 1000,
+                  delimiters: Optional[List[str]] = None) -> Iterator[ChunkRecord]:
+    """
+    Chunk a stream of (source, page, text) records source by source, as they arrive.
+
+    Consecutive records from the same source are joined with blank lines and chunked together,
+    so chunks never span two sources. Each source is chunked as soon as the next one starts.
+
+    Args:
+        records: An iterable of (source, page, text) records, grouped by source
+        max_tokens: The target maximum number of tokens per chunk (default: 1000)
+        delimiters: Optional list of delimiter characters to split on. If None, defaults to ['.', '!', '?', '\n']
+
+    Yields:
+        ChunkRecord tuples, where page is the page the chunk starts on and start/end are character
+        offsets into the source's pages joined with blank lines
+    """
+    def flush(source, pages, page_offsets, page_numbers):
+        text = "".join(pages)
+        for start, end in chunk_spans(text, max_tokens, delimiters):
+            page = page_numbers[bisect.bisect_right(page_offsets, start) - 1]
+            yield ChunkRecord(source, page, start, end, text[start:end])
+
+    current_source = None
+    pages: List[str] = []
+    page_offsets: List[int] = []
+    page_numbers: List[Optional[int]] = []
+    offset = 0
+
+    for source, page, text in records:
+        if source != current_source and pages:
+            yield from flush(current_source, pages, page_offsets, page_numbers)
+            pages, page_offsets, page_numbers, offset = [], [], [], 0
+        current_source = source
+        page_offsets.append(offset)
+        page_numbers.append(page)
+        pages.append(text + "\n\n")
+        offset += len(text) + 2
+
+    if pages:
+        yield from flush(current_source, pages, page_offsets, page_numbers)
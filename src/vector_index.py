@@ -1,31 +1,730 @@
+import os
+import json
+import time
+import shutil
+import math
+import hashlib
+import weakref
 import faiss
 import numpy as np
-from typing import List, Any, Literal
+import metrics
+from chunk_store import ChunkStore
+from typing import List, Any, Literal, Dict, Optional, Tuple, Union, Sequence
 
+# Bump whenever the on-disk layout of a saved index artifact changes
+ARTIFACT_VERSION = 1
 
-def build_index(embeddings: List[List[float]], metric: Literal["l2", "cosine"] = "l2") -> Any:
+# Names the current version directory of an artifact; replaced atomically by save_index_artifact
+CURRENT_FILE = "CURRENT"
+VERSION_PREFIX = "version-"
+
+
+IndexType = Literal["flat", "ivf", "hnsw", "ivfpq", "opq"]
+
+Quantization = Optional[Literal["float16", "int8"]]
+
+# FAISS scalar quantizer names of the supported storage precisions
+_SCALAR_QUANTIZERS = {"float16": "SQfp16", "int8": "SQ8"}
+
+# Index types built on inverted lists, which store vector IDs themselves
+IVF_INDEX_TYPES = ("ivf", "ivfpq", "opq")
+
+
+class RescoringIndex:
+    """
+    A scalar-quantized FAISS index whose top candidates are re-ranked against float32 vectors kept outside it.
+
+    FAISS's RFlat refinement stores a full-precision copy of every vector inside the index, which
+    made an int8 index larger than a plain float32 one. Here the FAISS index holds only the
+    quantized codes, and the float32 vectors live in a separate array, memory-mapped from a .npy
+    file once saved. A query scans the codes for rescore_factor * k candidates and reads only
+    those candidates' rows to compute exact distances, so resident memory is the codes plus the
+    pages of recently rescored vectors. Offers the parts of the FAISS index interface this
+    project uses (d, ntotal, metric_type, search, add_with_ids, remove_ids).
+    """
+
+    def __init__(self, index: Any, vectors: np.ndarray, ids: np.ndarray, rescore_factor: int = 4):
+        """
+        Args:
+            index: The quantized FAISS index, ID-mapped or returning positions as labels
+            vectors: The (ntotal, d) float32 vectors, normalized for cosine indexes, in the order of ids
+            ids: The sorted int64 labels the index returns for the vectors
+            rescore_factor: Quantized candidates re-ranked at full precision per result (default: 4)
+        """
+        self.index = index
+        self.vectors = vectors
+        self.ids = ids
+        self.rescore_factor = rescore_factor
+        self.d = index.d
+        self.metric_type = index.metric_type
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.index.ntotal)
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the quantized codes, then re-rank the candidates by their exact distance.
+
+        Args:
+            queries: A (num_queries, d) float32 array
+            k: Number of results per query
+
+        Returns:
+            (distances, ids) arrays of shape (num_queries, k), best first, padded with -1 IDs like FAISS
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        _, labels = self.index.search(queries, max(k, self.rescore_factor * k))
+        inner_product = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        distances = np.full((len(queries), k), -np.inf if inner_product else np.inf, dtype=np.float32)
+        found = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, (query, candidates) in enumerate(zip(queries, labels)):
+            candidates = candidates[candidates >= 0]
+            if not len(candidates):
+                continue
+            # One query at a time, so only its candidates' rows are read from the memory-mapped vectors
+            vectors = self.vectors[np.searchsorted(self.ids, candidates)]
+            if inner_product:
+                exact = vectors @ query
+                order = np.argsort(-exact, kind="stable")[:k]
+            else:
+                exact = ((vectors - query) ** 2).sum(axis=1)
+                order = np.argsort(exact, kind="stable")[:k]
+            distances[row, :len(order)] = exact[order]
+            found[row, :len(order)] = candidates[order]
+        return distances, found
+
+    def add_with_ids(self, embeddings: np.ndarray, ids: np.ndarray) -> None:
+        """
+        Add vectors to the codes and to the rescoring vectors.
+
+        Args:
+            embeddings: A (num_vectors, d) float32 array, already normalized for cosine indexes
+            ids: The int64 IDs of the vectors
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        self.index.add_with_ids(embeddings, ids)
+        all_ids = np.concatenate([self.ids, ids])
+        vectors = np.concatenate([self.vectors, embeddings.astype(np.float32, copy=False)])
+        if len(self.ids) and len(ids) and ids.min() <= self.ids[-1] or np.any(np.diff(ids) < 0):
+            order = np.argsort(all_ids, kind="stable")
+            all_ids, vectors = all_ids[order], vectors[order]
+        self.ids, self.vectors = all_ids, vectors
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        """
+        Remove vectors by ID from the codes and the rescoring vectors.
+
+        Args:
+            ids: The int64 IDs to remove
+
+        Returns:
+            The number of vectors removed
+        """
+        removed = int(self.index.remove_ids(ids))
+        keep = ~np.isin(self.ids, ids)
+        self.ids, self.vectors = self.ids[keep], self.vectors[keep]
+        return removed
+
+
+def _rescoring_paths(path: str) -> Tuple[str, str, str]:
+    base = os.path.splitext(path)[0]
+    return f"{base}.vectors.npy", f"{base}.vector_ids.npy", f"{base}.rescore.json"
+
+
+def write_index(index: Any, path: str) -> None:
+    """
+    Write a FAISS index or RescoringIndex to a file.
+
+    A RescoringIndex writes its quantized codes to path and its float32 vectors, their IDs and
+    its rescore factor to .vectors.npy, .vector_ids.npy and .rescore.json files next to it.
+
+    Args:
+        index: The index to write
+        path: The FAISS index file, e.g. index.faiss
+    """
+    if not isinstance(index, RescoringIndex):
+        faiss.write_index(index, path)
+        return
+    faiss.write_index(index.index, path)
+    vectors_path, ids_path, params_path = _rescoring_paths(path)
+    np.save(vectors_path, np.ascontiguousarray(index.vectors, dtype=np.float32))
+    np.save(ids_path, np.ascontiguousarray(index.ids, dtype=np.int64))
+    with open(params_path, "w", encoding="utf-8") as f:
+        json.dump({"rescore_factor": index.rescore_factor}, f)
+
+
+# Indexes read with a memory-mapping flag; add_to_index and remove_from_index refuse to modify them
+_memory_mapped = weakref.WeakSet()
+
+
+def _mmap_flags(read_only: bool) -> List[int]:
+    """
+    FAISS read flags to try, in order, when memory-mapping an index.
+
+    IO_FLAG_MMAP alone maps only IVF inverted lists; flat, scalar-quantized and HNSW storage is
+    still copied into private memory, once per process. IO_FLAG_MMAP_IFC (faiss >= 1.11) maps
+    that storage straight from the file, so processes reading the same index share its pages,
+    but modifying such an index crashes the process, so it is only used for read_only loads.
+    """
+    flags = [faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY]
+    if read_only and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        flags.insert(0, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return flags
+
+
+def is_memory_mapped(index: Any) -> bool:
+    """Return whether an index, or any shard of a ShardedIndex, was read with memory-mapping."""
+    return any(shard in _memory_mapped for shard in getattr(index, "shards", [index]))
+
+
+def read_index(path: str, mmap: bool = True, read_only: bool = False) -> Any:
+    """
+    Read an index written by write_index.
+
+    Args:
+        path: The FAISS index file
+        mmap: Whether to memory-map the index (and rescoring vectors) instead of reading them into memory
+            (default: True). Memory-mapped indexes cannot be modified
+        read_only: With mmap, also map flat, scalar-quantized and HNSW storage with IO_FLAG_MMAP_IFC,
+            so serving processes share one copy of the vectors (default: False)
+
+    Returns:
+        The FAISS index or RescoringIndex
+    """
+    index = None
+    if mmap:
+        for flags in _mmap_flags(read_only):
+            try:
+                index = faiss.read_index(path, flags)
+                _memory_mapped.add(index)
+                break
+            except RuntimeError:
+                # IVF inverted lists reject IO_FLAG_MMAP_IFC; try the next flags
+                continue
+    if index is None:
+        # Not every index type supports memory-mapping; fall back to a regular read
+        index = faiss.read_index(path)
+
+    vectors_path, ids_path, params_path = _rescoring_paths(path)
+    if not os.path.exists(params_path):
+        return index
+    with open(params_path, "r", encoding="utf-8") as f:
+        params = json.load(f)
+    mode = "r" if mmap else None
+    rescoring = RescoringIndex(index, np.load(vectors_path, mmap_mode=mode), np.load(ids_path, mmap_mode=mode),
+                               rescore_factor=params["rescore_factor"])
+    if mmap:
+        _memory_mapped.add(rescoring)
+    return rescoring
+
+
+def _default_nlist(num_vectors: int) -> int:
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def index_factory_string(index_type: IndexType,
+                         num_vectors: int,
+                         dimension: int,
+                         nlist: Optional[int] = None,
+                         pq_m: Optional[int] = None,
+                         hnsw_m: int = 32,
+                         quantization: Quantization = None) -> str:
+    """
+    Translate an index type and its parameters into a FAISS index_factory description.
+
+    Args:
+        index_type: One of "flat", "ivf", "hnsw", "ivfpq" or "opq" (OPQ rotation + IVF-PQ)
+        num_vectors: Number of vectors the index is built from, used to size nlist and the PQ codebooks
+        dimension: Dimension of the vectors
+        nlist: Number of IVF cells. Defaults to about 4 * sqrt(num_vectors), capped so every cell gets
+            at least 39 training points
+        pq_m: Number of PQ sub-quantizers. Defaults to the largest divisor of dimension that is at most 64
+            and leaves at least 8 dimensions per sub-quantizer
+        hnsw_m: Number of neighbours per node in the HNSW graph (default: 32)
+        quantization: Optional scalar quantization of the stored vectors for "flat", "ivf" and "hnsw":
+            "float16" (2 bytes per dimension) or "int8" (1 byte per dimension)
+
+    Returns:
+        A string accepted by faiss.index_factory
+    """
+    if quantization is not None:
+        if index_type in ("ivfpq", "opq"):
+            raise ValueError("quantization applies to flat, ivf and hnsw indexes; PQ indexes are already compressed")
+        codec = _SCALAR_QUANTIZERS[quantization]
+        if index_type == "flat":
+            return codec
+        if index_type == "hnsw":
+            return f"HNSW{hnsw_m}_{codec}"
+        return f"IVF{nlist or _default_nlist(num_vectors)},{codec}"
+
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+
+    if nlist is None:
+        nlist = _default_nlist(num_vectors)
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+
+    if pq_m is None:
+        pq_m = max(m for m in range(1, max(1, min(64, dimension // 8)) + 1) if dimension % m == 0)
+    # 8-bit codebooks want about 39 * 256 training points; use fewer bits on small corpora
+    nbits = min(8, max(1, int(math.log2(max(2, num_vectors // 39)))))
+    if index_type == "ivfpq":
+        return f"IVF{nlist},PQ{pq_m}x{nbits}"
+    if index_type == "opq":
+        return f"OPQ{pq_m},IVF{nlist},PQ{pq_m}x{nbits}"
+
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def _as_float32(embeddings: Union[np.ndarray, List[List[float]]]) -> np.ndarray:
+    # Contiguous float32 arrays, as returned by get_embeddings_concurrent, are used without copying
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def build_index(embeddings: Union[np.ndarray, List[List[float]]],
+                metric: Literal["l2", "cosine"] = "l2",
+                ids: Optional[Sequence[int]] = None,
+                index_type: IndexType = "flat",
+                nlist: Optional[int] = None,
+                pq_m: Optional[int] = None,
+                hnsw_m: int = 32,
+                train_sample_size: int = 50000,
+                quantization: Quantization = None,
+                rescore_factor: Optional[int] = 4) -> Any:
     """
     Build a vector index from a list of embedding vectors using FAISS.
 
     Args:
-        embeddings: A list of embedding vectors, where each vector is a list of floats
+        embeddings: A (num_vectors, dimension) float32 array, used without copying, or a list of vectors.
+            For the cosine metric the rows of a float32 array are L2-normalized in place
         metric: Distance metric to use, either "l2" or "cosine"
+        ids: Optional stable integer IDs for the vectors. When given, search returns these IDs and
+            vectors can later be removed by ID. IVF-based indexes store them in their inverted lists;
+            other indexes are wrapped in an IndexIDMap2
+        index_type: "flat" for exact brute-force search (default), or one of the approximate types
+            "ivf", "hnsw", "ivfpq" and "opq". HNSW indexes do not support removing vectors
+        nlist: Number of IVF cells for "ivf", "ivfpq" and "opq" (default: derived from the corpus size)
+        pq_m: Number of PQ sub-quantizers for "ivfpq" and "opq" (default: derived from the dimension)
+        hnsw_m: Number of neighbours per node for "hnsw" (default: 32)
+        train_sample_size: Maximum number of vectors sampled to train IVF/PQ/OPQ indexes (default: 50000)
+        quantization: Optional "float16" or "int8" scalar quantization of the stored vectors for "flat",
+            "ivf" and "hnsw" indexes. The index in memory is 2x (float16) or 4x (int8) smaller than float32
+        rescore_factor: With quantization, the top rescore_factor * k quantized candidates are re-ranked
+            against the float32 vectors, returning a RescoringIndex whose vectors are memory-mapped from disk
+            once saved and read only for the candidates (tune with set_search_params(k_factor=...)).
+            None keeps only the quantized codes (default: 4)
 
     Returns:
-        A FAISS index containing the embeddings for efficient similarity search
+        A FAISS index containing the embeddings for efficient similarity search, or a RescoringIndex
     """
-    if not embeddings:
+    if len(embeddings) == 0:
         raise ValueError("Cannot build index with empty embeddings list")
-        
-    embedding_dim = len(embeddings[0])
-    embeddings_np = np.array(embeddings).astype("float32")
-    
-    if metric == "l2":
-        index = faiss.IndexFlatL2(embedding_dim)
-    else:  # metric == "cosine" due to Literal type constraint
-        index = faiss.IndexFlatIP(embedding_dim)
-        # Normalize vectors for cosine similarity
+
+    with metrics.span("build_index", vectors=len(embeddings), index_type=index_type):
+        embeddings_np = _as_float32(embeddings)
+        embedding_dim = embeddings_np.shape[1]
+
+        if index_type == "flat" and quantization is None:
+            if metric == "l2":
+                index = faiss.IndexFlatL2(embedding_dim)
+            else:  # metric == "cosine" due to Literal type constraint
+                index = faiss.IndexFlatIP(embedding_dim)
+        else:
+            description = index_factory_string(index_type, len(embeddings_np), embedding_dim,
+                                               nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m, quantization=quantization)
+            faiss_metric = faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT
+            index = faiss.index_factory(embedding_dim, description, faiss_metric)
+
+        if metric == "cosine":
+            # Normalize vectors for cosine similarity
+            faiss.normalize_L2(embeddings_np)
+
+        if not index.is_trained:
+            # Train the coarse quantizer and codebooks on a reproducible sample
+            train_np = embeddings_np
+            if len(train_np) > train_sample_size:
+                rng = np.random.default_rng(0)
+                train_np = train_np[rng.choice(len(train_np), train_sample_size, replace=False)]
+            index.train(train_np)
+
+        if ids is not None:
+            if index_type not in IVF_INDEX_TYPES:
+                # IndexIDMap2 renumbers its map on removal as flat and HNSW storage compacts; IVF lists do not
+                # compact, so wrapping them would return the wrong IDs after any removal
+                index = faiss.IndexIDMap2(index)
+            labels = np.asarray(ids, dtype="int64")
+            index.add_with_ids(embeddings_np, labels)
+        else:
+            labels = np.arange(len(embeddings_np), dtype="int64")
+            index.add(embeddings_np)
+
+        if quantization is not None and rescore_factor is not None:
+            # The codes are searched; the float32 vectors, sorted by label, are only read to rescore candidates
+            order = np.argsort(labels, kind="stable")
+            return RescoringIndex(index, embeddings_np[order], labels[order], rescore_factor=rescore_factor)
+        return index
+
+
+def set_search_params(index: Any,
+                      nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None,
+                      k_factor: Optional[int] = None) -> None:
+    """
+    Tune the query-time accuracy/speed trade-off of an approximate index.
+
+    Parameters that do not apply to the index type (e.g. nprobe on an HNSW or flat index) are ignored.
+
+    Args:
+        index: A FAISS index, optionally wrapped in an ID map, or a ShardedIndex
+        nprobe: Number of IVF cells visited per query; higher is more accurate and slower
+        ef_search: Size of the HNSW candidate list per query; higher is more accurate and slower
+        k_factor: Quantized candidates re-ranked at full precision per result, for a RescoringIndex;
+            higher is more accurate and slower
+    """
+    parameter_space = faiss.ParameterSpace()
+    # A ShardedIndex applies the parameters to each of its shards
+    for shard in getattr(index, "shards", [index]):
+        if isinstance(shard, RescoringIndex):
+            if k_factor is not None:
+                shard.rescore_factor = k_factor
+            shard = shard.index
+        for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+            if value is None:
+                continue
+            try:
+                parameter_space.set_index_parameter(shard, name, value)
+            except RuntimeError:
+                pass
+
+
+def add_to_index(index: Any, embeddings: Union[np.ndarray, List[List[float]]], ids: Sequence[int]) -> None:
+    """
+    Add vectors with explicit IDs to an index created by build_index with ids.
+
+    Args:
+        index: An ID-mapped FAISS index
+        embeddings: The embedding vectors to add, as a float32 array (normalized in place for cosine
+            indexes) or a list of vectors
+        ids: The integer IDs of the new vectors, aligned with embeddings
+
+    Raises:
+        ValueError: If the index was loaded with mmap=True
+    """
+    if is_memory_mapped(index):
+        raise ValueError("Cannot add to a memory-mapped index; load it with mmap=False to modify it")
+    if len(embeddings) == 0:
+        return
+
+    embeddings_np = _as_float32(embeddings)
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        # Cosine indexes store normalized vectors
         faiss.normalize_L2(embeddings_np)
-        
-    index.add(embeddings_np)
-    return index
+    index.add_with_ids(embeddings_np, np.asarray(ids, dtype="int64"))
+
+
+def remove_from_index(index: Any, ids: Sequence[int]) -> int:
+    """
+    Remove vectors from an ID-mapped index without rebuilding it.
+
+    Args:
+        index: An ID-mapped FAISS index
+        ids: The integer IDs of the vectors to remove
+
+    Returns:
+        The number of vectors removed
+
+    Raises:
+        ValueError: If the index was loaded with mmap=True
+    """
+    if is_memory_mapped(index):
+        raise ValueError("Cannot remove from a memory-mapped index; load it with mmap=False to modify it")
+    if len(ids) == 0:
+        return 0
+    return int(index.remove_ids(np.asarray(ids, dtype="int64")))
+
+
+def _ivf_ids(index: Any) -> np.ndarray:
+    """
+    Return the IDs stored in an IVF index's inverted lists, enabling its hash table lookup for reconstruct.
+    """
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    ids = [faiss.rev_swig_ptr(invlists.get_ids(cell), invlists.list_size(cell)).copy()
+           for cell in range(invlists.nlist) if invlists.list_size(cell)]
+    if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return np.concatenate(ids) if ids else np.empty(0, dtype="int64")
+
+
+def reconstruct_vectors(index: Any, ids: Sequence[int]) -> np.ndarray:
+    """
+    Return the vectors an ID-mapped index holds for some IDs, e.g. to rebuild it without re-embedding.
+
+    A RescoringIndex returns its float32 vectors; other scalar-quantized indexes return their
+    decoded codes, which approximate the original vectors. A ShardedIndex looks in every shard.
+
+    Args:
+        index: An index built by build_index with ids, a RescoringIndex or a ShardedIndex
+        ids: The integer IDs of the vectors
+
+    Returns:
+        A (len(ids), d) float32 array, normalized for cosine indexes
+
+    Raises:
+        KeyError: If an ID is not in the index
+    """
+    ids = np.asarray(ids, dtype="int64")
+    vectors = np.empty((len(ids), index.d), dtype=np.float32)
+    found = np.zeros(len(ids), dtype=bool)
+    for shard in getattr(index, "shards", [index]):
+        rescoring = isinstance(shard, RescoringIndex)
+        if rescoring:
+            stored = shard.ids
+        elif hasattr(shard, "id_map"):
+            stored = faiss.vector_to_array(shard.id_map)
+        else:
+            stored = _ivf_ids(shard)
+        rows = np.isin(ids, stored) & ~found
+        if not rows.any():
+            continue
+        if rescoring:
+            vectors[rows] = shard.vectors[np.searchsorted(shard.ids, ids[rows])]
+        else:
+            vectors[rows] = shard.reconstruct_batch(ids[rows])
+        found |= rows
+    if not found.all():
+        raise KeyError(f"IDs not in the index: {ids[~found][:10].tolist()}")
+    return vectors
+
+
+def compute_artifact_key(source_files: List[str], params: Dict[str, Any]) -> str:
+    """
+    Compute a content hash identifying an index artifact.
+
+    Args:
+        source_files: Paths of every file the index is derived from (PDFs, JSON, filter lists)
+        params: Build parameters that change the result, e.g. chunk size, embedding model and metric
+
+    Returns:
+        A hex digest that changes whenever a source file, a parameter or the artifact version changes
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"artifact-v{ARTIFACT_VERSION}".encode("utf-8"))
+
+    for path in sorted(source_files):
+        hasher.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                hasher.update(block)
+
+    hasher.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def artifact_path(store_dir: str, key: str) -> str:
+    """
+    Return the directory holding the current version of an artifact.
+
+    Args:
+        store_dir: Root directory holding all index artifacts
+        key: The artifact key returned by compute_artifact_key
+
+    Returns:
+        store_dir/key/<version> as named by its CURRENT file, or store_dir/key itself for artifacts
+        saved before versioned directories (or when nothing is saved yet)
+    """
+    key_dir = os.path.join(store_dir, key)
+    try:
+        with open(os.path.join(key_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return os.path.join(key_dir, f.read().strip())
+    except FileNotFoundError:
+        return key_dir
+
+
+def _remove_old_versions(key_dir: str, keep_after: str) -> None:
+    # Versions are named by creation time, so anything older than keep_after is unused; a save still
+    # in progress in another process writes a newer version and is left alone
+    for name in os.listdir(key_dir):
+        if name == CURRENT_FILE or (name.startswith(VERSION_PREFIX) and name >= keep_after):
+            continue
+        path = os.path.join(key_dir, name)
+        if os.path.isdir(path):
+            # Files still mapped by a reader cannot be deleted on Windows; a later save retries
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def save_index_artifact(index: Any,
+                        chunks: Union[List[str], Dict[int, str], ChunkStore],
+                        store_dir: str,
+                        key: str,
+                        metadata: Optional[Dict[str, Any]] = None,
+                        embedding_model: Optional[str] = None,
+                        attachments: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Persist a FAISS index and its chunks as a versioned artifact under store_dir/key.
+
+    Every save writes a new version directory under store_dir/key, then atomically replaces the
+    CURRENT file naming it, so a concurrent reader sees either the previous or the new artifact,
+    never a missing or half-written one. The previous version is kept for readers still loading
+    it; older ones are deleted.
+
+    Args:
+        index: The FAISS index or ShardedIndex to save
+        chunks: The text chunks corresponding to the vectors in the index, either a list aligned with
+            the index positions, a mapping from vector ID to chunk for ID-mapped indexes, or a ChunkStore
+        store_dir: Root directory holding all index artifacts
+        key: The artifact key returned by compute_artifact_key
+        metadata: Optional extra information to record in the manifest (e.g. build parameters)
+        embedding_model: The embedding model or backend that produced the vectors, e.g.
+            "text-embedding-3-small" or "local:<model>", recorded so queries are embedded the same way
+        attachments: Optional objects with a save(directory) method, each written to the subdirectory
+            of its name (e.g. the NearDuplicateIndex of the chunks), so they are replaced together with the index
+
+    Returns:
+        The path of the saved artifact directory
+    """
+    key_dir = os.path.join(store_dir, key)
+    previous = os.path.basename(artifact_path(store_dir, key))
+    version = f"{VERSION_PREFIX}{time.time_ns():020d}-{os.getpid()}"
+    version_dir = os.path.join(key_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    if hasattr(index, "shards"):
+        # A ShardedIndex is saved as one FAISS file per shard
+        index.save(os.path.join(version_dir, "shards"))
+    else:
+        write_index(index, os.path.join(version_dir, "index.faiss"))
+
+    if isinstance(chunks, ChunkStore):
+        chunks.save(os.path.join(version_dir, "chunks"))
+    else:
+        with open(os.path.join(version_dir, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(chunks, f, ensure_ascii=False)
+
+    for name, attachment in (attachments or {}).items():
+        attachment.save(os.path.join(version_dir, name))
+
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "key": key,
+        "created_at": time.time(),
+        "num_vectors": int(index.ntotal),
+        "num_chunks": len(chunks),
+        "dimension": int(index.d),
+        "embedding_model": embedding_model,
+        "metadata": metadata or {},
+    }
+    with open(os.path.join(version_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    current_tmp = os.path.join(key_dir, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(key_dir, CURRENT_FILE))
+
+    # An artifact saved before versioned directories keeps its files until the next save
+    if previous.startswith(VERSION_PREFIX):
+        _remove_old_versions(key_dir, previous)
+    return version_dir
+
+
+def load_artifact_manifest(store_dir: str, key: str) -> Optional[Dict[str, Any]]:
+    """
+    Read the manifest of a saved index artifact without loading the index itself.
+
+    Args:
+        store_dir: Root directory holding all index artifacts
+        key: The artifact key returned by compute_artifact_key
+
+    Returns:
+        The manifest dictionary, or None if no compatible artifact is found
+    """
+    return _read_manifest(artifact_path(store_dir, key), key)
+
+
+def _read_manifest(artifact_dir: str, key: str) -> Optional[Dict[str, Any]]:
+    manifest_path = os.path.join(artifact_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        print(f"Error reading index manifest {manifest_path}: {str(e)}")
+        return None
+
+    if manifest.get("version") != ARTIFACT_VERSION or manifest.get("key") != key:
+        return None
+    return manifest
+
+
+def load_index_artifact(store_dir: str,
+                        key: str,
+                        mmap: bool = True,
+                        embedding_model: Optional[str] = None,
+                        read_only: bool = False
+                        ) -> Optional[Tuple[Any, Union[List[str], Dict[int, str], ChunkStore]]]:
+    """
+    Load a previously saved index artifact if one exists for the given key.
+
+    Args:
+        store_dir: Root directory holding all index artifacts
+        key: The artifact key returned by compute_artifact_key
+        mmap: Whether to memory-map the index file and chunk store instead of reading them into memory
+            (default: True). Memory-mapped indexes cannot be modified
+        embedding_model: The embedding model or backend queries will be embedded with. An artifact whose
+            vectors were produced by a different one is not compatible
+        read_only: Whether the index is only searched, letting processes share its mapped vectors (see read_index)
+
+    Returns:
+        A tuple of (index, chunks), or None if no compatible artifact is found
+    """
+    # Resolve the current version once, so every file comes from the same save
+    artifact_dir = artifact_path(store_dir, key)
+    manifest = _read_manifest(artifact_dir, key)
+    if manifest is None:
+        return None
+    recorded_model = manifest.get("embedding_model")
+    if embedding_model is not None and recorded_model is not None and recorded_model != embedding_model:
+        print(f"Ignoring index artifact {artifact_dir}: built with {recorded_model} embeddings, not {embedding_model}")
+        return None
+
+    try:
+        if os.path.isdir(os.path.join(artifact_dir, "shards")):
+            from sharded_index import ShardedIndex  # imported lazily: sharded_index builds on this module
+            index = ShardedIndex.load(os.path.join(artifact_dir, "shards"), mmap=mmap, read_only=read_only)
+        else:
+            index = read_index(os.path.join(artifact_dir, "index.faiss"), mmap=mmap, read_only=read_only)
+
+        store_path = os.path.join(artifact_dir, "chunks")
+        if os.path.isdir(store_path):
+            chunks = ChunkStore.load(store_path, mmap=mmap)
+        else:
+            with open(os.path.join(artifact_dir, "chunks.json"), "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            if isinstance(chunks, dict):
+                # JSON object keys are strings; restore the integer vector IDs
+                chunks = {int(chunk_id): chunk for chunk_id, chunk in chunks.items()}
+    except Exception as e:
+        print(f"Error loading index artifact {artifact_dir}: {str(e)}")
+        return None
+
+    if index.ntotal != len(chunks):
+        print(f"Ignoring index artifact {artifact_dir}: index and chunk counts differ")
+        return None
+
+    return index, chunks
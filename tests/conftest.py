@@ -0,0 +1,32 @@
+import os
+import sys
+import pytest
+
+# The modules live flat in src/ and import each other by name, as when running the apps from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+class WordEncoding:
+    """Counts whitespace-separated words as tokens, standing in for a tiktoken encoding downloaded on first use."""
+
+    def encode(self, text, **kwargs):
+        return text.split()
+
+    def encode_batch(self, texts, **kwargs):
+        return [text.split() for text in texts]
+
+
+@pytest.fixture
+def word_encoding(monkeypatch):
+    """Make chunking, context packing and token counting run offline and deterministically."""
+    import tiktoken
+    import embedding
+    import text_chunking
+    encoding = WordEncoding()
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model: encoding)
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: encoding)
+    text_chunking.get_encoding.cache_clear()
+    embedding._get_encoding.cache_clear()
+    yield encoding
+    text_chunking.get_encoding.cache_clear()
+    embedding._get_encoding.cache_clear()
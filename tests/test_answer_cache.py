@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+import pytest
+import answer_cache
+from answer_cache import AnswerCache
+
+EMBEDDINGS = {
+    "Cum plătesc factura?": [1.0, 0.0, 0.0],
+    "Unde pot plăti factura online?": [0.98, 0.2, 0.0],
+    "Care este programul de lucru?": [0.0, 1.0, 0.0],
+}
+
+
+def _embed(calls: list):
+    def embed(query: str):
+        calls.append(query)
+        return EMBEDDINGS[query]
+    return embed
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(answer_cache, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def test_exact_hit_ignores_case_diacritics_and_punctuation():
+    cache = AnswerCache()
+    cache.store("Cum plătesc factura?", "Online, în contul Myline.", ["chunk"], EMBEDDINGS["Cum plătesc factura?"])
+    calls = []
+
+    hit = cache.lookup("  cum PLATESC factura ", embed=_embed(calls))
+    assert hit == ("Online, în contul Myline.", ["chunk"], 1.0)
+    # An exact match never embeds the query
+    assert calls == []
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_semantic_hit_requires_the_similarity_threshold():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.store("Cum plătesc factura?", "Online.", ["chunk"], EMBEDDINGS["Cum plătesc factura?"])
+    calls = []
+
+    hit = cache.lookup("Unde pot plăti factura online?", embed=_embed(calls))
+    assert hit.answer == "Online."
+    assert 0.95 <= hit.similarity < 1.0
+    assert cache.lookup("Care este programul de lucru?", embed=_embed(calls)) is None
+    assert calls == ["Unde pot plăti factura online?", "Care este programul de lucru?"]
+    # Without an embedding function only exact matches are served
+    assert cache.lookup("Unde pot plăti factura online?") is None
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (0, 1, 2)
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_entries_stored_without_an_embedding_only_match_exactly():
+    cache = AnswerCache()
+    cache.store("Cum plătesc factura?", "Online.", ["chunk"])
+
+    assert cache.lookup("Unde pot plăti factura online?", embed=_embed([])) is None
+    assert cache.lookup("cum platesc factura") is not None
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = AnswerCache(ttl_seconds=60)
+    cache.store("Cum plătesc factura?", "Online.", ["chunk"], EMBEDDINGS["Cum plătesc factura?"])
+
+    clock.value += 59
+    assert cache.lookup("Cum plătesc factura?") is not None
+    clock.value += 2
+    assert cache.lookup("Cum plătesc factura?") is None
+    assert cache.lookup("Unde pot plăti factura online?", embed=_embed([])) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.store("întrebarea unu", "1", [])
+    cache.store("întrebarea doi", "2", [])
+    # Reading the first entry makes the second one the least recently used
+    assert cache.lookup("întrebarea unu").answer == "1"
+    cache.store("întrebarea trei", "3", [])
+
+    assert cache.lookup("întrebarea doi") is None
+    assert cache.lookup("întrebarea unu").answer == "1"
+    assert cache.lookup("întrebarea trei").answer == "3"
+    assert cache.stats()["entries"] == 2
+
+
+def test_changing_the_index_version_drops_every_answer():
+    cache = AnswerCache()
+    cache.set_index_version("v1")
+    cache.store("Cum plătesc factura?", "Online.", ["chunk"])
+
+    cache.set_index_version("v1")
+    assert cache.lookup("Cum plătesc factura?") is not None
+    cache.set_index_version("v2")
+    assert cache.lookup("Cum plătesc factura?") is None
+    assert cache.index_version == "v2"
@@ -0,0 +1,28 @@
+import os
+import pytest
+from boilerplate import iter_filtered_pages
+from data_extraction import iter_json_pages
+
+CRAWL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "json_data", "eon_data.json")
+
+# Product, brand and tariff lines repeated on a handful of crawled pages; they must stay retrievable
+CONTENT_LINES = ["Ariston", "Preț plafonat", "Livrare și instalare incluse", "Furnizare de Ultimă Instanță (FUI)"]
+
+# Site-wide header lines present on about half of the crawled pages
+NAVIGATION_LINES = ["Clienți business", "Clienți casnici", "Servicii și ajutor", "Scrie aici ce cauți"]
+
+
+@pytest.fixture(scope="module")
+def filtered_lines():
+    pages = iter_filtered_pages(lambda: iter_json_pages(CRAWL_PATH))
+    return {line.strip() for _, text in pages for line in text.split("\n")}
+
+
+def test_repeated_content_lines_survive(filtered_lines):
+    for line in CONTENT_LINES:
+        assert line in filtered_lines
+
+
+def test_site_wide_navigation_is_removed(filtered_lines):
+    for line in NAVIGATION_LINES:
+        assert line not in filtered_lines
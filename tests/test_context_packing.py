@@ -0,0 +1,66 @@
+import pytest
+from context_packing import pack_context
+
+HEAT_PUMP = "Pompa de căldură Vaillant încălzește locuința iarna și o răcește vara cu consum redus."
+HEAT_PUMP_SERVICE = "Pompa de căldură Vaillant necesită revizie anuală la un service autorizat din rețea."
+INVOICE = "Factura lunară poate fi plătită online din contul Myline sau la casieriile partenere."
+SCHEDULE = "Programul de lucru al centrului de relații cu clienții este de luni până vineri."
+
+
+def _words(count: int, word: str) -> str:
+    return " ".join(f"{word}{i}" for i in range(count))
+
+
+@pytest.fixture(autouse=True)
+def offline_encoding(word_encoding):
+    return word_encoding
+
+
+def test_chunks_are_taken_whole_while_they_fit():
+    chunks = [_words(10, "a"), _words(10, "b"), _words(10, "c"), _words(10, "d")]
+
+    packed = pack_context("întrebare", chunks, max_tokens=35, diversity=0.0, min_trim_tokens=100)
+    assert packed.chunks == chunks[:3]
+    assert (packed.tokens, packed.dropped, packed.trimmed) == (30, 1, 0)
+
+
+def test_a_shorter_chunk_still_fills_the_budget_left_by_one_too_long_to_trim():
+    chunks = [_words(20, "a"), _words(20, "b"), _words(5, "c")]
+
+    packed = pack_context("întrebare", chunks, max_tokens=30, diversity=0.0, min_trim_tokens=64)
+    assert packed.chunks == [chunks[0], chunks[2]]
+    assert packed.tokens == 25
+
+
+def test_a_chunk_over_the_budget_is_trimmed_to_its_relevant_sentences():
+    chunk = " ".join([HEAT_PUMP, INVOICE, HEAT_PUMP_SERVICE, SCHEDULE])
+
+    packed = pack_context("revizie pompa de căldură Vaillant", [chunk], max_tokens=30, min_trim_tokens=10)
+    assert packed.trimmed == 1
+    assert packed.chunks == [f"{HEAT_PUMP} {HEAT_PUMP_SERVICE}"]
+    assert packed.tokens == len(packed.chunks[0].split()) <= 30
+
+
+def test_mmr_moves_a_redundant_chunk_behind_a_different_one():
+    chunks = [HEAT_PUMP, HEAT_PUMP_SERVICE, INVOICE]
+
+    assert pack_context("pompa", chunks, diversity=0.0).chunks == chunks
+    assert pack_context("pompa", chunks, diversity=0.7).chunks == [HEAT_PUMP, INVOICE, HEAT_PUMP_SERVICE]
+
+
+def test_near_duplicates_are_dropped():
+    chunks = [HEAT_PUMP, INVOICE, HEAT_PUMP.upper(), SCHEDULE]
+
+    packed = pack_context("pompa", chunks)
+    assert packed.chunks == [HEAT_PUMP, INVOICE, SCHEDULE]
+    assert packed.dropped == 1
+
+
+@pytest.mark.parametrize("max_tokens", [1, 7, 13, 20, 33, 60, 200])
+def test_packed_total_stays_within_the_budget(max_tokens):
+    chunks = [HEAT_PUMP, _words(12, "a"), " ".join([INVOICE, SCHEDULE]), _words(3, "b"), HEAT_PUMP_SERVICE]
+
+    packed = pack_context("factura pompa", chunks, max_tokens=max_tokens, min_trim_tokens=5)
+    assert packed.tokens == sum(len(chunk.split()) for chunk in packed.chunks)
+    assert packed.tokens <= max_tokens
+    assert packed.dropped == len(chunks) - len(packed.chunks)
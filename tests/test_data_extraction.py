@@ -0,0 +1,67 @@
+import io
+import json
+import pytest
+from data_extraction import _iter_json_array, iter_json_pages
+
+PAGES = [
+    {"url": "https://example.ro/a", "text": "Prețuri [2024]: {abonament} și ]oferte["},
+    {"url": "https://example.ro/b", "text": "Ghilimele \"escapate\", backslash \\\\ și ] la final\\"},
+    {"url": "https://example.ro/c", "text": "Unicode șț, linie nouă\nși tab\t", "tags": ["[", "]", "{}"]},
+    {"url": "https://example.ro/d", "text": ""},
+]
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1 << 16]
+
+
+def _parse(text: str, chunk_size: int) -> list:
+    return list(_iter_json_array(io.StringIO(text), chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_elements_with_brackets_and_escapes_split_across_reads(chunk_size):
+    for text in (json.dumps(PAGES), json.dumps(PAGES, indent=2, ensure_ascii=False)):
+        assert _parse(text, chunk_size) == PAGES
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_numbers_and_literals_split_across_reads(chunk_size):
+    assert _parse(" [ 12345 , -6.5e3,true,null, \"x\" ,[ ], {}]  ", chunk_size) == [12345, -6.5e3, True, None,
+                                                                                     "x", [], {}]
+    assert _parse("[]", chunk_size) == []
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text", ["", "   ", "[", "[{\"url\": \"a\"}", "[{\"url\": \"a\"},", "[{\"url\": \"a",
+                                  "[12345", "[\"text ] with bracket"])
+def test_truncated_input_raises(chunk_size, text):
+    with pytest.raises(ValueError):
+        _parse(text, chunk_size)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("text,valid", [("{\"url\": \"a\"}", []), ("[{\"url\": oops}]", []),
+                                        ("[{\"url\": \"a\"} trailing]", [{"url": "a"}]), ("[1 2 x]", [1, 2])])
+def test_malformed_input_raises_after_the_valid_elements(chunk_size, text, valid):
+    parsed = []
+    with pytest.raises(ValueError):
+        for item in _iter_json_array(io.StringIO(text), chunk_size):
+            parsed.append(item)
+    assert parsed == valid
+
+
+def test_iter_json_pages_reads_arrays_and_json_lines(tmp_path):
+    array_path = tmp_path / "pages.json"
+    array_path.write_text("\n  " + json.dumps(PAGES, ensure_ascii=False), encoding="utf-8")
+    lines_path = tmp_path / "pages.jsonl"
+    lines_path.write_text("\n".join(json.dumps(page) for page in PAGES) + "\n\n", encoding="utf-8")
+    expected = [(page["url"], page["text"]) for page in PAGES]
+
+    assert list(iter_json_pages(str(array_path), chunk_size=5)) == expected
+    assert list(iter_json_pages(str(lines_path))) == expected
+
+
+def test_iter_json_pages_names_pages_without_a_url(tmp_path):
+    path = tmp_path / "pages.json"
+    path.write_text(json.dumps([{"text": "fără url"}, "not a page", {"url": "u", "text": "t"}]), encoding="utf-8")
+
+    assert list(iter_json_pages(str(path))) == [("item_0", "fără url"), ("u", "t")]
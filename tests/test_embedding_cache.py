@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import numpy as np
+import embedding_cache
+from embedding_cache import EmbeddingCache, embedding_cache_key
+
+MODEL = "text-embedding-3-small"
+
+
+def _last_used(db_path: str, text: str) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT last_used FROM embeddings WHERE key = ?",
+                            (embedding_cache_key(text, MODEL),)).fetchone()[0]
+
+
+def _disk_hit(cache: EmbeddingCache, text: str) -> None:
+    cache.clear_memory()
+    assert cache.get(text, MODEL) is not None
+
+
+def test_disk_hits_are_served_without_a_write_per_hit(tmp_path):
+    db_path = os.path.join(tmp_path, "cache.sqlite")
+    cache = EmbeddingCache(db_path=db_path)
+    cache.put_many(["a", "b"], MODEL, [[1.0, 0.0], [0.0, 1.0]])
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    for _ in range(20):
+        _disk_hit(cache, "a")
+    assert not any(statement.startswith("UPDATE") for statement in statements)
+    assert _last_used(db_path, "a") == _last_used(db_path, "b")
+
+    # The next put writes the buffered hits
+    cache.put("c", MODEL, [1.0, 1.0])
+    assert _last_used(db_path, "a") > _last_used(db_path, "b")
+    assert cache.stats()["disk_hits"] == 20
+    cache.close()
+
+
+def test_buffered_hits_are_written_every_n_hits(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "LAST_USED_FLUSH_HITS", 2)
+    db_path = os.path.join(tmp_path, "cache.sqlite")
+    cache = EmbeddingCache(db_path=db_path)
+    cache.put_many(["a", "b", "c"], MODEL, [[1.0], [2.0], [3.0]])
+
+    _disk_hit(cache, "a")
+    assert _last_used(db_path, "a") == _last_used(db_path, "c")
+    _disk_hit(cache, "b")
+    assert _last_used(db_path, "a") > _last_used(db_path, "c")
+    assert _last_used(db_path, "b") > _last_used(db_path, "a")
+    cache.close()
+
+
+def test_close_writes_buffered_hits(tmp_path):
+    db_path = os.path.join(tmp_path, "cache.sqlite")
+    cache = EmbeddingCache(db_path=db_path)
+    cache.put_many(["a", "b"], MODEL, [[1.0], [2.0]])
+    _disk_hit(cache, "a")
+    cache.close()
+
+    assert _last_used(db_path, "a") > _last_used(db_path, "b")
+    reopened = EmbeddingCache(db_path=db_path)
+    np.testing.assert_array_equal(reopened.get("a", MODEL), [1.0])
+    reopened.close()
+
+
+def test_disk_eviction_keeps_recently_hit_rows(tmp_path):
+    cache = EmbeddingCache(db_path=os.path.join(tmp_path, "cache.sqlite"), max_disk_items=2)
+    cache.put("a", MODEL, [1.0])
+    cache.put("b", MODEL, [2.0])
+    _disk_hit(cache, "a")
+
+    cache.put("c", MODEL, [3.0])
+    cache.clear_memory()
+    assert cache.get("b", MODEL) is None
+    np.testing.assert_array_equal(cache.get("a", MODEL), [1.0])
+    np.testing.assert_array_equal(cache.get("c", MODEL), [3.0])
+    cache.close()
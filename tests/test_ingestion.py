@@ -0,0 +1,102 @@
+import os
+import json
+import shutil
+import numpy as np
+import pytest
+from fake_openai import FakeOpenAI, fake_embedding
+from ingestion import ingest
+from vector_index import load_artifact_manifest, set_search_params
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+# The two Fujitsu PDFs are identical, so their chunks are shared and must outlive either one
+PDFS = ["aparate-aer-conditionat-fujitsu.pdf", "aparate-aer-conditionat-fujitsu#lead-form.pdf",
+        "pompe-caldura-vaillant.pdf"]
+DIMENSION = 32
+
+PAGES = {
+    "https://www.eon.ro/a": "Pompa de căldură NIBE se montează de echipa E.ON. Livrare și instalare incluse. " * 8,
+    "https://www.eon.ro/b": "Contul Myline îți arată facturile, consumul și plățile făcute online. " * 8,
+    "https://www.eon.ro/c": "Programul de lucru al magazinelor E.ON este de luni până vineri. " * 8,
+}
+
+BUILDS = [("flat", None, None), ("hnsw", None, None), ("ivf", None, None), ("flat", "int8", None),
+          ("flat", None, 40)]
+
+
+def _write_corpus(directory: str, pdfs: list, pages: dict) -> None:
+    os.makedirs(os.path.join(directory, "data"), exist_ok=True)
+    for name in os.listdir(os.path.join(directory, "data")):
+        os.remove(os.path.join(directory, "data", name))
+    for name in pdfs:
+        shutil.copy(os.path.join(DATA_DIR, name), os.path.join(directory, "data", name))
+    with open(os.path.join(directory, "pages.json"), "w", encoding="utf-8") as f:
+        json.dump([{"url": url, "text": text} for url, text in pages.items()], f, ensure_ascii=False)
+
+
+def _ingest(directory: str, store: str, client: FakeOpenAI, index_type, quantization, shard_size):
+    return ingest(client, pdf_pattern=os.path.join(directory, "data", "*.pdf"),
+                  json_path=os.path.join(directory, "pages.json"), filter_path=None,
+                  store_dir=os.path.join(directory, store), max_tokens=80, metric="cosine",
+                  index_type=index_type, quantization=quantization, shard_size=shard_size,
+                  detect_boilerplate=False)
+
+
+def _contents(index, chunks) -> dict:
+    # Chunk IDs differ between builds; compare every chunk text with the sources sharing it, and
+    # check each text's vector finds its own chunk
+    assert index.ntotal == len(chunks)
+    set_search_params(index, nprobe=1024, ef_search=256)
+    texts = [chunks[chunk_id] for chunk_id in chunks]
+    queries = np.array([fake_embedding(text, DIMENSION) for text in texts], dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    _, found = index.search(queries, 1)
+    assert [chunks[int(chunk_id)] for chunk_id in found[:, 0]] == texts
+    return {chunks[chunk_id]: sorted(chunks.sources(chunk_id)) for chunk_id in chunks}
+
+
+@pytest.mark.parametrize("index_type,quantization,shard_size", BUILDS)
+def test_delta_ingest_matches_a_fresh_build(tmp_path, word_encoding, index_type, quantization, shard_size):
+    directory = str(tmp_path)
+    build = (index_type, quantization, shard_size)
+    client = FakeOpenAI(dimension=DIMENSION, embedding_latency=0, embedding_latency_per_input=0)
+    _write_corpus(directory, PDFS, PAGES)
+    _, _, stats = _ingest(directory, "store", client, *build)
+    assert stats["added"] == len(PDFS) + len(PAGES)
+    assert stats["chunks_deduplicated"] > 0
+
+    # Delete a PDF and a page, modify a page and add one
+    pages = {"https://www.eon.ro/a": PAGES["https://www.eon.ro/a"].replace("NIBE", "Vaillant"),
+             "https://www.eon.ro/b": PAGES["https://www.eon.ro/b"],
+             "https://www.eon.ro/d": "Oferta Casa Verde include panouri solare și invertor. " * 8}
+    _write_corpus(directory, PDFS[1:], pages)
+    index, chunks, stats = _ingest(directory, "store", client, *build)
+    assert {name: stats[name] for name in ("added", "changed", "removed", "unchanged")} == \
+        {"added": 1, "changed": 1, "removed": 2, "unchanged": 3}
+    assert stats["chunks_removed"] > 0
+
+    fresh_index, fresh_chunks, _ = _ingest(directory, "fresh", FakeOpenAI(dimension=DIMENSION, embedding_latency=0),
+                                           *build)
+    assert _contents(index, chunks) == _contents(fresh_index, fresh_chunks)
+
+    # The manifest maps every current source to the chunks it contains
+    manifest = load_artifact_manifest(os.path.join(directory, "store"), os.listdir(os.path.join(directory, "store"))[0])
+    sources = manifest["metadata"]["sources"]
+    assert sorted(sources) == sorted([os.path.join(directory, "data", name) for name in PDFS[1:]] +
+                                     [f"url:{url}" for url in pages])
+    for source, entry in sources.items():
+        assert entry["chunk_ids"] and all(source in chunks.sources(chunk_id) for chunk_id in entry["chunk_ids"])
+
+
+def test_unchanged_sources_take_the_fast_path(tmp_path, word_encoding):
+    directory = str(tmp_path)
+    client = FakeOpenAI(dimension=DIMENSION, embedding_latency=0, embedding_latency_per_input=0)
+    _write_corpus(directory, PDFS, PAGES)
+    index, chunks, stats = _ingest(directory, "store", client, "flat", None, None)
+    calls = dict(client.calls)
+
+    again, again_chunks, again_stats = _ingest(directory, "store", client, "flat", None, None)
+    assert dict(client.calls) == calls
+    assert again_stats["unchanged"] == len(PDFS) + len(PAGES)
+    assert again_stats["chunks_added"] == again_stats["chunks_removed"] == 0
+    assert again_stats["index_version"] == stats["index_version"]
+    assert again.ntotal == index.ntotal and dict(again_chunks) == dict(chunks)
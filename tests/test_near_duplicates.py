@@ -0,0 +1,51 @@
+import os
+import sys
+import json
+import subprocess
+import numpy as np
+from near_duplicates import NearDuplicateIndex, minhash_signatures, find_near_duplicates
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+TEXTS = [
+    "Pompa de căldură NIBE se montează de echipa E.ON, cu livrare și instalare incluse în preț.",
+    "Pompa de căldură NIBE se montează de echipa E.ON, cu livrare și instalare incluse în prețul final.",
+    "Contul E.ON Myline îți arată facturile, consumul și plățile făcute online.",
+]
+
+
+def _signature_in_subprocess(hash_seed: str) -> list:
+    code = ("import json, sys; from near_duplicates import minhash_signatures; "
+            "print(json.dumps(minhash_signatures(json.loads(sys.argv[1])).tolist()))")
+    output = subprocess.run([sys.executable, "-c", code, json.dumps(TEXTS)],
+                            env={**os.environ, "PYTHONHASHSEED": hash_seed, "PYTHONPATH": SRC_DIR},
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def test_signatures_do_not_depend_on_the_hash_seed():
+    expected = minhash_signatures(TEXTS).tolist()
+    assert _signature_in_subprocess("1") == expected
+    assert _signature_in_subprocess("12345") == expected
+
+
+def test_near_duplicates_share_a_representative():
+    assert find_near_duplicates(TEXTS, threshold=0.5) == [0, 0, 2]
+
+
+def test_signature_estimates_jaccard_similarity():
+    signatures = minhash_signatures(TEXTS)
+    assert np.mean(signatures[0] == signatures[1]) > np.mean(signatures[0] == signatures[2])
+
+
+def test_saved_index_finds_duplicates_of_new_texts(tmp_path):
+    index = NearDuplicateIndex(threshold=0.5)
+    index.add([10, 11], index.sign([TEXTS[0], TEXTS[2]]))
+    index.save(str(tmp_path))
+
+    loaded = NearDuplicateIndex.load(str(tmp_path))
+    assert len(loaded) == 2
+    assert loaded.query(loaded.sign([TEXTS[1]])[0]) == 10
+    loaded.remove([10])
+    assert loaded.query(loaded.sign([TEXTS[1]])[0]) is None
+    assert loaded.query(loaded.sign([TEXTS[2]])[0]) == 11
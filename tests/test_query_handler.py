@@ -0,0 +1,27 @@
+import time
+import socket
+import numpy as np
+from openai import OpenAI
+from lexical_index import BM25Index
+from vector_index import build_index
+from query_handler import hybrid_query_rag
+
+CHUNKS = ["Pompa de căldură NIBE", "Factura online în contul Myline", "Program de lucru"]
+
+
+def test_embedding_timeout_falls_back_to_lexical_results_without_retries():
+    # A server that accepts connections and never answers, so every request times out
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(16)
+        client = OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.getsockname()[1]}/v1")
+        index = build_index(np.random.default_rng(0).random((len(CHUNKS), 8), dtype=np.float32))
+
+        started = time.perf_counter()
+        results = hybrid_query_rag("pompa NIBE", index, CHUNKS, BM25Index(CHUNKS), k=1, client=client,
+                                   embedding_timeout=0.5)
+        elapsed = time.perf_counter() - started
+
+    assert results == ["Pompa de căldură NIBE"]
+    # One timeout, not one per SDK retry plus backoff
+    assert elapsed < 1.5
@@ -0,0 +1,89 @@
+import os
+import json
+import threading
+import numpy as np
+import pytest
+from vector_index import build_index, is_memory_mapped
+from sharded_index import SHARDS_MANIFEST, ShardedIndex, build_sharded_index
+
+
+def _vectors(count: int, dimension: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dimension), dtype=np.float32)
+
+
+def _batches(vectors: np.ndarray, ids: np.ndarray, size: int = 17):
+    for start in range(0, len(vectors), size):
+        yield vectors[start:start + size], ids[start:start + size]
+
+
+def _sharded(vectors: np.ndarray, ids: np.ndarray, tmp_path, shard_size: int = 30, metric: str = "l2") -> ShardedIndex:
+    return build_sharded_index(_batches(vectors, ids), os.path.join(tmp_path, "work"), shard_size=shard_size,
+                               metric=metric, max_workers=2)
+
+
+@pytest.mark.parametrize("metric", ["l2", "cosine"])
+def test_sharded_search_merges_shards_like_a_single_index(tmp_path, metric):
+    vectors = _vectors(100)
+    ids = np.arange(100) * 5 + 3
+    index = _sharded(vectors.copy(), ids, tmp_path, metric=metric)
+    exact = build_index(vectors.copy(), metric=metric, ids=ids)
+
+    assert [int(shard.ntotal) for shard in index.shards] == [30, 30, 30, 10]
+    assert not os.path.exists(os.path.join(tmp_path, "work"))
+    queries = _vectors(8, seed=1)
+    distances, found = index.search(queries, 10)
+    exact_distances, exact_ids = exact.search(queries, 10)
+    np.testing.assert_array_equal(found, exact_ids)
+    np.testing.assert_allclose(distances, exact_distances, rtol=1e-5, atol=1e-5)
+
+    # Fewer vectors than k are padded with -1 like FAISS
+    assert (index.search(queries, 150)[1][:, 100:] == -1).all()
+
+
+def test_added_vectors_fill_the_last_shard_then_open_new_ones(tmp_path):
+    vectors = _vectors(145)
+    ids = np.arange(145)
+    index = _sharded(vectors[:100].copy(), ids[:100], tmp_path)
+
+    index.add_with_ids(vectors[100:].copy(), ids[100:])
+    assert [int(shard.ntotal) for shard in index.shards] == [30, 30, 30, 30, 25]
+    assert index.ntotal == 145
+    np.testing.assert_array_equal(index.search(vectors[[5, 105, 144]], 1)[1][:, 0], [5, 105, 144])
+
+
+def test_remove_ids_removes_from_every_shard(tmp_path):
+    vectors = _vectors(100)
+    index = _sharded(vectors.copy(), np.arange(100), tmp_path)
+
+    assert index.remove_ids(np.array([0, 45, 99, 1000], dtype=np.int64)) == 3
+    assert [int(shard.ntotal) for shard in index.shards] == [29, 29, 30, 9]
+    found = index.search(vectors[[0, 45, 99]], 97)[1]
+    assert not np.isin([0, 45, 99], found).any()
+    assert np.isin([1, 44, 98], found[0]).all()
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_save_and_load_keep_shards_and_settings(tmp_path, mmap):
+    vectors = _vectors(100)
+    index = _sharded(vectors.copy(), np.arange(100), tmp_path, metric="cosine")
+    directory = os.path.join(tmp_path, "shards")
+    index.save(directory)
+    with open(os.path.join(directory, SHARDS_MANIFEST), "r", encoding="utf-8") as f:
+        assert json.load(f)["shards"] == 4
+
+    loaded = ShardedIndex.load(directory, mmap=mmap)
+    assert is_memory_mapped(loaded) == mmap
+    assert (loaded.shard_size, loaded.metric, loaded.index_type) == (30, "cosine", "flat")
+    queries = _vectors(5, seed=1)
+    for expected, actual in zip(index.search(queries, 10), loaded.search(queries, 10)):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_sharded_indexes_share_one_search_pool():
+    shards = [build_index(_vectors(10, seed=seed), ids=np.arange(10) + 10 * seed) for seed in range(3)]
+    queries = _vectors(2, seed=9)
+    threads = threading.active_count()
+    for _ in range(100):
+        ShardedIndex(shards, 10).search(queries, 5)
+    # A pool per index would leave 3 idle threads behind for each of them
+    assert threading.active_count() <= threads + (os.cpu_count() or 1)
@@ -0,0 +1,139 @@
+import os
+import numpy as np
+import pytest
+import vector_index
+from vector_index import (RescoringIndex, build_index, write_index, read_index, add_to_index, remove_from_index,
+                          is_memory_mapped, reconstruct_vectors, save_index_artifact, load_index_artifact)
+
+
+def _vectors(count: int, dimension: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dimension), dtype=np.float32)
+
+
+@pytest.mark.parametrize("quantization", [None, "int8"])
+@pytest.mark.parametrize("read_only", [False, True])
+def test_memory_mapped_index_refuses_changes(tmp_path, quantization, read_only):
+    path = os.path.join(tmp_path, "index.faiss")
+    write_index(build_index(_vectors(100), ids=np.arange(100), quantization=quantization), path)
+
+    index = read_index(path, mmap=True, read_only=read_only)
+    assert is_memory_mapped(index)
+    with pytest.raises(ValueError):
+        remove_from_index(index, [1, 2])
+    with pytest.raises(ValueError):
+        add_to_index(index, _vectors(2, seed=1), [100, 101])
+    # The index still answers queries after the refused changes
+    assert index.search(_vectors(100)[:1], 1)[1][0, 0] == 0
+
+
+def test_index_read_into_memory_can_be_changed(tmp_path):
+    path = os.path.join(tmp_path, "index.faiss")
+    write_index(build_index(_vectors(100), ids=np.arange(100)), path)
+
+    index = read_index(path, mmap=False)
+    assert not is_memory_mapped(index)
+    assert remove_from_index(index, [1, 2]) == 2
+    add_to_index(index, _vectors(2, seed=1), [100, 101])
+    assert index.ntotal == 100
+
+
+@pytest.mark.parametrize("index_type,quantization", [("flat", None), ("ivf", None), ("hnsw", None), ("hnsw", "int8")])
+def test_reconstruct_vectors_returns_the_stored_vectors(index_type, quantization):
+    vectors = _vectors(50)
+    ids = np.arange(50) * 3
+    index = build_index(vectors.copy(), ids=ids, index_type=index_type, quantization=quantization)
+
+    np.testing.assert_allclose(reconstruct_vectors(index, [30, 0, 147]), vectors[[10, 0, 49]], rtol=1e-6)
+    with pytest.raises(KeyError):
+        reconstruct_vectors(index, [1])
+
+
+def _near_duplicates(count: int = 1000, groups: int = 50, seed: int = 0) -> np.ndarray:
+    # Tight clusters whose members int8 codes cannot tell apart, so only rescoring ranks them correctly
+    rng = np.random.default_rng(seed)
+    centers = np.repeat(rng.standard_normal((groups, 16), dtype=np.float32), count // groups, axis=0)
+    return (centers + 0.01 * rng.standard_normal(centers.shape, dtype=np.float32)).astype(np.float32)
+
+
+def test_rescoring_index_ranks_candidates_by_their_exact_distance():
+    vectors = _near_duplicates()
+    queries = vectors[::37] + 0.005 * np.random.default_rng(1).standard_normal((28, 16), dtype=np.float32)
+    ids = np.arange(len(vectors)) * 2
+    exact = build_index(vectors.copy(), ids=ids)
+    index = build_index(vectors.copy(), ids=ids, quantization="int8")
+    assert isinstance(index, RescoringIndex)
+
+    exact_distances, exact_ids = exact.search(queries, 5)
+    distances, found = index.search(queries, 5)
+    _, code_ids = index.index.search(queries, 5)
+    np.testing.assert_array_equal(found, exact_ids)
+    np.testing.assert_allclose(distances, exact_distances, rtol=1e-4, atol=1e-5)
+    # The codes alone misorder the near-duplicates
+    assert (code_ids != exact_ids).any()
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_rescoring_index_round_trips_through_its_vector_files(tmp_path, mmap):
+    vectors = _near_duplicates()
+    queries = vectors[::50].copy()
+    index = build_index(vectors.copy(), ids=np.arange(len(vectors)) * 2, metric="cosine", quantization="int8",
+                        rescore_factor=8)
+    path = os.path.join(tmp_path, "index.faiss")
+    write_index(index, path)
+    for name in ("index.vectors.npy", "index.vector_ids.npy", "index.rescore.json"):
+        assert os.path.exists(os.path.join(tmp_path, name))
+
+    loaded = read_index(path, mmap=mmap)
+    assert isinstance(loaded, RescoringIndex)
+    assert isinstance(loaded.vectors, np.memmap) == mmap
+    assert loaded.rescore_factor == 8
+    np.testing.assert_array_equal(loaded.ids, index.ids)
+    for expected, actual in zip(index.search(queries, 5), loaded.search(queries, 5)):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_rescoring_index_removes_and_adds_codes_with_their_vectors():
+    vectors = _vectors(100)
+    index = build_index(vectors.copy(), ids=np.arange(100) * 2, quantization="int8")
+
+    assert remove_from_index(index, [0, 10, 11]) == 2
+    assert index.ntotal == len(index.ids) == len(index.vectors) == 98
+    assert not np.isin([0, 10], index.search(vectors[[0, 5]], 98)[1]).any()
+
+    # IDs added below existing ones keep the ids sorted and the vectors aligned with them
+    added = _vectors(2, seed=1)
+    add_to_index(index, added.copy(), [11, 1])
+    assert np.all(np.diff(index.ids) > 0)
+    np.testing.assert_allclose(reconstruct_vectors(index, [1, 11, 198]), np.vstack([added[::-1], vectors[99:]]))
+    assert index.search(added, 1)[1][:, 0].tolist() == [11, 1]
+
+
+def _save(store_dir: str, count: int) -> str:
+    chunks = {chunk_id: f"chunk {chunk_id}" for chunk_id in range(count)}
+    return save_index_artifact(build_index(_vectors(count), ids=np.arange(count)), chunks, store_dir, "key")
+
+
+def test_save_keeps_the_previous_version_and_deletes_older_ones(tmp_path):
+    first, second, third = (_save(tmp_path, count) for count in (3, 4, 5))
+
+    assert load_index_artifact(tmp_path, "key")[0].ntotal == 5
+    assert not os.path.exists(first)
+    assert os.path.exists(second) and os.path.exists(third)
+
+
+def test_interrupted_save_leaves_the_current_artifact(tmp_path, monkeypatch):
+    _save(tmp_path, 3)
+    replace = os.replace
+
+    def crash_on_pointer_switch(source, destination):
+        if os.path.basename(destination) == vector_index.CURRENT_FILE:
+            raise KeyboardInterrupt
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", crash_on_pointer_switch)
+    with pytest.raises(KeyboardInterrupt):
+        _save(tmp_path, 4)
+    monkeypatch.setattr(os, "replace", replace)
+
+    index, chunks = load_index_artifact(tmp_path, "key")
+    assert index.ntotal == len(chunks) == 3